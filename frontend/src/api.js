@@ -29,6 +29,16 @@ export const api = {
         return res.data;
     },
 
+    // Upload several PDFs and/or ZIP archives of PDFs in one request
+    uploadFiles: async (files) => {
+        const formData = new FormData();
+        files.forEach((file) => formData.append('files', file));
+        const res = await axios.post(`${getBaseUrl()}/api/upload/bulk`, formData, {
+            headers: { 'Content-Type': 'multipart/form-data' }
+        });
+        return res.data;
+    },
+
     // Auth
     login: async (username, password) => {
         const res = await axios.post(`${getBaseUrl()}/api/auth/login`, {
@@ -38,9 +48,16 @@ export const api = {
         return res.data;
     },
 
-    // Scan Barcode - now returns print_count and last_print info
-    scanBarcode: async (barcode) => {
-        const res = await axios.get(`${getBaseUrl()}/api/scan/${encodeURIComponent(barcode)}`);
+    // Scan Barcode - now returns print_count and last_print info.
+    // Passing label settings asks the server to pre-render the label for the upcoming print.
+    scanBarcode: async (barcode, labelSettings = null) => {
+        const query = new URLSearchParams();
+        if (labelSettings) {
+            query.set('prerender', '1');
+            Object.entries(labelSettings).forEach(([key, value]) => query.set(key, value));
+        }
+        const queryString = query.toString();
+        const res = await axios.get(`${getBaseUrl()}/api/scan/${encodeURIComponent(barcode)}${queryString ? `?${queryString}` : ''}`);
         return res.data;
     },
 
@@ -56,6 +73,25 @@ export const api = {
         return res.data;
     },
 
+    // Resolve a tray of scans in one request
+    scanBatch: async (barcodes) => {
+        const res = await axios.post(`${getBaseUrl()}/api/scan/batch`, { barcodes });
+        return res.data;
+    },
+
+    // Resolve and print in one request (auto-print stations).
+    // duplicatePolicy 'block' skips pages printed before; 'allow' reprints them.
+    scanAndPrint: async (barcode, printerName = null, labelSettings = {}, username = 'Unknown', duplicatePolicy = 'block') => {
+        const res = await axios.post(`${getBaseUrl()}/api/scan-print`, {
+            barcode,
+            printer_name: printerName,
+            label_settings: labelSettings,
+            username,
+            duplicate_policy: duplicatePolicy
+        });
+        return res.data;
+    },
+
     // Download Report
     downloadReport: (params = {}) => {
         const query = new URLSearchParams();
@@ -158,8 +194,31 @@ export const api = {
         return res.data;
     },
 
+    // Site default label settings (used to precompute labels at upload)
+    getLabelDefaults: async () => {
+        const res = await axios.get(`${getBaseUrl()}/api/settings/label-defaults`);
+        return res.data;
+    },
+
+    setLabelDefaults: async (labelSettings) => {
+        const res = await axios.put(`${getBaseUrl()}/api/settings/label-defaults`, labelSettings);
+        return res.data;
+    },
+
+    // Live dashboard updates (server-sent events)
+    subscribeEvents: () => {
+        return new EventSource(`${getBaseUrl()}/api/events`);
+    },
+
     // Get Preview URL
     getPreviewUrl: (fileId, pageNum) => {
         return `${getBaseUrl()}/api/preview/${fileId}/${pageNum}`;
+    },
+
+    // Get cacheable PNG/WebP preview URL for the given label settings
+    getPreviewImageUrl: (fileId, pageNum, labelSettings = {}, format = 'png') => {
+        const query = new URLSearchParams({ format });
+        Object.entries(labelSettings || {}).forEach(([key, value]) => query.set(key, value));
+        return `${getBaseUrl()}/api/preview/${fileId}/${pageNum}?${query.toString()}`;
     }
 };
@@ -1,8 +1,19 @@
-import { useState, useEffect } from 'react';
-import { Trash2, FileText, Calendar, Barcode, Printer, Clock, CheckCircle, XCircle, Files, AlertCircle, User, Download, UserPlus, Shield } from 'lucide-react';
+import { useState, useEffect, useRef } from 'react';
+import { Trash2, FileText, Calendar, Barcode, Printer, Clock, CheckCircle, XCircle, Files, AlertCircle, User, Download, UserPlus, Shield, RefreshCw } from 'lucide-react';
 import { api } from '../api';
 import { getTodayUploadActivityIds, mergeDocumentsWithTodayActivity, sortByTodayActivityThenUploadTime } from '../uploadActivity';
 
+const applyStatsDelta = (stats, delta) => {
+    if (!stats) return stats;
+    const updated = { ...stats };
+    for (const key of ['total_documents', 'total_pages', 'total_prints', 'failed_prints', 'pending_prints']) {
+        if (delta[key]) {
+            updated[key] = Math.max((updated[key] || 0) + delta[key], 0);
+        }
+    }
+    return updated;
+};
+
 const getTodayDateInput = () => {
     const now = new Date();
     const year = now.getFullYear();
@@ -49,6 +60,60 @@ function DashboardPage() {
         }
     }, [reportDateFrom, reportDateTo, reportStatus]);
 
+    // Filters and loaders read by the event handlers below without reconnecting
+    const filtersRef = useRef({});
+    filtersRef.current = { activeTab, reportDateFrom, reportDateTo, reportStatus };
+    const reloadRef = useRef(null);
+
+    // Apply server-pushed deltas instead of re-requesting full datasets
+    useEffect(() => {
+        const source = api.subscribeEvents();
+        const on = (type, handler) => source.addEventListener(type, (event) => handler(JSON.parse(event.data)));
+
+        on('job_logged', ({ job, first_print }) => {
+            const { reportDateFrom: from, reportDateTo: to, reportStatus: status } = filtersRef.current;
+            const jobDate = (job.timestamp || '').slice(0, 10);
+            const inRange = (!from || jobDate >= from) && (!to || jobDate <= to);
+            if (inRange && (status === 'all' || status === job.status)) {
+                setHistory(prev => prev.some(existing => existing.id === job.id)
+                    ? prev.map(existing => existing.id === job.id ? job : existing)
+                    : [job, ...prev]);
+            } else {
+                // A listed job can change status (background print retries)
+                setHistory(prev => prev.filter(existing => existing.id !== job.id));
+            }
+            if (first_print) {
+                setDocuments(prev => prev.map(doc => doc.id === job.file_id
+                    ? { ...doc, printed_pages: (doc.printed_pages || 0) + 1, left_pages: Math.max((doc.left_pages || 0) - 1, 0) }
+                    : doc));
+            }
+        });
+
+        on('document_added', (doc) => {
+            if ((doc.uploaded_at || '').slice(0, 10) !== todayDate) return;
+            setDocuments(prev => sortByTodayActivityThenUploadTime(
+                mergeDocumentsWithTodayActivity([doc, ...prev.filter(existing => existing.id !== doc.id)])
+            ));
+        });
+
+        on('document_deleted', ({ id }) => {
+            setDocuments(prev => prev.filter(doc => doc.id !== id));
+            loadStats();
+        });
+
+        on('stats_delta', (delta) => {
+            if ((delta.uploaded_at || '').slice(0, 10) === todayDate) {
+                setStats(prev => applyStatsDelta(prev, delta));
+            }
+            setCumulativeStats(prev => applyStatsDelta(prev, delta));
+        });
+
+        // Fell too far behind: reload everything once
+        on('resync', () => reloadRef.current());
+
+        return () => source.close();
+    }, []);
+
     const loadStats = async () => {
         try {
             const [todayData, cumulativeData] = await Promise.all([
@@ -113,6 +178,11 @@ function DashboardPage() {
         }
     };
 
+    reloadRef.current = () => {
+        loadStats();
+        loadData();
+    };
+
     // --- User Management Logic ---
 
     const loadUsers = async () => {
@@ -663,6 +733,7 @@ function DashboardPage() {
                                                 <option value="all">All Statuses</option>
                                                 <option value="success">Success</option>
                                                 <option value="failed">Failed</option>
+                                                <option value="retrying">Retrying</option>
                                             </select>
                                             <button
                                                 onClick={() => api.downloadReport({ from: reportDateFrom, to: reportDateTo, status: reportStatus })}
@@ -810,6 +881,14 @@ function DashboardPage() {
                                                                 <span className="status-badge status-success">
                                                                     <CheckCircle size={12} /> Success
                                                                 </span>
+                                                            ) : job.status === 'retrying' ? (
+                                                                <span className="status-badge status-warning" title={job.error}>
+                                                                    <RefreshCw size={12} /> Retrying
+                                                                </span>
+                                                            ) : job.status === 'cancelled' ? (
+                                                                <span className="status-badge status-info">
+                                                                    <XCircle size={12} /> Cancelled
+                                                                </span>
                                                             ) : (
                                                                 <div className="flex items-center" title={job.error}>
                                                                     <span className="status-badge status-error">
@@ -10,9 +10,11 @@ function ScanPage() {
     const [isLoading, setIsLoading] = useState(false);
     const [isPrinting, setIsPrinting] = useState(false);
     const [error, setError] = useState(null);
+    const [suggestions, setSuggestions] = useState([]);
     const [countdown, setCountdown] = useState(null);
     const [showDuplicateModal, setShowDuplicateModal] = useState(false);
     const [duplicateInfo, setDuplicateInfo] = useState(null);
+    const [imagePreviewFailed, setImagePreviewFailed] = useState(false);
     const autoPrintTimerRef = useRef(null);
 
     // Get auto-print delay from settings (default 3 seconds)
@@ -60,13 +62,17 @@ function ScanPage() {
 
         setIsLoading(true);
         setError(null);
+        setSuggestions([]);
         setScanResult(null);
         setCountdown(null);
         setShowDuplicateModal(false);
         setDuplicateInfo(null);
+        setImagePreviewFailed(false);
 
         try {
-            const result = await api.scanBarcode(code);
+            // Send the station's label settings so the server can pre-render the label
+            const labelSettings = JSON.parse(localStorage.getItem('label_settings') || '{}');
+            const result = await api.scanBarcode(code, labelSettings);
 
             if (result.success && result.found) {
                 // Check if this barcode was printed before
@@ -84,6 +90,8 @@ function ScanPage() {
                 }
             } else {
                 setError('Barcode not found in any uploaded document.');
+                // Close matches (one misread character); the operator picks one to look it up
+                setSuggestions(result.suggestions || []);
             }
         } catch (err) {
             setError('Error searching for barcode. Is the server running?');
@@ -121,6 +129,12 @@ function ScanPage() {
                 username // Pass username
             );
 
+            if (printResponse?.queued) {
+                // Printer unavailable: the server keeps retrying the label in the background
+                setError('Printer unavailable, label queued for retry: ' + printResponse.error);
+                return;
+            }
+
             if (printResponse?.mode === 'preview' && printResponse?.preview_url) {
                 const baseUrl = localStorage.getItem('api_url') || 'http://localhost:5001';
                 window.open(`${baseUrl}${printResponse.preview_url}`, '_blank');
@@ -196,6 +210,28 @@ function ScanPage() {
                 </div>
             )}
 
+            {suggestions.length > 0 && (
+                <div className="card" style={{ marginTop: '12px', padding: '16px', borderRadius: '8px' }}>
+                    <div style={{ fontWeight: 500, marginBottom: '8px' }}>Did you mean:</div>
+                    {suggestions.map((suggestion) => (
+                        <button
+                            key={suggestion.barcode}
+                            className="btn btn-secondary"
+                            style={{ width: '100%', marginBottom: '6px', justifyContent: 'space-between' }}
+                            onClick={() => {
+                                setBarcode(suggestion.barcode);
+                                handleLookup(suggestion.barcode);
+                            }}
+                        >
+                            <span style={{ fontFamily: 'monospace' }}>{suggestion.barcode}</span>
+                            <span className="text-muted" style={{ fontSize: '12px' }}>
+                                {suggestion.mapping.doc_name} p.{suggestion.mapping.page_num} · {Math.round(suggestion.confidence * 100)}%
+                            </span>
+                        </button>
+                    ))}
+                </div>
+            )}
+
             {/* Duplicate Confirmation Modal */}
             {showDuplicateModal && duplicateInfo && (
                 <div style={{
@@ -308,18 +344,39 @@ function ScanPage() {
                             </div>
                         )}
 
-                        {/* Preview */}
-                        <iframe
-                            src={api.getPreviewUrl(scanResult.file_id, scanResult.page_num)}
-                            style={{
-                                width: '100%',
-                                height: '180px',
-                                border: '1px solid var(--border)',
-                                borderRadius: '8px',
-                                marginBottom: '16px'
-                            }}
-                            title="Label Preview"
-                        />
+                        {/* Preview: cached image, falling back to the PDF if the server cannot rasterize */}
+                        {imagePreviewFailed ? (
+                            <iframe
+                                src={api.getPreviewUrl(scanResult.file_id, scanResult.page_num)}
+                                style={{
+                                    width: '100%',
+                                    height: '180px',
+                                    border: '1px solid var(--border)',
+                                    borderRadius: '8px',
+                                    marginBottom: '16px'
+                                }}
+                                title="Label Preview"
+                            />
+                        ) : (
+                            <img
+                                src={api.getPreviewImageUrl(
+                                    scanResult.file_id,
+                                    scanResult.page_num,
+                                    JSON.parse(localStorage.getItem('label_settings') || '{}')
+                                )}
+                                onError={() => setImagePreviewFailed(true)}
+                                style={{
+                                    width: '100%',
+                                    height: '180px',
+                                    objectFit: 'contain',
+                                    background: 'white',
+                                    border: '1px solid var(--border)',
+                                    borderRadius: '8px',
+                                    marginBottom: '16px'
+                                }}
+                                alt="Label Preview"
+                            />
+                        )}
                     </div>
 
                     {countdown !== null && countdown > 0 && (
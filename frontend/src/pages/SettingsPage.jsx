@@ -42,6 +42,7 @@ function SettingsPage() {
 
     // Printer settings
     const [printers, setPrinters] = useState([]);
+    const [printerPools, setPrinterPools] = useState([]);
     const [selectedPrinter, setSelectedPrinter] = useState('');
     const [loadingPrinters, setLoadingPrinters] = useState(false);
 
@@ -93,6 +94,7 @@ function SettingsPage() {
             const result = await api.getPrinters();
             if (result.success) {
                 setPrinters(result.printers || []);
+                setPrinterPools(Object.keys(result.pools || {}));
                 // If no printer selected yet, use default
                 if (!selectedPrinter && result.default_printer) {
                     setSelectedPrinter(result.default_printer);
@@ -154,6 +156,15 @@ function SettingsPage() {
         setPreviewKey(prev => prev + 1);
     };
 
+    const handleSaveSiteDefaults = async () => {
+        try {
+            await api.setLabelDefaults(labelSettings);
+            alert('Saved as site default label settings');
+        } catch (error) {
+            alert(`Failed to save site defaults: ${error.message}`);
+        }
+    };
+
     const updateLabelSetting = (key, value) => {
         // Handle different types properly
         let processedValue = value;
@@ -276,6 +287,9 @@ function SettingsPage() {
                                     style={{ width: '100%' }}
                                 >
                                     <option value="">-- Select a printer --</option>
+                                    {printerPools.map(pool => (
+                                        <option key={`pool-${pool}`} value={pool}>{pool} (pool)</option>
+                                    ))}
                                     {printers.map(printer => (
                                         <option key={printer} value={printer}>{printer}</option>
                                     ))}
@@ -591,6 +605,14 @@ function SettingsPage() {
                         <button className="btn btn-primary" onClick={handleSaveLabelSettings}>
                             Save Settings & Update Preview
                         </button>
+                        <button
+                            className="btn btn-secondary"
+                            onClick={handleSaveSiteDefaults}
+                            style={{ marginLeft: '8px' }}
+                            title="Labels for new uploads are pre-cropped with these settings"
+                        >
+                            Use as Site Default
+                        </button>
                     </div>
                 </div>
 
@@ -44,7 +44,7 @@ function UploadPage() {
 
     const handleFilesSelected = (fileList) => {
         const selectedFiles = Array.from(fileList || []).filter(
-            (selectedFile) => selectedFile.name.toLowerCase().endsWith('.pdf')
+            (selectedFile) => /\.(pdf|zip)$/i.test(selectedFile.name)
         );
 
         if (selectedFiles.length > 0) {
@@ -99,44 +99,47 @@ function UploadPage() {
         const uploadResults = [];
 
         try {
-            for (const file of files) {
-                try {
-                    const result = await api.uploadFile(file);
+            try {
+                // One request for all files; ZIP archives expand to one result per PDF inside
+                const result = await api.uploadFiles(files);
 
-                    if (result.success) {
+                for (const fileResult of result.results || []) {
+                    if (fileResult.success) {
                         recordUploadActivity({
-                            fileId: result.file_id,
-                            name: file.name,
-                            duplicate: result.is_duplicate
+                            fileId: fileResult.file_id,
+                            name: fileResult.name,
+                            duplicate: fileResult.is_duplicate
                         });
 
                         uploadedCount += 1;
-                        if (result.is_duplicate) {
+                        if (fileResult.is_duplicate) {
                             duplicateCount += 1;
                         }
-                        totalPages += result.stats?.pages || 0;
-                        totalBarcodes += result.stats?.barcodes || 0;
+                        totalPages += fileResult.stats?.pages || 0;
+                        totalBarcodes += fileResult.stats?.barcodes || 0;
 
                         uploadResults.push({
-                            name: file.name,
+                            name: fileResult.name,
                             success: true,
-                            duplicate: !!result.is_duplicate,
-                            pages: result.stats?.pages || 0,
-                            barcodes: result.stats?.barcodes || 0,
-                            message: result.message || ''
+                            duplicate: !!fileResult.is_duplicate,
+                            pages: fileResult.stats?.pages || 0,
+                            barcodes: fileResult.stats?.barcodes || 0,
+                            message: fileResult.is_duplicate ? 'File already exists' : 'File uploaded and processed'
                         });
                     } else {
                         failedCount += 1;
                         uploadResults.push({
-                            name: file.name,
+                            name: fileResult.name,
                             success: false,
                             duplicate: false,
                             pages: 0,
                             barcodes: 0,
-                            message: result.error || 'Upload failed'
+                            message: fileResult.error || 'Upload failed'
                         });
                     }
-                } catch (err) {
+                }
+            } catch (err) {
+                for (const file of files) {
                     failedCount += 1;
                     uploadResults.push({
                         name: file.name,
@@ -144,16 +147,18 @@ function UploadPage() {
                         duplicate: false,
                         pages: 0,
                         barcodes: 0,
-                        message: err.message || 'Upload failed'
+                        message: err.response?.data?.error || err.message || 'Upload failed'
                     });
                 }
             }
 
+            const totalFiles = uploadResults.length;
+
             if (uploadedCount > 0) {
                 setStatus('success');
                 setMessage(
                     failedCount > 0
-                        ? `${uploadedCount}/${files.length} files processed successfully (${failedCount} failed).`
+                        ? `${uploadedCount}/${totalFiles} files processed successfully (${failedCount} failed).`
                         : duplicateCount > 0
                             ? `${uploadedCount} file${uploadedCount > 1 ? 's' : ''} processed. ${duplicateCount} already existed in uploads.`
                             : `${uploadedCount} file${uploadedCount > 1 ? 's' : ''} uploaded and processed successfully!`
@@ -162,7 +167,7 @@ function UploadPage() {
                     uploaded: uploadedCount,
                     duplicates: duplicateCount,
                     failed: failedCount,
-                    total: files.length,
+                    total: totalFiles,
                     pages: totalPages,
                     barcodes: totalBarcodes
                 });
@@ -177,7 +182,7 @@ function UploadPage() {
                     uploaded: 0,
                     duplicates: 0,
                     failed: failedCount,
-                    total: files.length,
+                    total: totalFiles,
                     pages: 0,
                     barcodes: 0
                 });
@@ -248,7 +253,7 @@ function UploadPage() {
                             id="pdf-upload"
                             ref={fileInputRef}
                             type="file"
-                            accept=".pdf"
+                            accept=".pdf,.zip"
                             multiple
                             style={{ display: 'none' }}
                             onChange={handleFileChange}
@@ -268,7 +273,7 @@ function UploadPage() {
                             {files.length > 0 ? (
                                 <div>
                                     <div style={{ fontSize: '18px', fontWeight: '600', color: 'var(--text-main)', marginBottom: '4px' }}>
-                                        {files.length} PDF{files.length > 1 ? 's' : ''} selected
+                                        {files.length} file{files.length > 1 ? 's' : ''} selected
                                     </div>
                                     <div className="text-muted">
                                         {(files.reduce((sum, selectedFile) => sum + selectedFile.size, 0) / 1024 / 1024).toFixed(2)} MB • Ready to process
@@ -288,7 +293,7 @@ function UploadPage() {
                             ) : (
                                 <div>
                                     <div style={{ fontSize: '16px', fontWeight: '600', color: 'var(--primary)', marginBottom: '4px' }}>Click to upload PDF(s)</div>
-                                    <div className="text-muted" style={{ fontSize: '14px' }}>or drag and drop one or multiple PDFs here</div>
+                                    <div className="text-muted" style={{ fontSize: '14px' }}>or drag and drop one or multiple PDFs (or ZIP archives of PDFs) here</div>
                                 </div>
                             )}
                         </div>
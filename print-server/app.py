@@ -1,5 +1,11 @@
 import os
-from flask import Flask, request, jsonify, send_from_directory, send_file
+import argparse
+import atexit
+import signal
+import sys
+import threading
+import time
+from flask import Flask, Request, Response, g, request, jsonify, send_from_directory, send_file, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import logging
@@ -7,27 +13,293 @@ import io
 import platform
 import datetime
 import uuid
+import zipfile
 
 # Import services (we'll create this next)
-from services import PDFProcessingService, PrintService
+from services import LAYOUT_TEXT_MODES, PDFProcessingService, PreviewUnavailable, PrintService
+import metrics
+import startup
+from blobstore import HashingSpoolFile, spool_stream, spool_zip_pdfs
+from label_store import PRECOMPUTE_MODES
+from hot_folder import HotFolderIngester
+from print_retry import PrintRetryQueue
+from printer_pool import PrinterPools
+from profiler import SlowRequestProfiler
+from reindex import BarcodeReindexer, ReindexBusy
+from retention import RetentionBusy, RetentionCompactor
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class UploadRequest(Request):
+    """Spool uploaded files into the upload folder, hashing them as they arrive."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpoolFile(app.config['UPLOAD_FOLDER'])
+
+    @property
+    def max_content_length(self):
+        # Bulk uploads carry a day of PDFs (or a ZIP of them) in one request
+        if self.path == '/api/upload/bulk':
+            return app.config['BULK_MAX_CONTENT_LENGTH']
+        return super().max_content_length
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 # Enable CORS for all domains (essential for Cloudflare hosted frontend)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
 # Configuration
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
+# BRADY_UPLOAD_FOLDER points a server at another data folder (load tests, staging)
+UPLOAD_FOLDER = os.environ.get('BRADY_UPLOAD_FOLDER') or os.path.join(os.path.dirname(__file__), 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB limit
+app.config['BULK_MAX_CONTENT_LENGTH'] = int(os.environ.get('BRADY_BULK_MAX_MB', 1024)) * 1024 * 1024
+# Worker processes parsing the PDFs of one bulk upload
+app.config['BULK_WORKERS'] = int(os.environ.get('BRADY_BULK_WORKERS', os.cpu_count() or 1))
+# 'json' keeps db.json; 'snapshot' uses the compact db.snap for fast startup
+app.config['DB_FORMAT'] = os.environ.get('BRADY_DB_FORMAT', 'json')
+# 'pdf' crops every barcode page at upload with the site default label settings,
+# 'bitmap' also rasterizes it for printing; 'off' renders on demand only
+app.config['PRECOMPUTE_LABELS'] = os.environ.get('BRADY_PRECOMPUTE_LABELS', 'off').lower()
+if app.config['PRECOMPUTE_LABELS'] not in PRECOMPUTE_MODES:
+    raise ValueError(f"BRADY_PRECOMPUTE_LABELS must be one of {', '.join(PRECOMPUTE_MODES)}")
+
+# 'adaptive' runs the slower layout-mode text pass only where it finds barcodes the default
+# text misses (see compare_extraction.py); 'always' runs it on every page
+app.config['LAYOUT_TEXT'] = os.environ.get('BRADY_LAYOUT_TEXT', 'always').lower()
+if app.config['LAYOUT_TEXT'] not in LAYOUT_TEXT_MODES:
+    raise ValueError(f"BRADY_LAYOUT_TEXT must be one of {', '.join(LAYOUT_TEXT_MODES)}")
+
+# Keep a profile of every request slower than this (ms) in uploads/profiles; unset disables
+# profiling. BRADY_PROFILE_MODE is 'sample' (stack sampling) or 'cprofile'.
+app.config['PROFILE_SLOW_MS'] = os.environ.get('BRADY_PROFILE_SLOW_MS')
+
+# Expire documents, mappings and print jobs older than this many days in the background
+# (unset: only on request through /api/admin/retention)
+app.config['RETENTION_DAYS'] = int(os.environ['BRADY_RETENTION_DAYS']) if os.environ.get('BRADY_RETENTION_DAYS') else None
+# Move print jobs older than this many days into compressed archive segments (kept for audits)
+app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ['BRADY_ARCHIVE_AFTER_DAYS']) if os.environ.get('BRADY_ARCHIVE_AFTER_DAYS') else None
+
+# Printer pools: seconds between health/queue probes of member printers, and how long a
+# member that failed a send is tried only after the others
+app.config['PRINTER_PROBE_SECONDS'] = float(os.environ.get('BRADY_PRINTER_PROBE_SECONDS', 10))
+app.config['PRINTER_FAILURE_COOLDOWN'] = float(os.environ.get('BRADY_PRINTER_FAILURE_COOLDOWN', 30))
+
+# Failed prints are retried in the background this many times (unset or 0: fail right away), waiting
+# BRADY_PRINT_RETRY_DELAY seconds first and doubling up to BRADY_PRINT_RETRY_MAX_DELAY
+app.config['PRINT_RETRY_ATTEMPTS'] = int(os.environ.get('BRADY_PRINT_RETRY_ATTEMPTS', 0))
+app.config['PRINT_RETRY_DELAY'] = float(os.environ.get('BRADY_PRINT_RETRY_DELAY', 5))
+app.config['PRINT_RETRY_MAX_DELAY'] = float(os.environ.get('BRADY_PRINT_RETRY_MAX_DELAY', 300))
+# Give up on one lpr call after this many seconds (it then counts as a failed send)
+app.config['PRINT_SEND_TIMEOUT'] = float(os.environ.get('BRADY_PRINT_SEND_TIMEOUT', 30))
+
+# Import PDFs dropped into this folder (e.g. an ERP export share); unset disables it
+app.config['HOT_FOLDER'] = os.environ.get('BRADY_HOT_FOLDER')
 
 # Initialize services
-pdf_service = PDFProcessingService(upload_folder=UPLOAD_FOLDER)
-print_service = PrintService(pdf_service)
+pdf_service = PDFProcessingService(upload_folder=UPLOAD_FOLDER, db_format=app.config['DB_FORMAT'],
+                                   layout_mode=app.config['LAYOUT_TEXT'])
+printer_pools = PrinterPools(pdf_service, probe_interval=app.config['PRINTER_PROBE_SECONDS'],
+                             failure_cooldown=app.config['PRINTER_FAILURE_COOLDOWN'])
+print_service = PrintService(pdf_service, pools=printer_pools, send_timeout=app.config['PRINT_SEND_TIMEOUT'])
+print_retries = PrintRetryQueue(
+    print_service,
+    UPLOAD_FOLDER,
+    max_attempts=app.config['PRINT_RETRY_ATTEMPTS'],
+    base_delay=app.config['PRINT_RETRY_DELAY'],
+    max_delay=app.config['PRINT_RETRY_MAX_DELAY']
+) if app.config['PRINT_RETRY_ATTEMPTS'] > 0 else None
+print_service.retries = print_retries
+profiler = SlowRequestProfiler(
+    UPLOAD_FOLDER,
+    threshold_ms=float(app.config['PROFILE_SLOW_MS']),
+    mode=os.environ.get('BRADY_PROFILE_MODE', 'sample').lower(),
+    keep=int(os.environ.get('BRADY_PROFILE_KEEP', 50)),
+    interval_ms=float(os.environ.get('BRADY_PROFILE_INTERVAL_MS', 10))
+) if app.config['PROFILE_SLOW_MS'] else None
+retention = RetentionCompactor(
+    pdf_service,
+    days=app.config['RETENTION_DAYS'],
+    archive_after_days=app.config['ARCHIVE_AFTER_DAYS'],
+    batch_size=int(os.environ.get('BRADY_RETENTION_BATCH', 500)),
+    pause=float(os.environ.get('BRADY_RETENTION_PAUSE_MS', 20)) / 1000,
+    interval=float(os.environ.get('BRADY_RETENTION_INTERVAL_HOURS', 6)) * 3600
+)
+
+reindexer = BarcodeReindexer(pdf_service)
+
+def precompute_new_document(file_id):
+    if app.config['PRECOMPUTE_LABELS'] != 'off':
+        print_service.schedule_precompute(file_id, bitmaps=app.config['PRECOMPUTE_LABELS'] == 'bitmap')
+
+hot_folder = HotFolderIngester(
+    pdf_service,
+    app.config['HOT_FOLDER'],
+    UPLOAD_FOLDER,
+    workers=int(os.environ.get('BRADY_HOT_FOLDER_WORKERS', 2)),
+    per_minute=float(os.environ.get('BRADY_HOT_FOLDER_RATE', 60)),
+    poll_interval=float(os.environ.get('BRADY_HOT_FOLDER_POLL', 5)),
+    on_added=precompute_new_document
+) if app.config['HOT_FOLDER'] else None
+# Long-lived streams would always count as slow
+UNPROFILED_ROUTES = {'/api/events'}
+# Scans accepted by one /api/scan/batch request
+SCAN_BATCH_LIMIT = 1000
+
+LABEL_SETTING_TYPES = {
+    'width': float, 'height': float, 'offsetX': float, 'offsetY': float, 'scale': float,
+    'dpi': int, 'contrast': float, 'threshold': int,
+    'color_mode': str, 'resampling': str, 'sharpening': bool
+}
+
+def label_settings_from_args(args, defaults=None):
+    """Label settings passed as query parameters (preview and scan pre-render)."""
+    settings = dict(defaults or {})
+    for key, cast in LABEL_SETTING_TYPES.items():
+        if key not in args:
+            continue
+        value = args.get(key)
+        if cast is bool:
+            settings[key] = value.lower() in ('1', 'true', 'yes', 'on')
+        elif cast is int:
+            settings[key] = int(float(value))
+        else:
+            settings[key] = cast(value)
+    return settings
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if profiler is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if route not in UNPROFILED_ROUTES:
+            g.profile = profiler.start({
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'route': route,
+            })
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # Label by route pattern, not the raw path, to keep the series bounded
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route, request.method)
+        metrics.REQUESTS_TOTAL.inc(route, request.method, str(response.status_code))
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_profile(error=None):
+    # Teardown also runs after unhandled errors, which after_request does not see
+    capture = g.pop('profile', None)
+    if capture is not None:
+        profiler.finish(capture, g.pop('response_status', 500 if error else None))
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of request, stage, cache, queue and database metrics"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/profiles', methods=['GET', 'DELETE'])
+def slow_request_profiles():
+    """List (newest first) or delete the captured slow request profiles"""
+    if profiler is None:
+        return jsonify({'success': True, 'enabled': False, 'profiles': []})
+    if request.method == 'DELETE':
+        return jsonify({'success': True, 'deleted': profiler.clear()})
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'mode': profiler.mode,
+        'threshold_ms': profiler.threshold_ms,
+        'keep': profiler.keep,
+        'profiles': profiler.list_profiles()
+    })
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """One profile: format=json (default), collapsed (flame graph stacks) or prof (cProfile)"""
+    fmt = request.args.get('format', 'json')
+    if profiler is None or profiler.path(profile_id) is None:
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+    if fmt == 'json':
+        return send_file(profiler.path(profile_id), mimetype='application/json')
+    if fmt == 'collapsed':
+        return Response(profiler.collapsed(profile_id), mimetype='text/plain',
+                        headers={'Content-Disposition': f'attachment; filename={profile_id}.folded'})
+    if fmt == 'prof':
+        path = profiler.path(profile_id, '.prof')
+        if path is None:
+            return jsonify({'success': False, 'error': 'No cProfile data for this profile'}), 404
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f'{profile_id}.prof')
+    return jsonify({'success': False, 'error': 'format must be json, collapsed or prof'}), 400
+
+@app.route('/api/admin/retention', methods=['GET', 'POST'])
+def retention_compaction():
+    """Retention status, or run a pass (archive, then expire): {dry_run (default true), days}"""
+    if request.method == 'GET':
+        return jsonify({'success': True, **retention.status()})
+
+    data = request.json or {}
+    dry_run = data.get('dry_run', True) is not False
+    days = int(data.get('days') or retention.days or 0)
+    if days < 0 or (not days and not retention.archive_after_days):
+        return jsonify({'success': False, 'error': 'days must be greater than 0 (BRADY_RETENTION_DAYS is not set)'}), 400
+    if retention.running:
+        return jsonify({'success': False, 'error': 'A retention pass is already running'}), 409
+
+    if dry_run:
+        try:
+            return jsonify({'success': True, 'report': retention.run(dry_run=True, days=days)})
+        except RetentionBusy as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+
+    def run_pass():
+        try:
+            retention.run(days=days)
+        except RetentionBusy:
+            pass
+        except Exception as e:
+            logger.error(f"Retention pass failed: {e}")
+
+    threading.Thread(target=run_pass, name='retention-manual', daemon=True).start()
+    return jsonify({'success': True, 'started': True, 'days': days}), 202
+
+@app.route('/api/admin/reindex', methods=['GET', 'POST'])
+def barcode_reindex():
+    """Re-index status, or re-run the barcode patterns over stored page text: {dry_run (default true)}"""
+    if request.method == 'GET':
+        return jsonify({'success': True, **reindexer.status()})
+
+    data = request.json or {}
+    if reindexer.running:
+        return jsonify({'success': False, 'error': 'A re-index is already running'}), 409
+    if data.get('dry_run', True) is not False:
+        try:
+            return jsonify({'success': True, 'report': reindexer.run(dry_run=True)})
+        except ReindexBusy as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+
+    reindexer.start_run()
+    return jsonify({'success': True, 'started': True}), 202
+
+@app.route('/api/admin/hot-folder', methods=['GET'])
+def hot_folder_status():
+    """Hot folder import progress: queue, counts, recent imports and files that could not be moved"""
+    if hot_folder is None:
+        return jsonify({'success': True, 'enabled': False})
+    return jsonify({'success': True, 'enabled': True, **hot_folder.status()})
+
+@app.route('/api/admin/archive', methods=['GET'])
+def print_job_archive():
+    """Archived print history segments (month, job count, size, time range)"""
+    return jsonify({'success': True, 'archive_after_days': retention.archive_after_days, **pdf_service.archive.summary()})
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -85,12 +357,54 @@ def list_printers():
         return jsonify({
             'success': True,
             'printers': printers,
-            'default_printer': default_printer
+            'default_printer': default_printer,
+            # Pool names can be used wherever a printer name is expected
+            'pools': printer_pools.pools()
         })
     except Exception as e:
         logger.error(f"Failed to list printers: {e}")
         return jsonify({'success': False, 'error': str(e), 'printers': []})
 
+@app.route('/api/printer-pools', methods=['GET', 'PUT'])
+def printer_pool_config():
+    """Printer pools with live member state, or replace them: {pools: {name: [printer, ...]}}"""
+    if request.method == 'PUT':
+        data = request.json or {}
+        try:
+            printer_pools.set_pools(data.get('pools', {}))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        try:
+            printer_pools.refresh()
+        except Exception as e:
+            logger.warning(f"Printer health probe failed: {e}")
+    return jsonify({'success': True, **printer_pools.status()})
+
+@app.route('/api/print-queue', methods=['GET'])
+def print_queue():
+    """Print jobs waiting for a background retry, and dead letters that ran out of retries"""
+    if print_retries is None:
+        return jsonify({'success': True, 'enabled': False})
+    return jsonify({'success': True, 'enabled': True, **print_retries.status()})
+
+@app.route('/api/print-queue/<job_id>/<action>', methods=['POST'])
+def print_queue_action(job_id, action):
+    """Requeue (optionally {printer_name}) or cancel a waiting job or dead letter"""
+    if print_retries is None:
+        return jsonify({'success': False, 'error': 'Print retries are disabled'}), 404
+    if action not in ('requeue', 'cancel'):
+        return jsonify({'success': False, 'error': f'Unknown action {action}'}), 404
+    try:
+        if action == 'requeue':
+            job = print_retries.requeue(job_id, (request.get_json(silent=True) or {}).get('printer_name'))
+        else:
+            job = print_retries.cancel(job_id)
+    except KeyError:
+        return jsonify({'success': False, 'error': 'No such job in the print queue'}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    return jsonify({'success': True, 'job': job})
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
@@ -102,16 +416,21 @@ def upload_file():
     
     if file and file.filename.lower().endswith('.pdf'):
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        with metrics.timed('upload', 'spool'):
+            if isinstance(file.stream, HashingSpoolFile):
+                spool_path, file_hash = file.stream.finish()
+            else:
+                spool_path, file_hash = spool_stream(file.stream, app.config['UPLOAD_FOLDER'])
         
-        # Process PDF
+        # Process PDF (duplicates are detected from the hash before parsing)
         try:
-            result = pdf_service.process_pdf(filepath, filename)
+            result = pdf_service.process_pdf(spool_path, filename, file_hash=file_hash)
             
             if result.get('is_duplicate'):
                 pass # You can decide to treat as error or success with warning
                 # For now returning success but with existing ID
+            else:
+                precompute_new_document(result['id'])
                 
             return jsonify({
                 'success': True,
@@ -123,9 +442,82 @@ def upload_file():
         except Exception as e:
             logger.error(f"Processing error: {e}")
             return jsonify({'error': str(e)}), 500
+        finally:
+            # Left over only for duplicates and failures; new files were moved into the blob store
+            if os.path.exists(spool_path):
+                os.remove(spool_path)
             
     return jsonify({'error': 'Invalid file type'}), 400
 
+@app.route('/api/upload/bulk', methods=['POST'])
+def bulk_upload():
+    """Upload any number of PDFs and/or ZIP archives of PDFs; one database save for all"""
+    parts = [part for _key, part in request.files.items(multi=True)]
+    if not parts:
+        return jsonify({'error': 'No files'}), 400
+
+    items = []  # (name, spool path, hash) of every PDF, in upload order
+    rejected = []
+    try:
+        with metrics.timed('upload', 'spool'):
+            for part in parts:
+                name = part.filename or ''
+                if isinstance(part.stream, HashingSpoolFile):
+                    spool_path, file_hash = part.stream.finish()
+                else:
+                    spool_path, file_hash = spool_stream(part.stream, app.config['UPLOAD_FOLDER'])
+
+                if name.lower().endswith('.pdf'):
+                    items.append((secure_filename(name) or 'document.pdf', spool_path, file_hash))
+                    continue
+                try:
+                    if not name.lower().endswith('.zip'):
+                        raise ValueError('Not a PDF or ZIP file')
+                    entries = spool_zip_pdfs(spool_path, app.config['UPLOAD_FOLDER'])
+                    items.extend((secure_filename(entry) or 'document.pdf', path, entry_hash)
+                                 for entry, path, entry_hash in entries)
+                except (zipfile.BadZipFile, ValueError, NotImplementedError, OSError) as e:
+                    rejected.append({'name': name, 'success': False, 'error': str(e)})
+                finally:
+                    os.remove(spool_path)
+
+        processed = pdf_service.process_pdf_batch(items, workers=app.config['BULK_WORKERS'])
+    finally:
+        # Left over only for duplicates and failures; new files were moved into the blob store
+        for _name, spool_path, _hash in items:
+            if os.path.exists(spool_path):
+                os.remove(spool_path)
+
+    results = []
+    for (name, _path, _hash), result in zip(items, processed):
+        if 'error' in result:
+            results.append({'name': name, 'success': False, 'error': result['error']})
+            continue
+        if not result.get('is_duplicate'):
+            precompute_new_document(result['id'])
+        results.append({
+            'name': name,
+            'success': True,
+            'file_id': result['id'],
+            'is_duplicate': result.get('is_duplicate', False),
+            'stats': result['stats']
+        })
+    results.extend(rejected)
+
+    succeeded = [r for r in results if r['success']]
+    return jsonify({
+        'success': True,
+        'summary': {
+            'files': len(results),
+            'uploaded': sum(1 for r in succeeded if not r['is_duplicate']),
+            'duplicates': sum(1 for r in succeeded if r['is_duplicate']),
+            'failed': len(results) - len(succeeded),
+            'pages': sum(r['stats']['pages'] for r in succeeded),
+            'barcodes': sum(r['stats']['barcodes'] for r in succeeded)
+        },
+        'results': results
+    })
+
 @app.route('/api/documents', methods=['GET'])
 def get_documents():
     from_date = request.args.get('from')
@@ -158,12 +550,20 @@ def get_history():
 @app.route('/api/scan/<barcode>', methods=['GET'])
 def scan_barcode(barcode):
     try:
+        timer = metrics.StageTimer('scan')
         # Search for barcode
-        matched_barcode, result = pdf_service.resolve_barcode(barcode)
+        with timer.stage('resolve'):
+            matched_barcode, result = pdf_service.resolve_barcode(barcode)
         if result:
-            # Check if this barcode was printed before
-            print_count = pdf_service.get_barcode_print_count(barcode)
-            last_print = pdf_service.get_last_print_for_barcode(barcode)
+            # Optionally start rendering the label the station is about to print
+            if request.args.get('prerender') in ('1', 'true'):
+                with timer.stage('prerender'):
+                    print_service.prerender(result['file_id'], result['page_num'], label_settings_from_args(request.args))
+
+            # Check if this page was printed before (already resolved, no second lookup)
+            with timer.stage('print_count'):
+                print_count = pdf_service.get_page_print_count(result['file_id'], result['page_num'])
+                last_print = pdf_service.get_last_print_for_page(result['file_id'], result['page_num'])
             
             return jsonify({
                 'success': True,
@@ -174,14 +574,48 @@ def scan_barcode(barcode):
                 'last_print': last_print
             })
         else:
+            # Near misses (a misread character) for the operator to pick from
+            with timer.stage('suggest'):
+                suggestions = pdf_service.suggest_barcodes(barcode)
             return jsonify({
                 'success': True,
                 'found': False,
-                'message': 'Barcode not found'
+                'message': 'Barcode not found',
+                'suggestions': suggestions
             })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/scan/batch', methods=['POST'])
+def scan_batch():
+    """Resolve a tray of scans in one request: {barcodes: [raw scan payload, ...]}"""
+    data = request.json or {}
+    barcodes = data.get('barcodes')
+    if not isinstance(barcodes, list) or not barcodes:
+        return jsonify({'success': False, 'error': 'barcodes must be a non-empty list'}), 400
+    if len(barcodes) > SCAN_BATCH_LIMIT:
+        return jsonify({'success': False, 'error': f'At most {SCAN_BATCH_LIMIT} barcodes per request'}), 400
+
+    timer = metrics.StageTimer('scan_batch')
+    with timer.stage('resolve'):
+        results = pdf_service.resolve_barcodes([str(barcode) for barcode in barcodes])
+
+    found = [r for r in results if r['found']]
+    pages = {(r['mapping']['file_id'], r['mapping']['page_num']) for r in found}
+    return jsonify({
+        'success': True,
+        'summary': {
+            'scanned': len(results),
+            'found': len(found),
+            'not_found': len(results) - len(found),
+            'pages': len(pages),
+            # Two scans resolving to the same page usually mean a double scan
+            'repeated_pages': len(found) - len(pages),
+            'already_printed': sum(1 for r in found if r['print_count'] > 0)
+        },
+        'results': results
+    })
+
 @app.route('/api/auth/login', methods=['POST'])
 def login():
     data = request.json or {}
@@ -283,25 +717,140 @@ def get_document_print_stats(file_id):
 def preview_page(file_id, page_num):
     try:
         # Get label settings from query params (for live preview)
-        label_settings = {
-            'width': float(request.args.get('width', 3.94)),
-            'height': float(request.args.get('height', 1.5)),
-            'offsetX': float(request.args.get('offsetX', 0)),
-            'offsetY': float(request.args.get('offsetY', 0)),
-            'scale': float(request.args.get('scale', 100))
-        }
+        label_settings = label_settings_from_args(request.args, {
+            'width': 3.94,
+            'height': 1.5,
+            'offsetX': 0.0,
+            'offsetY': 0.0,
+            'scale': 100.0
+        })
         
-        # Get processed and/or cropped page image/pdf
-        image_bytes = pdf_service.get_page_image(file_id, page_num, label_settings)
-        return send_file(
-            io.BytesIO(image_bytes),
-            mimetype='application/pdf',
-            as_attachment=False,
-            download_name=f'preview_{page_num}.pdf'
-        )
+        # format=png|webp returns a downscaled image at screen DPI instead of a PDF
+        fmt = request.args.get('format', 'pdf').lower()
+        if fmt != 'pdf' and fmt not in pdf_service.PREVIEW_FORMATS:
+            return jsonify({'error': 'format must be pdf, png or webp'}), 400
+        dpi = min(max(int(request.args.get('dpi', 96)), 36), 300) if fmt != 'pdf' else None
+
+        # Previews only change with the document bytes, page and settings, so
+        # a matching If-None-Match is answered before any rendering
+        etag = pdf_service.preview_etag(file_id, page_num, label_settings, fmt, dpi)
+        if etag is None:
+            return jsonify({'error': 'Document not found'}), 404
+
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        elif fmt == 'pdf':
+            # Get processed and/or cropped page image/pdf
+            with metrics.timed('preview', 'render'):
+                image_bytes = pdf_service.get_page_image(file_id, page_num, label_settings)
+            response = send_file(
+                io.BytesIO(image_bytes),
+                mimetype='application/pdf',
+                as_attachment=False,
+                download_name=f'preview_{page_num}.pdf'
+            )
+        else:
+            with metrics.timed('preview', 'render'):
+                image_bytes = pdf_service.get_page_preview_image(file_id, page_num, label_settings, fmt, dpi)
+            response = send_file(
+                io.BytesIO(image_bytes),
+                mimetype=f'image/{fmt}',
+                as_attachment=False,
+                download_name=f'preview_{page_num}.{fmt}'
+            )
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, max-age=86400'
+        return response
+    except PreviewUnavailable as e:
+        return jsonify({'error': str(e)}), 501
     except Exception as e:
         return jsonify({'error': str(e)}), 404
 
+@app.route('/api/events', methods=['GET'])
+def event_stream():
+    """Server-sent events: job_logged, document_added, document_deleted, stats_delta, resync"""
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    subscription = pdf_service.events.subscribe(last_event_id)
+    return Response(
+        stream_with_context(pdf_service.events.stream(subscription)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/render-cache/stats', methods=['GET'])
+def render_cache_stats():
+    """Hit/miss counters for label pre-rendering"""
+    return jsonify({'success': True, 'stats': pdf_service.render_cache.stats()})
+
+@app.route('/api/settings/label-defaults', methods=['GET', 'PUT'])
+def label_defaults():
+    """Site default label settings used when precomputing labels"""
+    if request.method == 'PUT':
+        data = request.json or {}
+        label_settings = {key: value for key, value in data.items() if key in LABEL_SETTING_TYPES}
+        pdf_service.set_label_defaults(label_settings)
+    return jsonify({'success': True, 'label_settings': pdf_service.get_label_defaults()})
+
+@app.route('/api/labels/precompute', methods=['POST'])
+def precompute_labels():
+    """Queue label precompute for one document (file_id) or all documents"""
+    data = request.json or {}
+    file_id = data.get('file_id')
+    bitmaps = bool(data.get('bitmaps', app.config['PRECOMPUTE_LABELS'] == 'bitmap'))
+    if file_id and file_id not in pdf_service.documents:
+        return jsonify({'success': False, 'error': 'Document not found'}), 404
+
+    file_ids = [file_id] if file_id else list(pdf_service.documents.keys())
+    for doc_id in file_ids:
+        print_service.schedule_precompute(doc_id, bitmaps=bitmaps)
+    return jsonify({'success': True, 'queued': len(file_ids), 'bitmaps': bitmaps}), 202
+
+def submit_print(file_id, page_num, printer_name, label_settings, username, timer=None):
+    """Print one page; returns (response body, HTTP status)."""
+    # macOS development mode: do not print physically, only provide preview link
+    if platform.system() == 'Darwin':
+        doc = pdf_service.documents.get(file_id)
+        if not doc:
+            return {'error': 'Document not found'}, 404
+
+        # Validate preview generation for this page/settings
+        pdf_service.get_page_image(file_id, page_num, label_settings)
+
+        # Log simulated successful print for testing flow consistency
+        pdf_service.log_print_job({
+            'id': str(uuid.uuid4()),
+            'file_id': file_id,
+            'doc_name': doc.get('name', 'Unknown Document'),
+            'page_num': page_num,
+            'printer': 'Preview (macOS)',
+            'status': 'success',
+            'timestamp': datetime.datetime.now().isoformat(),
+            'error': None,
+            'username': username
+        })
+
+        return {
+            'success': True,
+            'mode': 'preview',
+            'message': 'macOS dev mode: preview generated (no physical print).',
+            'preview_url': f'/api/preview/{file_id}/{page_num}'
+        }, 200
+
+    # Pass username to print service
+    success, message = print_service.print_page(file_id, page_num, printer_name, label_settings, username, timer=timer)
+    if success:
+        return {'success': True, 'message': message}, 200
+    if success is None:
+        # Not printed yet; it is retried in the background (see /api/print-queue)
+        return {'success': False, 'queued': True, 'error': message}, 202
+    return {'success': False, 'error': message}, 500
+
 @app.route('/api/print', methods=['POST'])
 def print_label():
     data = request.json
@@ -315,41 +864,78 @@ def print_label():
         return jsonify({'error': 'Missing file_id or page_num'}), 400
         
     try:
-        # macOS development mode: do not print physically, only provide preview link
-        if platform.system() == 'Darwin':
-            doc = pdf_service.documents.get(file_id)
-            if not doc:
-                return jsonify({'error': 'Document not found'}), 404
-
-            # Validate preview generation for this page/settings
-            pdf_service.get_page_image(file_id, page_num, label_settings)
-
-            # Log simulated successful print for testing flow consistency
-            pdf_service.log_print_job({
-                'id': str(uuid.uuid4()),
-                'file_id': file_id,
-                'doc_name': doc.get('name', 'Unknown Document'),
-                'page_num': page_num,
-                'printer': 'Preview (macOS)',
-                'status': 'success',
-                'timestamp': datetime.datetime.now().isoformat(),
-                'error': None,
-                'username': username
+        body, status_code = submit_print(file_id, page_num, printer_name, label_settings, username)
+        return jsonify(body), status_code
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/scan-print', methods=['POST'])
+def scan_and_print():
+    """Resolve a barcode and print its page in one round trip (auto-print stations).
+
+    duplicate_policy: 'block' (default) returns without printing when the page
+    was printed before or has a print waiting for a retry; 'allow' prints anyway.
+    """
+    data = request.json or {}
+    barcode = data.get('barcode')
+    printer_name = data.get('printer_name')
+    label_settings = data.get('label_settings', {})
+    username = data.get('username', 'Unknown')
+    duplicate_policy = data.get('duplicate_policy', 'block')
+
+    if not barcode:
+        return jsonify({'error': 'Missing barcode'}), 400
+    if duplicate_policy not in ('block', 'allow'):
+        return jsonify({'error': "duplicate_policy must be 'block' or 'allow'"}), 400
+
+    try:
+        timer = metrics.StageTimer('print')
+        with timer.stage('resolve'):
+            matched_barcode, mapping = pdf_service.resolve_barcode(barcode)
+        if not mapping:
+            return jsonify({
+                'success': True,
+                'found': False,
+                'printed': False,
+                'message': 'Barcode not found',
+                'suggestions': pdf_service.suggest_barcodes(barcode)
             })
 
+        file_id = mapping['file_id']
+        page_num = mapping['page_num']
+        print_count = pdf_service.get_page_print_count(file_id, page_num)
+        scan = {
+            'found': True,
+            'matched_barcode': matched_barcode,
+            'mapping': mapping,
+            'print_count': print_count,
+            'last_print': pdf_service.get_last_print_for_page(file_id, page_num)
+        }
+
+        if print_count > 0 and duplicate_policy == 'block':
             return jsonify({
                 'success': True,
-                'mode': 'preview',
-                'message': 'macOS dev mode: preview generated (no physical print).',
-                'preview_url': f'/api/preview/{file_id}/{page_num}'
+                **scan,
+                'printed': False,
+                'duplicate': True,
+                'message': 'Already printed; resend with duplicate_policy=allow to reprint'
             })
 
-        # Pass username to print service
-        success, message = print_service.print_page(file_id, page_num, printer_name, label_settings, username)
-        if success:
-            return jsonify({'success': True, 'message': message})
-        else:
-            return jsonify({'success': False, 'error': message}), 500
+        # A print of this page is waiting for its printer; another scan must not queue a second copy
+        pending = print_retries.pending_for_page(file_id, page_num) if print_retries is not None else None
+        if pending and duplicate_policy == 'block':
+            return jsonify({
+                'success': True,
+                **scan,
+                'printed': False,
+                'duplicate': True,
+                'pending': True,
+                'pending_job': pending,
+                'message': 'A print of this page is waiting for a retry; resend with duplicate_policy=allow to print another'
+            })
+
+        body, status_code = submit_print(file_id, page_num, printer_name, label_settings, username, timer=timer)
+        return jsonify({**scan, **body, 'printed': bool(body.get('success')), 'duplicate': print_count > 0}), status_code
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -409,5 +995,70 @@ def download_report():
         logger.error(f"Report generation failed: {e}")
         return jsonify({'error': str(e)}), 500
 
+def warmup():
+    """Preload the renderer and the barcode index before accepting traffic."""
+    start = time.perf_counter()
+    timings = print_service.warmup()
+    counts = pdf_service.warmup()
+    logger.info("Warmup done in %.0f ms (%s mappings, %s print jobs)",
+                (time.perf_counter() - start) * 1000, counts['mappings'], counts['print_jobs'])
+    return timings
+
+def start_background():
+    """Start the database writer and background workers in the serving process (both modes)."""
+    pdf_service.start_writer()
+    retention.start()
+    reindexer.start()
+    printer_pools.start()
+    if print_retries is not None:
+        print_retries.start()
+    if hot_folder is not None:
+        hot_folder.start()
+    atexit.register(pdf_service.flush_db, 10)
+    # Exit through atexit on SIGTERM so pending database writes are flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+def serve_production(host, port, threads):
+    """Serve with a pool of worker threads and no debugger or reloader.
+
+    All workers share the one in-memory service (barcode index, render cache,
+    event feed); the database is written by a single background writer.
+    """
+    start_background()
+    try:
+        from waitress import serve
+    except ImportError:
+        logger.warning("waitress is not installed; falling back to the threaded Werkzeug server")
+        from werkzeug.serving import run_simple
+        run_simple(host, port, app, threaded=True)
+        return
+    logger.info(f"Serving on {host}:{port} with {threads} worker threads")
+    serve(app, host=host, port=port, threads=threads)
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    parser = argparse.ArgumentParser(description='Brady local print bridge')
+    parser.add_argument('--warmup', action='store_true', help='Load the renderer and barcode index before serving requests.')
+    parser.add_argument('--profile-imports', action='store_true', help='Print how long each heavy module takes to import, then exit.')
+    parser.add_argument('--production', action='store_true', help='Serve with worker threads instead of the debug server.')
+    parser.add_argument('--threads', type=int, default=8, help='Worker threads in production mode (default: 8).')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001)
+    args = parser.parse_args()
+
+    if args.profile_imports:
+        print(startup.format_import_profile(startup.preload_modules()))
+        raise SystemExit(0)
+
+    if args.production:
+        if args.warmup:
+            warmup()
+        serve_production(args.host, args.port, args.threads)
+        raise SystemExit(0)
+
+    # With the debug reloader the serving process is the child (WERKZEUG_RUN_MAIN)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background()
+        if args.warmup:
+            warmup()
+
+    app.run(host=args.host, port=args.port, debug=True)
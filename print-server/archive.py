@@ -0,0 +1,239 @@
+"""Cold storage for old print history.
+
+Print jobs older than the archive window are moved out of the live database
+into immutable segment files, one or more per calendar month:
+
+    uploads/archive/jobs-2025-11-0001.jsonl.gz
+
+``archive/index.json`` lists every segment with its job count and min/max
+timestamp, so a history query only opens the segments overlapping its date
+range. The index also keeps per-segment aggregates (successful prints per
+page with the latest one, success/failure counts per day and document), so
+duplicate-print warnings and dashboard stats still count archived jobs
+without reading any segment.
+
+A segment is written and fsynced before its jobs leave the live store and
+stays ``pending`` in the index until the database without them is saved.
+After a crash in between, ``pending`` segments tell load_db which live jobs
+are already archived.
+"""
+
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import records
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = 'index.json'
+
+
+def archive_root(upload_folder):
+    return os.path.join(upload_folder, 'archive')
+
+
+def job_identity(job):
+    return (job.get('id'), job.timestamp_us, job.file_id, job.page_num)
+
+
+class JobArchive:
+    def __init__(self, upload_folder, cached_segments=4):
+        self.root = archive_root(upload_folder)
+        self.index_path = os.path.join(self.root, INDEX_FILENAME)
+        self.segments = []  # Index entries, oldest first
+        self._hidden = set()  # Written, but their jobs are still in the live store
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # file -> decoded jobs (segments never change)
+        self._cached_segments = cached_segments
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path) as handle:
+                self.segments = json.load(handle).get('segments', [])
+        except Exception as e:
+            logger.error(f"Failed to load archive index: {e}")
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.index.', suffix='.json', dir=self.root)
+        with os.fdopen(fd, 'w') as handle:
+            json.dump({'segments': self.segments}, handle, indent=2)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, self.index_path)
+
+    def _visible(self):
+        with self._lock:
+            return [meta for meta in self.segments if meta['file'] not in self._hidden]
+
+    # Writing
+
+    def write_segments(self, jobs):
+        """Write jobs (with timestamps) to new segments, one per month; returns their index entries.
+
+        The segments are recorded as pending and hidden from queries until
+        publish() is called with the jobs removed from the live store.
+        """
+        by_month = {}
+        for job in jobs:
+            by_month.setdefault(records.us_to_timestamp(job.timestamp_us)[:7], []).append(job)
+
+        written = []
+        os.makedirs(self.root, exist_ok=True)
+        for month, month_jobs in sorted(by_month.items()):
+            month_jobs.sort(key=lambda job: job.sort_key)
+            with self._lock:
+                sequence = 1 + sum(1 for meta in self.segments if meta['month'] == month)
+            name = f'jobs-{month}-{sequence:04d}.jsonl.gz'
+            self._write_segment_file(os.path.join(self.root, name), month_jobs)
+            meta = {
+                'file': name,
+                'month': month,
+                'count': len(month_jobs),
+                'min_us': month_jobs[0].timestamp_us,
+                'max_us': month_jobs[-1].timestamp_us,
+                'bytes': os.path.getsize(os.path.join(self.root, name)),
+                'state': 'pending',
+                **self._aggregates(month_jobs)
+            }
+            with self._lock:
+                self.segments.append(meta)
+                self._hidden.add(name)
+                self._save_index()
+            written.append(meta)
+        return written
+
+    def _write_segment_file(self, path, jobs):
+        fd, temp_path = tempfile.mkstemp(prefix='.segment.', suffix='.gz', dir=self.root)
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as handle:
+                    for job in jobs:
+                        handle.write(json.dumps(job.to_dict(), separators=(',', ':')).encode('utf-8'))
+                        handle.write(b'\n')
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def _aggregates(jobs):
+        pages = {}  # (file_id, page_num) -> [count, latest job]
+        daily = {}  # date -> file_id -> [succeeded, failed]
+        for job in jobs:
+            day = daily.setdefault(records.us_to_timestamp(job.timestamp_us)[:10], {})
+            counts = day.setdefault(job.file_id, [0, 0])
+            if job.status_code == records.STATUS_SUCCESS:
+                counts[0] += 1
+                entry = pages.get((job.file_id, job.page_num))
+                if entry is None:
+                    pages[(job.file_id, job.page_num)] = [1, job]
+                else:
+                    entry[0] += 1
+                    if job.sort_key >= entry[1].sort_key:
+                        entry[1] = job
+            elif job.status_code == records.STATUS_FAILED:
+                counts[1] += 1
+        return {
+            'pages': [[file_id, page_num, count, job.to_dict()] for (file_id, page_num), (count, job) in pages.items()],
+            'daily': daily
+        }
+
+    def publish(self, segments):
+        """Make segments visible to queries (their jobs have left the live store)."""
+        with self._lock:
+            for meta in segments:
+                self._hidden.discard(meta['file'])
+
+    def commit(self, segments):
+        """Mark segments final once a database without their jobs is on disk."""
+        with self._lock:
+            for meta in segments:
+                meta['state'] = 'committed'
+            self._save_index()
+
+    def pending_segments(self):
+        with self._lock:
+            return [meta for meta in self.segments if meta.get('state') == 'pending']
+
+    # Reading
+
+    def read_segment(self, meta):
+        with self._lock:
+            jobs = self._cache.get(meta['file'])
+            if jobs is not None:
+                self._cache.move_to_end(meta['file'])
+                return jobs
+        with gzip.open(os.path.join(self.root, meta['file']), 'rt', encoding='utf-8') as handle:
+            jobs = [records.PrintJobRecord.from_dict(json.loads(line)) for line in handle if line.strip()]
+        with self._lock:
+            self._cache[meta['file']] = jobs
+            while len(self._cache) > self._cached_segments:
+                self._cache.popitem(last=False)
+        return jobs
+
+    def query(self, start_us=None, end_us=None, status=None):
+        """Archived jobs in [start_us, end_us), reading only the overlapping segments."""
+        found = []
+        for meta in self._visible():
+            if (start_us is not None and meta['max_us'] < start_us) or (end_us is not None and meta['min_us'] >= end_us):
+                continue
+            for job in self.read_segment(meta):
+                if status and status != 'all' and job.status != status:
+                    continue
+                ts = job.timestamp_us
+                if (start_us is not None and ts < start_us) or (end_us is not None and ts >= end_us):
+                    continue
+                found.append(job)
+        return found
+
+    def page_prints(self):
+        """(file_id, page_num) -> [successful prints, latest job] over all archived jobs."""
+        merged = {}
+        for meta in self._visible():
+            for file_id, page_num, count, last in meta['pages']:
+                job = records.PrintJobRecord.from_dict(last)
+                entry = merged.get((file_id, page_num))
+                if entry is None:
+                    merged[(file_id, page_num)] = [count, job]
+                else:
+                    entry[0] += count
+                    if job.sort_key >= entry[1].sort_key:
+                        entry[1] = job
+        return merged
+
+    def print_counts(self, file_ids, from_date=None, to_date=None):
+        """(succeeded, failed) archived prints of file_ids between two dates (inclusive)."""
+        start = from_date.isoformat() if from_date else None
+        end = to_date.isoformat() if to_date else None
+        succeeded = failed = 0
+        for meta in self._visible():
+            for day, per_file in meta['daily'].items():
+                if (start and day < start) or (end and day > end):
+                    continue
+                for file_id, (ok, bad) in per_file.items():
+                    if file_id in file_ids:
+                        succeeded += ok
+                        failed += bad
+        return succeeded, failed
+
+    def summary(self):
+        segments = self._visible()
+        return {
+            'segments': [{key: meta[key] for key in ('file', 'month', 'count', 'bytes', 'state')} | {
+                'from': records.us_to_timestamp(meta['min_us']),
+                'to': records.us_to_timestamp(meta['max_us'])
+            } for meta in segments],
+            'total_jobs': sum(meta['count'] for meta in segments),
+            'total_bytes': sum(meta['bytes'] for meta in segments)
+        }
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""Reproducible performance benchmarks for the print server.
+
+Runs against the sample PDFs in media/pdfs and synthetic data, in a
+temporary upload folder, so the real uploads/ database is never touched and
+no printer is needed (``lpr`` is replaced by a stub that exits 0).
+
+Benchmarks:
+- ingest: ``process_pdf`` pages/s over the sample PDFs
+- extraction: ``extract_serial_numbers`` per page of extracted text
+- resolve: ``resolve_barcode`` exact / normalized / partial / miss latency
+  at 1k, 10k and 100k synthetic mappings
+- crop: ``_extract_page_bytes`` per page (label preview/print crop)
+- stats: ``get_dashboard_stats`` at 1k, 10k and 100k print jobs
+- save: ``save_db`` for json and snapshot formats at the same history sizes
+- print: ``print_page`` end to end with the stub ``lpr``
+
+Results are written as JSON (stdout or --output). ``--compare old.json``
+prints the relative change of every result against an earlier run:
+
+    python3 benchmark.py --output before.json
+    ... change code ...
+    python3 benchmark.py --compare before.json
+"""
+
+import argparse
+import datetime as dt
+import glob
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PDF_DIR = os.path.join(SCRIPT_DIR, "..", "media", "pdfs")
+MAPPING_SIZES = (1000, 10000, 100000)
+HISTORY_SIZES = (1000, 10000, 100000)
+QUICK_SIZES = (1000, 10000)
+
+
+def measure(func, repeat=5, number=1):
+    """Median seconds per call of ``func`` over ``repeat`` rounds of ``number`` calls."""
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - start) / number)
+    return statistics.median(rounds)
+
+
+def latency_summary(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(int(q * len(samples)), len(samples) - 1)]
+    return {
+        "unit": "us",
+        "p50": round(pick(0.50) * 1e6, 2),
+        "p99": round(pick(0.99) * 1e6, 2),
+        "mean": round(statistics.fmean(samples) * 1e6, 2),
+    }
+
+
+def timed_calls(func, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def new_service(folder, db_format="json"):
+    from services import PDFProcessingService
+    return PDFProcessingService(upload_folder=folder, db_format=db_format)
+
+
+def random_barcode(rnd):
+    prefix = rnd.choice(["K9", "1M", "SN"])
+    return prefix + "".join(rnd.choice(string.digits) for _ in range(9))
+
+
+def synthetic_mappings(count, rnd):
+    import records
+    mappings = {}
+    while len(mappings) < count:
+        barcode = random_barcode(rnd)
+        mappings[barcode] = records.MappingRecord(
+            file_id=f"doc-{len(mappings) % 500}",
+            page_num=1 + len(mappings) % 40,
+            type="BARCODE_K",
+            confidence=0.9,
+            doc_name=f"doc-{len(mappings) % 500}.pdf",
+        )
+    return mappings
+
+
+def synthetic_history(service, count, rnd):
+    import records
+    documents = {}
+    for i in range(200):
+        doc_id = f"doc-{i}"
+        documents[doc_id] = {
+            "id": doc_id,
+            "name": f"{doc_id}.pdf",
+            "path": "",
+            "uploaded_at": (dt.datetime(2026, 1, 1) + dt.timedelta(hours=i)).isoformat(),
+            "pages": 40,
+            "barcodes_found": 40,
+            "hash": f"{i:064x}",
+        }
+    start = dt.datetime(2026, 1, 1)
+    jobs = []
+    for i in range(count):
+        doc_id = f"doc-{rnd.randrange(200)}"
+        jobs.append(records.PrintJobRecord({
+            "id": f"job-{i}",
+            "file_id": doc_id,
+            "doc_name": f"{doc_id}.pdf",
+            "page_num": 1 + rnd.randrange(40),
+            "printer": "Brady",
+            "status": "success" if rnd.random() > 0.05 else "failed",
+            "timestamp": (start + dt.timedelta(seconds=30 * i)).isoformat(),
+            "error": None,
+            "username": "bench",
+        }))
+    service.documents = documents
+    service.hashes = {doc["hash"]: doc_id for doc_id, doc in documents.items()}
+    service.print_jobs = jobs
+
+
+def bench_ingest(pdf_paths, work_dir):
+    folder = tempfile.mkdtemp(dir=work_dir)
+    service = new_service(folder)
+    pages = 0
+    start = time.perf_counter()
+    for path in pdf_paths:
+        copy = os.path.join(folder, f"ingest_{os.path.basename(path)}")
+        shutil.copyfile(path, copy)
+        result = service.process_pdf(copy, os.path.basename(path))
+        if not result["is_duplicate"]:
+            pages += result["stats"]["pages"]
+    elapsed = time.perf_counter() - start
+    return service, {
+        "unit": "pages/s",
+        "value": round(pages / elapsed, 2) if elapsed else None,
+        "pages": pages,
+        "documents": len(service.documents),
+        "seconds": round(elapsed, 3),
+    }
+
+
+def bench_extraction(pdf_paths):
+    import pypdf
+    from services import TextExtractionService
+    texts = []
+    for path in pdf_paths:
+        for page in pypdf.PdfReader(path).pages:
+            texts.append(page.extract_text() or "")
+    extractor = TextExtractionService()
+    samples = timed_calls(extractor.extract_serial_numbers, [(text,) for text in texts])
+    return {**latency_summary(samples), "pages": len(texts)}
+
+
+def bench_resolve(work_dir, sizes, rnd):
+    service = new_service(tempfile.mkdtemp(dir=work_dir))
+    results = {}
+    for size in sizes:
+        service.mappings = synthetic_mappings(size, rnd)
+        service.warmup()  # Build the index outside the timed lookups
+        keys = list(service.mappings.keys())
+        sample = [rnd.choice(keys) for _ in range(500)]
+        results[str(size)] = {
+            "exact": latency_summary(timed_calls(service.resolve_barcode, [(k,) for k in sample])),
+            "normalized": latency_summary(timed_calls(service.resolve_barcode, [(f"  {k.lower()}\x1d",) for k in sample])),
+            "partial": latency_summary(timed_calls(service.resolve_barcode, [(f"PN123|{k}|LOT9",) for k in sample[:50]])),
+            "miss": latency_summary(timed_calls(service.resolve_barcode, [("ZZ" + random_barcode(rnd),) for _ in range(50)])),
+        }
+    return results
+
+
+def bench_crop(service):
+    calls = []
+    for doc in service.documents.values():
+        for page_num in range(1, doc["pages"] + 1):
+            calls.append((doc["path"], page_num, {}))
+    samples = timed_calls(service._extract_page_bytes, calls)
+    return {**latency_summary(samples), "pages": len(calls)}
+
+
+def bench_stats_and_save(work_dir, sizes, rnd):
+    stats_results, save_results = {}, {}
+    for db_format in ("json", "snapshot"):
+        service = new_service(tempfile.mkdtemp(dir=work_dir), db_format=db_format)
+        for size in sizes:
+            synthetic_history(service, size, rnd)
+            if db_format == "json":
+                stats_results[str(size)] = {
+                    "unit": "ms",
+                    "all_time": round(measure(service.get_dashboard_stats, repeat=3) * 1000, 2),
+                    "one_day": round(measure(lambda: service.get_dashboard_stats("2026-01-02", "2026-01-02"), repeat=3) * 1000, 2),
+                }
+            save_results.setdefault(db_format, {})[str(size)] = {
+                "unit": "ms",
+                "value": round(measure(service.save_db, repeat=3) * 1000, 2),
+            }
+    return stats_results, save_results
+
+
+def bench_print(service, work_dir):
+    from services import PrintService
+    stub_dir = tempfile.mkdtemp(dir=work_dir)
+    stub = os.path.join(stub_dir, "lpr")
+    with open(stub, "w") as handle:
+        handle.write("#!/bin/sh\nexit 0\n")
+    os.chmod(stub, 0o755)
+
+    printer = PrintService(service)
+    pages = [(doc_id, page_num) for doc_id, doc in service.documents.items() for page_num in range(1, doc["pages"] + 1)]
+    old_path, old_cwd = os.environ.get("PATH", ""), os.getcwd()
+    os.environ["PATH"] = stub_dir + os.pathsep + old_path
+    os.chdir(stub_dir)  # print_page writes its temp PDF to the working directory
+    try:
+        samples = timed_calls(lambda doc_id, page_num: printer.print_page(doc_id, page_num, username="bench"), pages)
+    finally:
+        os.environ["PATH"] = old_path
+        os.chdir(old_cwd)
+    return {**latency_summary(samples), "jobs": len(samples)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(pdf_dir, quick=False, seed=1):
+    pdf_paths = sorted(glob.glob(os.path.join(pdf_dir, "*.pdf")))
+    if not pdf_paths:
+        raise FileNotFoundError(f"No PDFs found in {pdf_dir}")
+    mapping_sizes = QUICK_SIZES if quick else MAPPING_SIZES
+    history_sizes = QUICK_SIZES if quick else HISTORY_SIZES
+    rnd = random.Random(seed)
+
+    work_dir = tempfile.mkdtemp(prefix="brady-bench-")
+    try:
+        service, ingest = bench_ingest(pdf_paths, work_dir)
+        stats, save = bench_stats_and_save(work_dir, history_sizes, rnd)
+        results = {
+            "ingest": ingest,
+            "extraction": bench_extraction(pdf_paths),
+            "resolve": bench_resolve(work_dir, mapping_sizes, rnd),
+            "crop": bench_crop(service),
+            "stats": stats,
+            "save": save,
+            "print": bench_print(service, work_dir),
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pdfs": len(pdf_paths),
+            "quick": quick,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def flatten(results, prefix=""):
+    """{'resolve': {'1000': {'exact': {'p50': ..}}}} -> {'resolve.1000.exact.p50': ..}"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(old, new):
+    old_flat, new_flat = flatten(old["results"]), flatten(new["results"])
+    lines = [f"{'metric':<45} {'old':>12} {'new':>12} {'change':>8}"]
+    for name in sorted(set(old_flat) & set(new_flat)):
+        before, after = old_flat[name], new_flat[name]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        lines.append(f"{name:<45} {before:>12} {after:>12} {change:>8}")
+    lines.append("(pages/s: higher is better; us/ms: lower is better)")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest, lookup, rendering, stats and persistence.")
+    parser.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR, help="Folder of sample PDFs. Default: ../media/pdfs.")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+    parser.add_argument("--compare", metavar="OLD_JSON", help="Compare this run with an earlier results file.")
+    parser.add_argument("--quick", action="store_true", help="Skip the 100k-size runs.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for synthetic data. Default: 1.")
+    args = parser.parse_args()
+
+    # The services log every barcode found; keep benchmark output readable
+    logging.disable(logging.INFO)
+    sys.path.insert(0, SCRIPT_DIR)
+
+    report = run(args.pdf_dir, quick=args.quick, seed=args.seed)
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    elif not args.compare:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as handle:
+            print(compare(json.load(handle), report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Content-addressed storage for uploaded PDFs.
+
+Uploads are spooled to a temp file in the upload folder while being hashed,
+then moved to ``blobs/<first 2 hex chars>/<remaining hex chars>`` so the same
+bytes are only ever stored once and a file name can never clobber another
+upload.
+
+Blobs are reference counted by the documents that point at them. The counts
+are derived from ``documents`` on load (like the hash index), so a blob is
+removed exactly when its last document goes away.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import zipfile
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PREFIX = '.upload.'
+SPOOL_BUFFER_SIZE = 1024 * 1024
+
+
+class HashingSpoolFile:
+    """Writable temp file that computes SHA-256 of everything written to it.
+
+    Used as the Werkzeug upload stream so the hash is ready as soon as the
+    request body has been read. ``finish()`` hands the file over to the
+    caller; a spool that is closed without being finished is deleted.
+    """
+
+    def __init__(self, directory, buffer_size=SPOOL_BUFFER_SIZE):
+        fd, self.path = tempfile.mkstemp(prefix=SPOOL_PREFIX, suffix='.part', dir=directory)
+        self._file = os.fdopen(fd, 'w+b', buffering=buffer_size)
+        self._hash = hashlib.sha256()
+        self._finished = False
+
+    def write(self, data):
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def finish(self):
+        """Close the file and return (path, sha256 hex digest); caller owns the file."""
+        self._file.close()
+        self._finished = True
+        return self.path, self._hash.hexdigest()
+
+    def close(self):
+        self._file.close()
+        if not self._finished and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def spool_stream(stream, directory, chunk_size=SPOOL_BUFFER_SIZE):
+    """Copy a readable stream to a spool file; returns (path, sha256 hex digest)."""
+    spool = HashingSpoolFile(directory)
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    return spool.finish()
+
+
+def spool_zip_pdfs(zip_path, directory, max_entries=500, max_total_bytes=2 * 1024 ** 3):
+    """Spool every PDF inside a ZIP archive; returns [(entry name, spool path, sha256)].
+
+    Entries are streamed out one at a time, so neither the archive nor an
+    entry is ever held in memory. Sizes are counted while reading rather
+    than taken from the archive headers, so a ZIP bomb stops at the limit.
+    """
+    spooled = []
+    total = 0
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                base = os.path.basename(name)
+                if info.is_dir() or not base.lower().endswith('.pdf') or base.startswith('.') or '__MACOSX/' in name:
+                    continue
+                if len(spooled) >= max_entries:
+                    raise ValueError(f'ZIP archive has more than {max_entries} PDFs')
+                spool = HashingSpoolFile(directory)
+                try:
+                    with archive.open(info) as entry:
+                        for block in iter(lambda: entry.read(SPOOL_BUFFER_SIZE), b''):
+                            total += len(block)
+                            if total > max_total_bytes:
+                                raise ValueError('ZIP archive expands to more than the upload limit')
+                            spool.write(block)
+                except Exception:
+                    spool.close()
+                    raise
+                spooled.append((base,) + spool.finish())
+    except Exception:
+        for _name, path, _hash in spooled:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    return spooled
+
+
+def hash_file(path, chunk_size=SPOOL_BUFFER_SIZE):
+    sha256_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            sha256_hash.update(block)
+    return sha256_hash.hexdigest()
+
+
+def blob_root(upload_folder):
+    return os.path.join(upload_folder, 'blobs')
+
+
+def iter_blobs(upload_folder):
+    """Yield (file_hash, path) for every blob on disk."""
+    root = blob_root(upload_folder)
+    if not os.path.isdir(root):
+        return
+    for prefix in sorted(os.listdir(root)):
+        directory = os.path.join(root, prefix)
+        if not os.path.isdir(directory):
+            continue
+        for rest in sorted(os.listdir(directory)):
+            yield prefix + rest, os.path.join(directory, rest)
+
+
+def remove_blob(path):
+    """Delete a blob file and its fan-out directory once that is empty."""
+    os.remove(path)
+    try:
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+
+
+class BlobStore:
+    def __init__(self, upload_folder):
+        self.upload_folder = upload_folder
+        self.root = blob_root(upload_folder)
+        self.refs = Counter()  # hash -> number of documents using the blob
+        os.makedirs(self.root, exist_ok=True)
+        self._remove_stale_spools()
+
+    def _remove_stale_spools(self):
+        # Spool files left behind by a crash mid-upload
+        for filename in os.listdir(self.upload_folder):
+            if filename.startswith(SPOOL_PREFIX):
+                try:
+                    os.remove(os.path.join(self.upload_folder, filename))
+                except OSError as e:
+                    logger.warning(f"Could not remove stale upload spool {filename}: {e}")
+
+    def path_for(self, file_hash):
+        return os.path.join(self.root, file_hash[:2], file_hash[2:])
+
+    def is_blob_path(self, path):
+        return bool(path) and os.path.abspath(path).startswith(os.path.abspath(self.root) + os.sep)
+
+    def rebuild_refs(self, documents):
+        self.refs = Counter(
+            doc['hash'] for doc in documents.values()
+            if doc.get('hash') and self.is_blob_path(doc.get('path'))
+        )
+
+    def acquire(self, file_hash):
+        self.refs[file_hash] += 1
+
+    def release(self, file_hash):
+        """Drop one reference; the blob is deleted with its last reference."""
+        self.refs[file_hash] -= 1
+        if self.refs[file_hash] > 0:
+            return False
+        del self.refs[file_hash]
+        path = self.path_for(file_hash)
+        if os.path.exists(path):
+            remove_blob(path)
+        return True
+
+    def adopt(self, path):
+        """Move an existing (legacy) upload into the store; returns (hash, blob path)."""
+        file_hash = hash_file(path)
+        blob_path = self.path_for(file_hash)
+        if os.path.exists(blob_path):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(path, blob_path)
+        return file_hash, blob_path
+
+    def exists(self, file_hash):
+        return os.path.exists(self.path_for(file_hash))
+
+    def put(self, temp_path, file_hash):
+        """Move a spooled file into the store; returns the blob path."""
+        path = self.path_for(file_hash)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return path
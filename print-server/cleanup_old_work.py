@@ -6,16 +6,29 @@ This cleans the local JSON database and upload directory together:
 - barcode mappings that reference removed/missing documents
 - print jobs older than the cutoff or tied to removed documents
 - orphan PDF files in uploads/ older than the cutoff
+- content-addressed blobs in uploads/blobs/ no remaining document references
+- precomputed labels in uploads/labels/ of documents that are gone
+- extracted page text in uploads/text/ of documents that are gone
 
 Users are intentionally preserved.
+
+Run this with the server stopped: it rewrites the database file, which a
+running server would overwrite on its next save. A running server expires
+old work itself with BRADY_RETENTION_DAYS (see retention.py).
 """
 
 import argparse
 import datetime as dt
 import json
 import os
+import shutil
 import tempfile
 
+import snapshot
+from blobstore import blob_root, iter_blobs
+from label_store import label_root
+from text_store import iter_texts, text_root
+
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DEFAULT_UPLOAD_FOLDER = os.path.join(SCRIPT_DIR, "uploads")
@@ -67,17 +80,34 @@ def remove_file(path, dry_run):
     return True
 
 
+def prune_empty_dirs(root):
+    if not os.path.isdir(root):
+        return
+    for prefix in os.listdir(root):
+        directory = os.path.join(root, prefix)
+        if os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+
+
 def cleanup(upload_folder, days, dry_run):
     upload_folder = os.path.abspath(upload_folder)
     db_path = os.path.join(upload_folder, DB_FILENAME)
+    snapshot_path = os.path.join(upload_folder, snapshot.SNAPSHOT_FILENAME)
     cutoff = dt.datetime.now() - dt.timedelta(days=days)
 
-    if not os.path.exists(db_path):
+    # Servers running with BRADY_DB_FORMAT=snapshot keep db.snap current instead of db.json
+    use_snapshot = os.path.exists(snapshot_path) and (
+        not os.path.exists(db_path) or os.path.getmtime(snapshot_path) >= os.path.getmtime(db_path)
+    )
+
+    if use_snapshot:
+        data = snapshot.load_all(snapshot_path)
+    elif os.path.exists(db_path):
+        with open(db_path, "r") as handle:
+            data = json.load(handle)
+    else:
         raise FileNotFoundError(f"Database not found: {db_path}")
 
-    with open(db_path, "r") as handle:
-        data = json.load(handle)
-
     documents = data.get("documents", {})
     mappings = data.get("mappings", {})
     print_jobs = data.get("print_jobs", [])
@@ -132,7 +162,8 @@ def cleanup(upload_folder, days, dry_run):
     orphan_files = []
     for filename in os.listdir(upload_folder):
         path = os.path.join(upload_folder, filename)
-        if filename == DB_FILENAME or not os.path.isfile(path):
+        # Only uploads: the database, hot folder state and other server files live here too
+        if not filename.lower().endswith(".pdf") or not os.path.isfile(path):
             continue
         if os.path.abspath(path) in retained_paths:
             continue
@@ -141,6 +172,31 @@ def cleanup(upload_folder, days, dry_run):
         if modified_at < cutoff and remove_file(path, dry_run):
             orphan_files.append(path)
 
+    # Blobs are shared by content, so one is only removed when no kept document uses it
+    for _file_hash, path in iter_blobs(upload_folder):
+        if os.path.abspath(path) in retained_paths or path in deleted_files:
+            continue
+        modified_at = dt.datetime.fromtimestamp(os.path.getmtime(path))
+        if modified_at < cutoff and remove_file(path, dry_run):
+            orphan_files.append(path)
+
+    kept_hashes = {doc.get("hash") for doc in kept_documents.values()}
+    removed_label_sets = 0
+    labels_folder = label_root(upload_folder)
+    if os.path.isdir(labels_folder):
+        for file_hash in sorted(os.listdir(labels_folder)):
+            directory = os.path.join(labels_folder, file_hash)
+            if file_hash in kept_hashes or not os.path.isdir(directory):
+                continue
+            if not dry_run:
+                shutil.rmtree(directory, ignore_errors=True)
+            removed_label_sets += 1
+
+    removed_texts = 0
+    for file_hash, path in iter_texts(upload_folder):
+        if file_hash not in kept_hashes and remove_file(path, dry_run):
+            removed_texts += 1
+
     updated = {
         **data,
         "documents": kept_documents,
@@ -149,7 +205,12 @@ def cleanup(upload_folder, days, dry_run):
     }
 
     if not dry_run:
-        atomic_write_json(db_path, updated)
+        prune_empty_dirs(blob_root(upload_folder))
+        prune_empty_dirs(text_root(upload_folder))
+        if use_snapshot:
+            snapshot.write_snapshot(snapshot_path, updated)
+        else:
+            atomic_write_json(db_path, updated)
 
     return {
         "cutoff": cutoff.isoformat(timespec="seconds"),
@@ -158,6 +219,8 @@ def cleanup(upload_folder, days, dry_run):
         "removed_print_jobs": removed_print_jobs,
         "deleted_document_files": len(deleted_files),
         "deleted_orphan_files": len(orphan_files),
+        "deleted_label_sets": removed_label_sets,
+        "deleted_page_texts": removed_texts,
         "dry_run": dry_run,
     }
 
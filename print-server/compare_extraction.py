@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Check that adaptive layout extraction finds the same barcodes as always running it.
+
+Parses every PDF in a folder with ``parse_pdf`` in both layout modes and
+compares the barcodes found per page, along with the parse time and how
+many pages ran the layout pass. Run it over a corpus of real order PDFs
+before switching a site to ``BRADY_LAYOUT_TEXT=adaptive``:
+
+    python3 compare_extraction.py --pdf-dir /path/to/orders
+
+Prints a JSON report and exits with status 1 when adaptive mode misses (or
+adds) a barcode on any page.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PDF_DIR = os.path.join(SCRIPT_DIR, "..", "media", "pdfs")
+
+
+def unique_pdfs(pdf_dir):
+    """PDFs in the folder (recursively), skipping byte-identical copies."""
+    seen = set()
+    paths = []
+    for path in sorted(glob.glob(os.path.join(pdf_dir, "**", "*.pdf"), recursive=True)):
+        with open(path, "rb") as handle:
+            digest = hashlib.sha256(handle.read()).hexdigest()
+        if digest not in seen:
+            seen.add(digest)
+            paths.append(path)
+    return paths
+
+
+def timed_parse(parse_pdf, path, layout_mode, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parse_pdf(path, layout_mode)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def barcodes(result):
+    return {(page_num, serial["text"]) for page_num, serial in result["serials"]}
+
+
+def compare(paths, repeat=1):
+    from services import parse_pdf
+
+    files = []
+    totals = {"pages": 0, "always_s": 0.0, "adaptive_s": 0.0, "always_layout_pages": 0,
+              "adaptive_layout_pages": 0, "barcodes": 0, "missed": 0, "extra": 0}
+    for path in paths:
+        always, always_s = timed_parse(parse_pdf, path, "always", repeat)
+        adaptive, adaptive_s = timed_parse(parse_pdf, path, "adaptive", repeat)
+        expected, found = barcodes(always), barcodes(adaptive)
+        missed = sorted(expected - found)
+        extra = sorted(found - expected)
+        files.append({
+            "file": os.path.relpath(path, os.getcwd()),
+            "pages": always["pages"],
+            "barcodes": len(expected),
+            "always_ms": round(always_s * 1000, 1),
+            "adaptive_ms": round(adaptive_s * 1000, 1),
+            "adaptive_layout_pages": adaptive["layout_pages"],
+            "missed": [{"page": page, "barcode": text} for page, text in missed],
+            "extra": [{"page": page, "barcode": text} for page, text in extra]
+        })
+        totals["pages"] += always["pages"]
+        totals["always_s"] += always_s
+        totals["adaptive_s"] += adaptive_s
+        totals["always_layout_pages"] += always["layout_pages"]
+        totals["adaptive_layout_pages"] += adaptive["layout_pages"]
+        totals["barcodes"] += len(expected)
+        totals["missed"] += len(missed)
+        totals["extra"] += len(extra)
+
+    totals["always_s"] = round(totals["always_s"], 3)
+    totals["adaptive_s"] = round(totals["adaptive_s"], 3)
+    totals["speedup"] = round(totals["always_s"] / totals["adaptive_s"], 2) if totals["adaptive_s"] else None
+    return {"files": files, "totals": totals}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare adaptive and always-on layout text extraction over a corpus.")
+    parser.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR, help="Folder of PDFs (searched recursively). Default: ../media/pdfs.")
+    parser.add_argument("--repeat", type=int, default=1, help="Parse each file this many times per mode and keep the fastest. Default: 1.")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    # The services log every barcode found; keep the report readable
+    logging.disable(logging.INFO)
+    sys.path.insert(0, SCRIPT_DIR)
+
+    paths = unique_pdfs(args.pdf_dir)
+    if not paths:
+        parser.error(f"No PDFs found in {args.pdf_dir}")
+    report = compare(paths, repeat=args.repeat)
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    raise SystemExit(1 if report["totals"]["missed"] or report["totals"]["extra"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Single background writer for the print server database.
+
+In production mode request threads only mark the database dirty; one writer
+thread serializes and writes it. A burst of changes (several prints landing
+together) becomes one write, request threads never wait on disk I/O, and
+two writes can never interleave.
+
+A failed write (disk full, file locked by a virus scanner) is tried again
+on its own after ``retry_delay`` seconds, doubling up to ``max_retry_delay``,
+so an idle station does not keep its last changes only in memory.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingWriter:
+    def __init__(self, write, delay=0.05, name='db-writer', retry_delay=1.0, max_retry_delay=60.0):
+        self._write = write
+        self._delay = delay  # Collect further changes for this long before writing
+        self._retry_delay = retry_delay
+        self._max_retry_delay = max_retry_delay
+        self._cond = threading.Condition()
+        self._requested = 0
+        self._written = 0
+        self._saved = 0  # Highest request covered by a successful write
+        self._stopping = False
+        self.stats = {'requests': 0, 'writes': 0, 'errors': 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def request(self):
+        """Schedule a write that includes every change made so far."""
+        with self._cond:
+            self._requested += 1
+            self.stats['requests'] += 1
+            self._cond.notify_all()
+
+    def pending(self):
+        """Saves requested but not on disk yet, including those of a failed write."""
+        with self._cond:
+            return self._requested - self._saved
+
+    def flush(self, timeout=None):
+        """Block until everything requested so far has been written.
+
+        Returns False on timeout, or when that write failed and no later one succeeded.
+        """
+        with self._cond:
+            target = self._requested
+            self._cond.wait_for(lambda: self._written >= target or not self._thread.is_alive(), timeout)
+            return self._saved >= target
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self):
+        failures = 0
+        retry_at = None  # Monotonic time to try again after a failed write
+        while True:
+            with self._cond:
+                while self._requested == self._written and not self._stopping:
+                    if retry_at is not None and time.monotonic() >= retry_at:
+                        break
+                    self._cond.wait(None if retry_at is None else retry_at - time.monotonic())
+                if self._requested == self._written and retry_at is None:
+                    return  # Stopping with nothing left to write
+
+            time.sleep(self._delay)
+            with self._cond:
+                target = self._requested
+
+            try:
+                ok = self._write() is not False
+            except Exception as e:
+                logger.error(f"Database write failed: {e}")
+                ok = False
+            if ok:
+                if failures:
+                    logger.info(f"Database written after {failures} failed tries")
+                failures, retry_at = 0, None
+            else:
+                self.stats['errors'] += 1
+                failures += 1
+                wait = min(self._max_retry_delay, self._retry_delay * 2 ** (failures - 1))
+                retry_at = time.monotonic() + wait
+                logger.warning(f"Database write failed; trying again in {wait:g} s")
+
+            with self._cond:
+                self._written = target
+                if ok:
+                    self._saved = target
+                self.stats['writes'] += 1
+                self._cond.notify_all()
+                if self._stopping and not ok:
+                    return  # Tried once more on the way out; stop() must not hang on a broken disk
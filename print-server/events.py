@@ -0,0 +1,104 @@
+"""In-process event feed for dashboards (served as Server-Sent Events).
+
+Services publish small events when state changes (a print job logged, a
+document added or deleted, the matching stats delta) and every connected
+``/api/events`` client gets them pushed, so dashboards apply deltas instead
+of re-requesting the full documents, history and stats.
+
+Recent events are kept in a short ring so a reconnecting client can send
+``Last-Event-ID`` and catch up. A client that falls further behind than its
+queue allows is sent ``resync`` and should reload everything once.
+"""
+
+import json
+import logging
+import queue
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = 15
+
+
+class Subscription:
+    def __init__(self, max_queue):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def offer(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+
+class EventBus:
+    def __init__(self, history=256, max_queue=1000):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._recent = deque(maxlen=history)
+        self._max_queue = max_queue
+        self._next_id = 1
+
+    def publish(self, event_type, data):
+        with self._lock:
+            event = (self._next_id, event_type, data)
+            self._next_id += 1
+            self._recent.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.offer(event)
+        return event[0]
+
+    def subscribe(self, last_event_id=None):
+        """Register a client; events after ``last_event_id`` are replayed if still held."""
+        subscription = Subscription(self._max_queue)
+        with self._lock:
+            if last_event_id is not None:
+                missed = [event for event in self._recent if event[0] > last_event_id]
+                if self._recent and self._recent[0][0] > last_event_id + 1:
+                    subscription.overflowed = True  # Older events are gone
+                for event in missed:
+                    subscription.offer(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def last_event_id(self):
+        with self._lock:
+            return self._next_id - 1
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stream(self, subscription, keepalive=KEEPALIVE_SECONDS):
+        """Yield SSE-formatted text for a subscription until the client goes away."""
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                if subscription.overflowed:
+                    # Carries the latest id so the reconnect resumes from here
+                    yield format_sse(self.last_event_id(), 'resync', {})
+                    return
+                try:
+                    event = subscription.queue.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(*event)
+        finally:
+            self.unsubscribe(subscription)
+
+
+def format_sse(event_id, event_type, data):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,123 @@
+"""Error-tolerant barcode lookup for scans that match nothing exactly.
+
+A worn label can scan with one character misread, inserted or dropped. The
+index finds stored barcodes within a small edit distance of such a scan
+without comparing it against every mapping.
+
+It is an inverted index of positional q-grams: every substring of ``q``
+characters of every normalized barcode, keyed by its position. One edit
+changes at most ``q`` of a barcode's q-grams and shifts the rest by at most
+one position. So a barcode within ``k`` edits of the scan shares at least
+one of any ``k * q + 1`` q-grams of the scan, give or take ``k`` positions.
+A search looks up only the ``k * q + 1`` rarest q-grams of the scan, then
+computes the real edit distance for the few barcodes found there. Serial
+numbers that share long prefixes do not slow it down: their rare q-grams
+are near the end.
+"""
+
+Q = 3
+DEFAULT_MAX_DISTANCE = 1
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance of a and b, or limit + 1 once it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+def one_edit_distance(a, b):
+    """edit_distance(a, b, 1) in linear time: 0, 1, or 2 for anything further apart."""
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return 2
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if i == len(a):
+        return len(b) - len(a)
+    if len(a) == len(b):
+        return 1 if a[i + 1:] == b[i + 1:] else 2
+    return 1 if a[i:] == b[i + 1:] else 2
+
+
+class FuzzyBarcodeIndex:
+    def __init__(self, q=Q, max_distance=DEFAULT_MAX_DISTANCE):
+        self.q = q
+        self.max_distance = max_distance
+        self._postings = []  # position -> {q-gram: set of normalized barcodes}
+
+    def update(self, norms):
+        q = self.q
+        postings = self._postings
+        for norm in norms:
+            grams = len(norm) - q + 1
+            while len(postings) < grams:
+                postings.append({})
+            for i in range(grams):
+                gram = norm[i:i + q]
+                bucket = postings[i].get(gram)
+                if bucket is None:
+                    postings[i][gram] = {norm}
+                else:
+                    bucket.add(norm)
+
+    def add(self, norm):
+        self.update((norm,))
+
+    def remove(self, norm):
+        q = self.q
+        for i in range(min(len(norm) - q + 1, len(self._postings))):
+            gram = norm[i:i + q]
+            bucket = self._postings[i].get(gram)
+            if bucket is not None:
+                bucket.discard(norm)
+                if not bucket:
+                    del self._postings[i][gram]
+
+    def _bucket(self, position, gram):
+        if 0 <= position < len(self._postings):
+            return self._postings[position].get(gram)
+        return None
+
+    def search(self, query, max_distance=None, limit=5):
+        """Stored barcodes within max_distance edits of query, closest first: [(norm, distance)]."""
+        k = self.max_distance if max_distance is None else max_distance
+        q = self.q
+        grams = [(i, query[i:i + q]) for i in range(len(query) - q + 1)]
+        needed = k * q + 1
+        if k < 1 or len(grams) < needed:
+            return []  # Too short to tell a misread from a different barcode
+
+        # Buckets each q-gram can be found in, allowing for positions shifted by up to k
+        probes = []
+        for position, gram in grams:
+            buckets = [self._bucket(position + shift, gram) for shift in range(-k, k + 1)]
+            buckets = [bucket for bucket in buckets if bucket]
+            probes.append((sum(len(bucket) for bucket in buckets), buckets))
+        probes.sort(key=lambda probe: probe[0])
+
+        candidates = set()
+        for _size, buckets in probes[:needed]:
+            for bucket in buckets:
+                candidates.update(bucket)
+        candidates.discard(query)
+
+        found = []
+        for norm in candidates:
+            if abs(len(norm) - len(query)) > k:
+                continue
+            distance = one_edit_distance(query, norm) if k == 1 else edit_distance(query, norm, k)
+            if distance <= k:
+                found.append((norm, distance))
+        found.sort(key=lambda item: (item[1], item[0]))
+        return found[:limit]
@@ -0,0 +1,220 @@
+"""Import PDFs dropped into a watched folder (e.g. an ERP export share).
+
+The folder is polled every few seconds. A PDF is picked up once its size and
+modification time are unchanged between two polls, so files still being
+copied in are left alone. Each file is copied into the upload folder while
+being hashed and handed to ``process_pdf`` with that hash, so a duplicate is
+recognized before any parsing. Afterwards it is moved to ``processed/`` (or
+``failed/``) inside the watched folder.
+
+Progress is recorded in ``uploads/hot_folder.json``. After a crash, files
+that were being imported are imported again (a file that had made it in is
+then recognized as a duplicate), and files that could not be moved, for
+example on a read-only share, are not imported twice.
+
+Imports run on a few worker threads and are rate limited (files per minute)
+so a large drop at shift start does not starve live scan and print requests.
+"""
+
+import collections
+import datetime
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+
+from werkzeug.utils import secure_filename
+
+import metrics
+from blobstore import spool_stream
+
+logger = logging.getLogger(__name__)
+
+STATE_FILENAME = 'hot_folder.json'
+DONE_FOLDER = 'processed'
+FAILED_FOLDER = 'failed'
+
+
+class RateLimiter:
+    """Spaces calls at least 60 / per_minute seconds apart across all threads."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class HotFolderIngester:
+    def __init__(self, service, folder, upload_folder, workers=2, per_minute=60, poll_interval=5, on_added=None):
+        self.service = service
+        self.folder = os.path.abspath(folder)
+        self.upload_folder = upload_folder
+        self.workers = workers
+        self.per_minute = per_minute
+        self.poll_interval = poll_interval
+        self.on_added = on_added  # Called with the file id of every new document
+        self.state_path = os.path.join(upload_folder, STATE_FILENAME)
+        self.files = self._load_state()  # name -> {size, mtime_ns, status, ...} for unfinished files
+        self.stats = {'imported': 0, 'duplicates': 0, 'failed': 0}
+        self.recent = collections.deque(maxlen=50)
+        self._limiter = RateLimiter(per_minute)
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._last_seen = {}  # name -> (size, mtime_ns) at the previous poll
+        self._lock = threading.Lock()
+        self._started = False
+        metrics.REGISTRY.gauge_callback(
+            'brady_hot_folder_queue', 'Stable PDFs in the hot folder waiting to be imported.', self.queued)
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path) as handle:
+                return json.load(handle).get('files', {})
+        except Exception as e:
+            logger.error(f"Failed to load hot folder state: {e}")
+            return {}
+
+    def _save_state(self):
+        # Called with self._lock held
+        fd, temp_path = tempfile.mkstemp(prefix='.hot_folder.', suffix='.json', dir=self.upload_folder)
+        with os.fdopen(fd, 'w') as handle:
+            json.dump({'folder': self.folder, 'files': self.files}, handle, indent=2)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, self.state_path)
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        os.makedirs(self.folder, exist_ok=True)
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f'hot-folder-{i}', daemon=True).start()
+        threading.Thread(target=self._watch, name='hot-folder-watch', daemon=True).start()
+        logger.info(f"Watching {self.folder} for PDFs ({self.workers} workers, {self.per_minute}/min)")
+
+    def queued(self):
+        with self._lock:
+            return len(self._queued)
+
+    def status(self):
+        with self._lock:
+            return {
+                'folder': self.folder,
+                'workers': self.workers,
+                'per_minute': self.per_minute,
+                'queued': len(self._queued),
+                'stats': dict(self.stats),
+                'unfinished': dict(self.files),
+                'recent': list(self.recent)
+            }
+
+    def _watch(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Hot folder poll failed: {e}")
+            time.sleep(self.poll_interval)
+
+    def poll(self):
+        """Queue every PDF that has stopped changing since the last poll."""
+        seen = {}
+        for entry in os.scandir(self.folder):
+            name = entry.name
+            if not entry.is_file() or not name.lower().endswith('.pdf') or name.startswith(('.', '~$')):
+                continue
+            stat = entry.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            seen[name] = signature
+
+            with self._lock:
+                if name in self._queued:
+                    continue
+                known = self.files.get(name)
+                if known and (known['size'], known['mtime_ns']) == signature and known['status'] != 'importing':
+                    continue  # Finished, but could not be moved out of the folder
+                stable = self._last_seen.get(name) == signature or (known and known['status'] == 'importing')
+                if stable:
+                    self._queued.add(name)
+                    self._queue.put((name, signature))
+        self._last_seen = seen
+
+    def _work(self):
+        while True:
+            name, signature = self._queue.get()
+            try:
+                self._limiter.wait()
+                self._import(name, signature)
+            except Exception as e:
+                logger.error(f"Hot folder import of {name} failed: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(name)
+
+    def _record(self, name, signature, status, **details):
+        with self._lock:
+            self.files[name] = {'size': signature[0], 'mtime_ns': signature[1], 'status': status, **details}
+            self._save_state()
+
+    def _import(self, name, signature):
+        source = os.path.join(self.folder, name)
+        self._record(name, signature, 'importing')
+        spool_path = None
+        try:
+            with open(source, 'rb') as handle:
+                spool_path, file_hash = spool_stream(handle, self.upload_folder)
+            result = self.service.process_pdf(spool_path, secure_filename(name) or 'document.pdf', file_hash=file_hash)
+        except Exception as e:
+            logger.error(f"Could not import {name}: {e}")
+            self._finish(name, signature, 'failed', FAILED_FOLDER, error=str(e))
+            return
+        finally:
+            # Left over only for duplicates and failures; new files were moved into the blob store
+            if spool_path and os.path.exists(spool_path):
+                os.remove(spool_path)
+
+        status = 'duplicate' if result.get('is_duplicate') else 'imported'
+        if status == 'imported' and self.on_added:
+            self.on_added(result['id'])
+        self._finish(name, signature, status, DONE_FOLDER, file_id=result['id'])
+
+    def _finish(self, name, signature, status, destination, **details):
+        moved_to = self._move(name, destination)
+        event = {'name': name, 'status': status, 'at': datetime.datetime.now().isoformat(timespec='seconds'), **details}
+        with self._lock:
+            self.stats['failed' if status == 'failed' else 'duplicates' if status == 'duplicate' else 'imported'] += 1
+            self.recent.appendleft(event)
+            if moved_to:
+                self.files.pop(name, None)
+            else:
+                # Still in the folder: remember it so the next poll does not import it again
+                self.files[name] = {'size': signature[0], 'mtime_ns': signature[1], **event}
+            self._save_state()
+        logger.info(f"Hot folder: {name} {status}")
+
+    def _move(self, name, destination):
+        target_dir = os.path.join(self.folder, destination)
+        target = os.path.join(target_dir, name)
+        if os.path.exists(target):
+            stem, ext = os.path.splitext(name)
+            target = os.path.join(target_dir, f"{stem}-{datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')}{ext}")
+        try:
+            os.makedirs(target_dir, exist_ok=True)
+            os.replace(os.path.join(self.folder, name), target)
+            return target
+        except OSError as e:
+            logger.warning(f"Could not move {name} to {destination}/: {e}")
+            return None
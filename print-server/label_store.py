@@ -0,0 +1,73 @@
+"""On-disk store of labels rendered ahead of time.
+
+With ``BRADY_PRECOMPUTE_LABELS`` set, every barcode page of a new upload is
+cropped with the site's default label settings (and, for ``bitmap``, also
+rasterized for printing) in the background. The results are written to
+``labels/<document hash>/`` so the first scan of a page on the line reads a
+file instead of parsing and cropping the PDF.
+
+Artifacts are named after the render cache key, so they are only used for
+the exact settings they were rendered with; after the defaults change the
+old files are simply never looked up again.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTE_MODES = ('off', 'pdf', 'bitmap')
+ARTIFACT_EXTENSIONS = {'pdf': '.pdf', 'bitmap': '.png'}
+
+
+def label_root(upload_folder):
+    return os.path.join(upload_folder, 'labels')
+
+
+class LabelArtifactStore:
+    def __init__(self, upload_folder):
+        self.root = label_root(upload_folder)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, key):
+        """key is a render_cache.label_key: (kind, file_hash, page_num, settings...)."""
+        kind, file_hash, page_num = key[0], key[1], key[2]
+        digest = hashlib.sha1(repr(key[3:]).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.root, file_hash, f'{page_num}-{digest}{ARTIFACT_EXTENSIONS[kind]}')
+
+    def has(self, key):
+        return os.path.exists(self.path_for(key))
+
+    def read(self, key):
+        """Stored bytes for ``key``, or None when it was never precomputed."""
+        try:
+            with open(self.path_for(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, key, data):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.label.', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def remove_document(self, file_hash):
+        """Drop every artifact rendered from the given document."""
+        directory = os.path.join(self.root, file_hash)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+            return True
+        return False
+
+    def document_hashes(self):
+        return [name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name))]
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""Load test: many scanner stations scanning and printing at once.
+
+Starts the print server on a free port against a scratch copy of the data
+(or targets a running server with --url). Each simulated station repeats the
+shop-floor sequence:
+
+    GET  /api/scan/<barcode>?prerender=1
+    GET  /api/preview/<file_id>/<page>       (with --preview)
+    POST /api/print
+
+Barcodes are drawn from the mappings in the database. ``lpr`` is replaced
+by a fake printer that records every job to a log (with optional delay and
+failure rate), so no printer is needed. The report gives p50/p99 latency and
+errors per endpoint, and checks that every successful print reached the
+fake printer.
+
+    python3 loadtest.py --stations 24 --duration 30
+    python3 loadtest.py --stations 24 --duration 30 --dev         # debug server
+    python3 loadtest.py --upload-folder uploads --stations 8       # copy of real data
+"""
+
+import argparse
+import datetime as dt
+import glob
+import http.client
+import json
+import mimetypes
+import os
+import random
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import quote, urlsplit
+
+import snapshot
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PDF_DIR = os.path.join(SCRIPT_DIR, "..", "media", "pdfs")
+
+FAKE_LPR = """#!{python}
+# Fake printer for loadtest.py: records the job instead of printing it
+import json, os, random, sys, time
+args = sys.argv[1:]
+path = args[-1] if args else None
+time.sleep(float(os.environ.get("BRADY_FAKE_PRINTER_DELAY", "0")))
+failed = random.random() < float(os.environ.get("BRADY_FAKE_PRINTER_FAIL_RATE", "0"))
+entry = {{"time": time.time(), "args": args, "bytes": os.path.getsize(path) if path and os.path.exists(path) else None, "failed": failed}}
+with open(os.environ["BRADY_FAKE_PRINTER_LOG"], "a") as handle:
+    handle.write(json.dumps(entry) + "\\n")
+if failed:
+    sys.stderr.write("fake printer: simulated failure\\n")
+    sys.exit(1)
+"""
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.status_codes = {}
+        self.lock = threading.Lock()
+
+    def record(self, seconds, status, ok):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.status_codes[str(status)] = self.status_codes.get(str(status), 0) + 1
+            if not ok:
+                self.errors += 1
+
+    def summary(self, duration):
+        samples = sorted(self.latencies)
+        pick = lambda q: round(samples[min(int(q * len(samples)), len(samples) - 1)] * 1000, 1) if samples else None
+        return {
+            "requests": len(samples),
+            "rps": round(len(samples) / duration, 1) if duration else None,
+            "p50_ms": pick(0.50),
+            "p99_ms": pick(0.99),
+            "max_ms": round(samples[-1] * 1000, 1) if samples else None,
+            "mean_ms": round(statistics.fmean(samples) * 1000, 1) if samples else None,
+            "errors": self.errors,
+            "status_codes": self.status_codes,
+        }
+
+
+class Client:
+    """One keep-alive HTTP connection per station, reconnecting after errors."""
+
+    def __init__(self, base_url, timeout=60):
+        parts = urlsplit(base_url)
+        self.host, self.port, self.timeout = parts.hostname, parts.port or 80, timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conn.request(method, path, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+
+    def json(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        status, data = self.request(method, path, body, headers)
+        try:
+            return status, json.loads(data)
+        except ValueError:
+            return status, None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def install_fake_printer(work_dir):
+    bin_dir = os.path.join(work_dir, "bin")
+    os.makedirs(bin_dir)
+    path = os.path.join(bin_dir, "lpr")
+    with open(path, "w") as handle:
+        handle.write(FAKE_LPR.format(python=sys.executable))
+    os.chmod(path, 0o755)
+    return bin_dir, os.path.join(work_dir, "printer_jobs.jsonl")
+
+
+def start_server(folder, port, env_extra, dev, threads, log_path):
+    command = [sys.executable, os.path.join(SCRIPT_DIR, "app.py"), "--host", "127.0.0.1", "--port", str(port)]
+    if not dev:
+        command += ["--production", "--threads", str(threads)]
+    env = {**os.environ, **env_extra, "BRADY_UPLOAD_FOLDER": folder}
+    log = open(log_path, "w")
+    # Own process group so the debug server's reloader child is stopped too
+    process = subprocess.Popen(command, cwd=folder, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    process.log = log
+    return process
+
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=15)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+    process.log.close()
+
+
+def wait_for_health(base_url, process=None, timeout=60):
+    client = Client(base_url, timeout=2)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("Server exited during startup; see the server log")
+        try:
+            if client.request("GET", "/health")[0] == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become healthy")
+
+
+def upload_pdf(client, path):
+    boundary = uuid.uuid4().hex
+    with open(path, "rb") as handle:
+        content = handle.read()
+    body = b"".join([
+        f"--{boundary}\r\n".encode(),
+        f'Content-Disposition: form-data; name="file"; filename="{os.path.basename(path)}"\r\n'.encode(),
+        f"Content-Type: {mimetypes.guess_type(path)[0] or 'application/pdf'}\r\n\r\n".encode(),
+        content,
+        f"\r\n--{boundary}--\r\n".encode(),
+    ])
+    status, data = client.request("POST", "/api/upload", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    return status, json.loads(data)
+
+
+def load_mappings(folder):
+    """Barcode mappings from db.snap or db.json, whichever is newer (as cleanup_old_work.py does)."""
+    db_path = os.path.join(folder, "db.json")
+    snapshot_path = os.path.join(folder, snapshot.SNAPSHOT_FILENAME)
+    if os.path.exists(snapshot_path) and (
+        not os.path.exists(db_path) or os.path.getmtime(snapshot_path) >= os.path.getmtime(db_path)
+    ):
+        data = snapshot.load_all(snapshot_path)
+    elif os.path.exists(db_path):
+        with open(db_path) as handle:
+            data = json.load(handle)
+    else:
+        return {}
+    return data.get("mappings", {})
+
+
+def wait_for_mappings(folder, timeout=15):
+    # Production mode saves in the background, so the file trails the uploads briefly
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            mappings = load_mappings(folder)
+        except (OSError, ValueError, snapshot.SnapshotError):
+            mappings = {}
+        if mappings:
+            return mappings
+        time.sleep(0.25)
+    return {}
+
+
+def station(index, base_url, barcodes, args, stats, stop_at, rnd):
+    client = Client(base_url)
+    iterations = 0
+    while time.time() < stop_at and (not args.iterations or iterations < args.iterations):
+        iterations += 1
+        barcode = rnd.choice(barcodes)
+        start = time.perf_counter()
+        try:
+            status, body = client.json("GET", f"/api/scan/{quote(barcode, safe='')}?prerender=1")
+        except OSError:
+            stats["scan"].record(time.perf_counter() - start, "connection-error", False)
+            continue
+        found = status == 200 and body and body.get("found")
+        stats["scan"].record(time.perf_counter() - start, status, found)
+        if not found:
+            continue
+        file_id, page_num = body["mapping"]["file_id"], body["mapping"]["page_num"]
+
+        if args.preview:
+            start = time.perf_counter()
+            try:
+                status, _data = client.request("GET", f"/api/preview/{file_id}/{page_num}")
+                stats["preview"].record(time.perf_counter() - start, status, status == 200)
+            except OSError:
+                stats["preview"].record(time.perf_counter() - start, "connection-error", False)
+
+        if args.think_time:
+            time.sleep(rnd.uniform(0, 2 * args.think_time))
+
+        start = time.perf_counter()
+        try:
+            status, body = client.json("POST", "/api/print", {
+                "file_id": file_id,
+                "page_num": page_num,
+                "username": f"station-{index}",
+            })
+            stats["print"].record(time.perf_counter() - start, status, status == 200 and bool(body and body.get("success")))
+        except OSError:
+            stats["print"].record(time.perf_counter() - start, "connection-error", False)
+
+
+def read_printer_log(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as handle:
+        entries = [json.loads(line) for line in handle if line.strip()]
+    return {"jobs": len(entries), "failed": sum(1 for e in entries if e["failed"])}
+
+
+def run(args):
+    work_dir = tempfile.mkdtemp(prefix="brady-load-")
+    server = None
+    printer_log = None
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+            mappings = load_mappings(args.upload_folder) if args.upload_folder else {}
+            if not mappings:
+                raise SystemExit("--url needs --upload-folder pointing at the server's data to draw barcodes from")
+        else:
+            folder = os.path.join(work_dir, "uploads")
+            if args.upload_folder:
+                shutil.copytree(args.upload_folder, folder)
+            else:
+                os.makedirs(folder)
+            bin_dir, printer_log = install_fake_printer(work_dir)
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            server = start_server(folder, port, {
+                "PATH": bin_dir + os.pathsep + os.environ.get("PATH", ""),
+                "BRADY_FAKE_PRINTER_LOG": printer_log,
+                "BRADY_FAKE_PRINTER_DELAY": str(args.printer_delay),
+                "BRADY_FAKE_PRINTER_FAIL_RATE": str(args.printer_fail_rate),
+            }, args.dev, args.threads, os.path.join(work_dir, "server.log"))
+            wait_for_health(base_url, server)
+
+            if not args.upload_folder:
+                client = Client(base_url)
+                for path in sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf"))):
+                    upload_pdf(client, path)
+            mappings = wait_for_mappings(folder)
+
+        barcodes = sorted(mappings)
+        if not barcodes:
+            raise SystemExit("No barcode mappings to scan")
+
+        stats = {"scan": EndpointStats(), "preview": EndpointStats(), "print": EndpointStats()}
+        rnd = random.Random(args.seed)
+        start = time.perf_counter()
+        stop_at = time.time() + args.duration
+        threads = [
+            threading.Thread(target=station, args=(i, base_url, barcodes, args, stats, stop_at, random.Random(rnd.random())))
+            for i in range(args.stations)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        report = {
+            "config": {
+                "target": args.url or ("dev server" if args.dev else f"production, {args.threads} threads"),
+                "stations": args.stations,
+                "duration_s": round(elapsed, 1),
+                "barcodes": len(barcodes),
+                "think_time_s": args.think_time,
+                "printer_delay_s": args.printer_delay,
+                "printer_fail_rate": args.printer_fail_rate,
+                "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+            },
+            "endpoints": {name: s.summary(elapsed) for name, s in stats.items() if s.latencies},
+        }
+        printer = read_printer_log(printer_log)
+        if printer is not None:
+            printed_ok = len(stats["print"].latencies) - stats["print"].errors
+            printer["successful_print_responses"] = printed_ok
+            printer["consistent"] = printer["jobs"] - printer["failed"] == printed_ok
+            report["printer"] = printer
+        return report
+    finally:
+        if server is not None:
+            stop_server(server)
+        if args.keep:
+            print(f"Kept work folder: {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate scanner stations scanning and printing concurrently.")
+    parser.add_argument("--stations", type=int, default=8, help="Concurrent stations. Default: 8.")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds to run. Default: 20.")
+    parser.add_argument("--iterations", type=int, default=0, help="Stop each station after this many scans (0: no limit).")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds between scan and print. Default: 0.")
+    parser.add_argument("--preview", action="store_true", help="Fetch the label preview between scan and print.")
+    parser.add_argument("--dev", action="store_true", help="Start the debug server instead of --production.")
+    parser.add_argument("--threads", type=int, default=8, help="Server worker threads in production mode. Default: 8.")
+    parser.add_argument("--upload-folder", help="Copy this data folder instead of ingesting --pdf-dir into an empty one.")
+    parser.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR, help="PDFs to upload before the run. Default: ../media/pdfs.")
+    parser.add_argument("--url", help="Target an already running server (no fake printer).")
+    parser.add_argument("--printer-delay", type=float, default=0.0, help="Seconds the fake printer takes per job.")
+    parser.add_argument("--printer-fail-rate", type=float, default=0.0, help="Fraction of jobs the fake printer rejects.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report to this file as well.")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch folder (server log, printer log, database).")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
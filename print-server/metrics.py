@@ -0,0 +1,196 @@
+"""In-process metrics exported at ``/metrics`` in Prometheus text format.
+
+Histograms and counters are plain dicts behind a lock, so recording a value
+costs a bisect and an increment. Values that already live elsewhere (render
+cache counters, database size, queue depths) are registered as callbacks and
+only read when ``/metrics`` is scraped.
+
+``StageTimer`` times the stages of one scan, preview, print or upload into
+``brady_stage_seconds`` and keeps the per-stage milliseconds so a print job
+record can say where its time went.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; tuned for label work: sub-millisecond lookups up to multi-second prints
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            snapshot = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        lines = []
+        for label_values, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _labels(self.label_names, label_values, [('le', _number(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {_number(round(total, 6))}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f'{self.name}{_labels(self.label_names, labels)} {_number(value)}'
+                for labels, value in sorted(values.items())]
+
+
+class CallbackMetric:
+    """Gauge or counter whose value is read from ``read()`` at scrape time.
+
+    ``read`` returns a number, or a dict of label-value tuples to numbers.
+    """
+
+    def __init__(self, kind, name, help_text, read, label_names=()):
+        self.kind = kind
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+        self.label_names = tuple(label_names)
+
+    def samples(self):
+        value = self.read()
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [f'{self.name}{_labels(self.label_names, labels)} {_number(number)}'
+                for labels, number in sorted(value.items()) if number is not None]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            # Re-registering replaces the old metric (services are recreated in tools)
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, label_names, buckets))
+
+    def counter(self, name, help_text, label_names=()):
+        return self._add(Counter(name, help_text, label_names))
+
+    def gauge_callback(self, name, help_text, read, label_names=()):
+        return self._add(CallbackMetric('gauge', name, help_text, read, label_names))
+
+    def counter_callback(self, name, help_text, read, label_names=()):
+        return self._add(CallbackMetric('counter', name, help_text, read, label_names))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                samples = []
+                lines.append(f'# {metric.name} unavailable: {_escape(e)}')
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'brady_request_seconds', 'HTTP request latency by route.', ('route', 'method'))
+REQUESTS_TOTAL = REGISTRY.counter(
+    'brady_requests_total', 'HTTP requests by route and status code.', ('route', 'method', 'status'))
+STAGE_SECONDS = REGISTRY.histogram(
+    'brady_stage_seconds', 'Time spent in each stage of scan, preview, print and upload.', ('operation', 'stage'))
+
+
+class StageTimer:
+    """Collects stage timings for one operation (e.g. one print job)."""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.stages_ms = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        STAGE_SECONDS.observe(seconds, self.operation, name)
+        self.stages_ms[name] = round(self.stages_ms.get(name, 0.0) + seconds * 1000, 2)
+
+
+@contextmanager
+def timed(operation, stage):
+    """Time one stage without keeping the result (for code paths with no job record)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, operation, stage)
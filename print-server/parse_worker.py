@@ -0,0 +1,108 @@
+"""Worker processes that parse PDFs for bulk uploads.
+
+PDF text extraction is pure Python and holds the GIL, so parsing in threads
+does not use more than one core. Bulk uploads instead hand paths to a few
+worker processes (``python3 parse_worker.py``) that run ``parse_pdf`` and
+answer with JSON lines. The workers only parse (with the layout mode given
+on their command line); indexing the results stays in the server process.
+
+Plain subprocesses rather than multiprocessing: a spawned multiprocessing
+child would re-import ``app.py`` (loading the database and cleaning spool
+files), and forking a threaded server is not safe.
+
+The frozen (PyInstaller) build has no Python interpreter to start this
+script with: ``sys.executable`` is the server EXE itself. There the pool
+parses in the server process on its threads instead, one file at a time.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+WORKER_SCRIPT = os.path.abspath(__file__)
+
+
+def in_process():
+    """Whether to parse on threads of this process (no interpreter to start workers with)."""
+    return getattr(sys, 'frozen', False)
+
+
+class ParseWorkerPool:
+    def __init__(self, workers, layout_mode='always'):
+        self.workers = workers
+        self.layout_mode = layout_mode
+        self.in_process = in_process()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='parse-worker')
+        self._local = threading.local()
+        self._processes = []
+        self._lock = threading.Lock()
+
+    def _process(self):
+        process = getattr(self._local, 'process', None)
+        if process is None or process.poll() is not None:
+            process = subprocess.Popen(
+                [sys.executable, WORKER_SCRIPT, self.layout_mode],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                cwd=os.path.dirname(WORKER_SCRIPT)
+            )
+            self._local.process = process
+            with self._lock:
+                self._processes.append(process)
+        return process
+
+    def _parse(self, path):
+        if self.in_process:
+            from services import parse_pdf
+            return parse_pdf(path, self.layout_mode)
+        process = self._process()
+        process.stdin.write(path + '\n')
+        process.stdin.flush()
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError('PDF parse worker exited unexpectedly')
+        reply = json.loads(line)
+        if not reply['ok']:
+            raise ValueError(reply['error'])
+        return reply['result']
+
+    def submit(self, path):
+        """Future of parse_pdf(path) run in a worker process (or on a thread when frozen)."""
+        return self._executor.submit(self._parse, path)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            processes, self._processes = self._processes, []
+        for process in processes:
+            try:
+                process.stdin.close()
+                process.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                process.kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    from services import parse_pdf
+
+    layout_mode = sys.argv[1] if len(sys.argv) > 1 else 'always'
+    for line in sys.stdin:
+        path = line.rstrip('\n')
+        try:
+            reply = {'ok': True, 'result': parse_pdf(path, layout_mode)}
+        except Exception as e:
+            reply = {'ok': False, 'error': str(e) or type(e).__name__}
+        sys.stdout.write(json.dumps(reply) + '\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
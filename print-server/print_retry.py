@@ -0,0 +1,339 @@
+"""Background retries for print jobs that could not be sent.
+
+When sending a label fails (printer offline, out of paper, lpr error), the
+spooled label file, and on Windows the print bitmap, is kept in
+``uploads/print_retry/`` and sent again in the background, first after
+``base_delay`` seconds and then doubling up to ``max_delay``. Retries reuse
+the stored files, so nothing is cropped or rendered again. The job stays in
+the history as ``retrying`` until it prints.
+
+After ``max_attempts`` tries the job becomes a dead letter: it is marked
+``failed``, and its files are kept until someone requeues it (optionally to
+another printer) or cancels it through ``/api/print-queue``.
+
+Jobs waiting for the same printer are retried together: the oldest is sent
+first, and the others follow only when it printed. New jobs for a printer
+that has jobs waiting are queued behind them without trying it, so an
+offline printer holds up neither request threads nor the order of labels.
+
+Each job is described by a JSON file next to its label, so the queue
+survives a restart.
+"""
+
+import datetime
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRYING = 'retrying'
+DEAD_LETTER = 'dead_letter'
+
+
+class PrintRetryQueue:
+    def __init__(self, print_service, upload_folder, max_attempts=8, base_delay=5, max_delay=300):
+        self.print_service = print_service
+        self.service = print_service.pdf_service
+        self.folder = os.path.join(upload_folder, 'print_retry')
+        os.makedirs(self.folder, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._entries = {}  # job id -> entry (as in its JSON file)
+        self._wake = threading.Condition()
+        self._thread = None
+        self.outcomes = metrics.REGISTRY.counter(
+            'brady_print_retries_total', 'Background print retries by outcome.', ('outcome',))
+        metrics.REGISTRY.gauge_callback(
+            'brady_print_retry_queue', 'Print jobs waiting for a retry, and dead letters.',
+            lambda: {(state,): count for state, count in self.counts().items()}, ('state',))
+        self._load()
+
+    # Files
+
+    def _path(self, job_id, extension):
+        return os.path.join(self.folder, f'{job_id}.{extension}')
+
+    def _save(self, entry):
+        fd, temp_path = tempfile.mkstemp(prefix='.job.', suffix='.json', dir=self.folder)
+        try:
+            with os.fdopen(fd, 'w') as handle:
+                json.dump({key: value for key, value in entry.items() if key != 'sending'}, handle)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, self._path(entry['job_id'], 'json'))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _discard(self, entry):
+        for extension in ('json', 'pdf', 'png'):
+            try:
+                os.remove(self._path(entry['job_id'], extension))
+            except FileNotFoundError:
+                pass
+
+    def _load(self):
+        for name in sorted(os.listdir(self.folder)):
+            if not name.endswith('.json') or name.startswith('.'):
+                continue
+            try:
+                with open(os.path.join(self.folder, name)) as handle:
+                    entry = json.load(handle)
+            except Exception as e:
+                logger.error(f"Unreadable print retry {name}: {e}")
+                continue
+            if not os.path.exists(self._path(entry['job_id'], 'pdf')):
+                logger.warning(f"Print retry {entry['job_id']} lost its label file; dropping it")
+                self._discard(entry)
+                continue
+            self._entries[entry['job_id']] = entry
+        if self._entries:
+            logger.info(f"Loaded {len(self._entries)} print jobs waiting for retry or requeue")
+
+    # Queueing
+
+    def delay(self, attempts):
+        """Seconds to wait after the given number of failed tries."""
+        return min(self.max_delay, self.base_delay * 2 ** max(attempts - 1, 0))
+
+    def waiting_for(self, printer):
+        with self._wake:
+            return any(entry['state'] == RETRYING and entry['printer'] == printer for entry in self._entries.values())
+
+    def pending_for_page(self, file_id, page_num):
+        """The job of this page waiting for a retry, if any (it prints once its printer is back)."""
+        with self._wake:
+            for entry in self._entries.values():
+                if entry['state'] == RETRYING and entry['file_id'] == file_id and entry['page_num'] == page_num:
+                    return self._view(entry)
+        return None
+
+    def schedule(self, attempts, printer):
+        """When a new job for this printer is tried again: with the jobs already waiting for it, if any."""
+        with self._wake:
+            waiting = [entry['next_attempt'] for entry in self._entries.values()
+                       if entry['state'] == RETRYING and entry['printer'] == printer]
+        next_attempt = min(waiting) if waiting else time.time() + self.delay(attempts)
+        return datetime.datetime.fromtimestamp(next_attempt)
+
+    def enqueue(self, job_id, label_path, image, file_id, doc_name, page_num, printer, quality_settings, username,
+                error, attempts, next_retry):
+        """Keep a spooled label (and print bitmap) and retry it in the background."""
+        shutil.move(label_path, self._path(job_id, 'pdf'))
+        if image is not None:
+            image.save(self._path(job_id, 'png'), format='PNG')
+        entry = {
+            'job_id': job_id,
+            'file_id': file_id,
+            'doc_name': doc_name,
+            'page_num': page_num,
+            'printer': printer,
+            'quality_settings': quality_settings,
+            'username': username,
+            'image': image is not None,
+            'state': RETRYING,
+            'attempts': attempts,
+            'last_error': error,
+            'queued_at': time.time(),
+            'next_attempt': next_retry.timestamp()
+        }
+        self._save(entry)
+        with self._wake:
+            self._entries[job_id] = entry
+            self._wake.notify()
+        self.outcomes.inc('queued')
+        # Servers that import the app (WSGI hosts, the test client) never call start()
+        self.start()
+
+    def requeue(self, job_id, printer=None):
+        """Retry a waiting job or dead letter now, optionally on another printer or pool; raises KeyError/ValueError."""
+        with self._wake:
+            entry = self._entry(job_id)
+            if printer:
+                entry['printer'] = printer
+            if entry['state'] == DEAD_LETTER:
+                entry['attempts'] = 0
+            entry['state'] = RETRYING
+            entry['next_attempt'] = time.time()
+            self._save(entry)
+            self._wake.notify()
+        self.start()
+        self.service.update_print_job(job_id, {
+            'status': 'retrying',
+            'printer': entry['printer'] or 'Default',
+            'attempts': entry['attempts'],
+            'next_retry': datetime.datetime.now().isoformat(timespec='seconds'),
+            'dead_letter': None
+        })
+        return self._view(entry)
+
+    def cancel(self, job_id):
+        """Drop a waiting job or dead letter for good; raises KeyError/ValueError."""
+        with self._wake:
+            entry = self._entry(job_id)
+            del self._entries[job_id]
+            self._discard(entry)
+        self.service.update_print_job(job_id, {'status': 'cancelled', 'next_retry': None, 'dead_letter': None})
+        self.outcomes.inc('cancelled')
+        return self._view(entry)
+
+    def _entry(self, job_id):
+        # Called with self._wake held
+        entry = self._entries.get(job_id)
+        if entry is None:
+            raise KeyError(job_id)
+        if entry.get('sending'):
+            raise ValueError('The job is being sent right now')
+        return entry
+
+    # Status
+
+    def counts(self):
+        with self._wake:
+            counts = {RETRYING: 0, DEAD_LETTER: 0}
+            for entry in self._entries.values():
+                counts[entry['state']] += 1
+            return counts
+
+    @staticmethod
+    def _view(entry):
+        return {
+            'job_id': entry['job_id'],
+            'file_id': entry['file_id'],
+            'doc_name': entry['doc_name'],
+            'page_num': entry['page_num'],
+            'printer': entry['printer'],
+            'username': entry['username'],
+            'attempts': entry['attempts'],
+            'last_error': entry['last_error'],
+            'queued_at': datetime.datetime.fromtimestamp(entry['queued_at']).isoformat(timespec='seconds'),
+            'next_attempt': (datetime.datetime.fromtimestamp(entry['next_attempt']).isoformat(timespec='seconds')
+                             if entry['state'] == RETRYING else None)
+        }
+
+    def status(self):
+        with self._wake:
+            entries = sorted(self._entries.values(), key=lambda entry: entry['queued_at'])
+            return {
+                'retrying': [self._view(entry) for entry in entries if entry['state'] == RETRYING],
+                'dead_letter': [self._view(entry) for entry in entries if entry['state'] == DEAD_LETTER],
+                'max_attempts': self.max_attempts,
+                'running': self._thread is not None
+            }
+
+    # Retrying
+
+    def start(self):
+        """Run the retry worker; also started by the first enqueue or requeue."""
+        with self._wake:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='print-retry', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._wake:
+                due = self._due()
+                if not due:
+                    waiting = [entry['next_attempt'] for entry in self._entries.values() if entry['state'] == RETRYING]
+                    self._wake.wait(max(0.0, min(waiting) - time.time()) if waiting else None)
+                    continue
+            for printer, entries in due.items():
+                try:
+                    self._retry_printer(printer, entries)
+                except Exception as e:
+                    logger.error(f"Print retry for {printer or 'Default printer'} failed: {e}")
+
+    def _due(self):
+        """Every waiting job of each printer that has a job due, oldest first (called with self._wake held)."""
+        now = time.time()
+        waiting = {}
+        for entry in self._entries.values():
+            if entry['state'] == RETRYING:
+                waiting.setdefault(entry['printer'], []).append(entry)
+        due = {}
+        for printer, entries in waiting.items():
+            if any(entry['next_attempt'] <= now for entry in entries):
+                entries.sort(key=lambda entry: entry['queued_at'])
+                for entry in entries:
+                    entry['sending'] = True
+                due[printer] = entries
+        return due
+
+    def _retry_printer(self, printer, entries):
+        try:
+            for index, entry in enumerate(entries):
+                sent, printer_used, message, failed = self._send(entry)
+                if not sent:
+                    # Still failing: the jobs behind this one count the same try and wait with it
+                    next_attempt = time.time() + self.delay(entry['attempts'] + 1)
+                    for waiting in entries[index:]:
+                        self._failed(waiting, message, next_attempt)
+                    return
+                self._printed(entry, printer_used, failed)
+        finally:
+            with self._wake:
+                for entry in entries:
+                    entry.pop('sending', None)
+
+    def _send(self, entry):
+        image = None
+        if entry['image']:
+            from PIL import Image
+            image = Image.open(self._path(entry['job_id'], 'png'))
+            image.load()
+        return self.print_service.send_label(self._path(entry['job_id'], 'pdf'), entry['printer'], entry['quality_settings'],
+                                             image, metrics.StageTimer('print_retry'))
+
+    def _printed(self, entry, printer_used, failed):
+        attempts = entry['attempts'] + 1
+        with self._wake:
+            self._entries.pop(entry['job_id'], None)
+            self._discard(entry)
+        pool = entry['printer'] if printer_used != entry['printer'] else None
+        logger.info(f"Print job {entry['job_id']} printed on {printer_used or 'Default'} after {attempts} tries")
+        self.service.update_print_job(entry['job_id'], {
+            'status': 'success',
+            'printer': printer_used or 'Default',
+            'error': None,
+            'attempts': attempts,
+            'next_retry': None,
+            'pool': pool,
+            'failover': failed if pool else None
+        })
+        self.outcomes.inc('printed')
+
+    def _failed(self, entry, message, next_attempt):
+        with self._wake:
+            entry['attempts'] += 1
+            entry['last_error'] = message
+            if entry['attempts'] >= self.max_attempts:
+                entry['state'] = DEAD_LETTER
+            else:
+                entry['next_attempt'] = next_attempt
+            self._save(entry)
+
+        if entry['state'] == DEAD_LETTER:
+            logger.error(f"Print job {entry['job_id']} failed {entry['attempts']} times; moved to the dead-letter list: {message}")
+            self.service.update_print_job(entry['job_id'], {
+                'status': 'failed',
+                'error': message,
+                'attempts': entry['attempts'],
+                'next_retry': None,
+                'dead_letter': True
+            })
+            self.outcomes.inc('dead_letter')
+            return
+        self.service.update_print_job(entry['job_id'], {
+            'error': message,
+            'attempts': entry['attempts'],
+            'next_retry': datetime.datetime.fromtimestamp(entry['next_attempt']).isoformat(timespec='seconds')
+        })
+        self.outcomes.inc('failed')
@@ -0,0 +1,256 @@
+"""Named pools of identical printers.
+
+A print sent to a pool name instead of a printer goes to the member that
+is expected to finish it first. That is the healthy member with the fewest
+queued plus in-flight jobs, weighted by its recent send latency; among idle
+members it is the one used least recently. If sending fails, the job fails
+over to the next member without rendering the label again.
+
+Pools are stored in the database settings (``printer_pools``: name ->
+member printer names). Health and queue depth come from the same discovery
+as ``/api/printers``: ``lpstat -p`` / ``lpstat -o`` on macOS and Linux,
+``win32print`` on Windows. They are refreshed every few seconds in the
+background. A member that failed a send is tried last until its cooldown
+ends. A member that discovery reports disabled, paused or jammed is tried
+last until a later probe reports it ready again.
+"""
+
+import logging
+import platform
+import subprocess
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# win32print PRINTER_STATUS_* bits that mean the printer cannot take a job now
+WINDOWS_UNHEALTHY_STATUS = {
+    0x00000001: 'paused',
+    0x00000002: 'error',
+    0x00000008: 'paper jam',
+    0x00000010: 'paper out',
+    0x00000080: 'offline',
+    0x00001000: 'not available',
+    0x00100000: 'user intervention',
+    0x00400000: 'door open'
+}
+DEFAULT_LATENCY = 1.0  # Seconds per job assumed before a member has sent anything
+LATENCY_WEIGHT = 0.3   # Weight of the newest send in the moving average
+
+
+def probe_printers():
+    """{printer: {'healthy': bool, 'state': str, 'queued': int}} for the printers this host knows."""
+    if platform.system() == 'Windows':
+        return _probe_windows()
+    return _probe_cups()
+
+
+def _probe_cups():
+    printers = {}
+    result = subprocess.run(['lpstat', '-p'], capture_output=True, text=True, timeout=10)
+    if result.returncode == 0:
+        for line in result.stdout.splitlines():
+            # "printer NAME is idle.  enabled since ...", "printer NAME disabled since ..."
+            parts = line.split()
+            if len(parts) >= 3 and parts[0] == 'printer':
+                disabled = 'disabled' in line
+                state = 'disabled' if disabled else 'printing' if 'now printing' in line else 'idle'
+                printers[parts[1]] = {'healthy': not disabled, 'state': state, 'queued': 0}
+
+    result = subprocess.run(['lpstat', '-o'], capture_output=True, text=True, timeout=10)
+    if result.returncode == 0:
+        for line in result.stdout.splitlines():
+            # "NAME-123  user  1024  Mon 01 Jan ..."
+            job = line.split()[0] if line.strip() else ''
+            name = job.rsplit('-', 1)[0]
+            if name in printers:
+                printers[name]['queued'] += 1
+    return printers
+
+
+def _probe_windows():
+    import win32print
+    printers = {}
+    for info in win32print.EnumPrinters(win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS, None, 2):
+        problems = [label for bit, label in WINDOWS_UNHEALTHY_STATUS.items() if info['Status'] & bit]
+        printers[info['pPrinterName']] = {
+            'healthy': not problems,
+            'state': ', '.join(problems) or 'ready',
+            'queued': info['cJobs']
+        }
+    return printers
+
+
+class MemberState:
+    __slots__ = ('in_flight', 'latency', 'down_until', 'last_error', 'last_used', 'sent', 'failed',
+                 'healthy', 'state', 'queued')
+
+    def __init__(self):
+        self.in_flight = 0
+        self.latency = None      # Moving average of send seconds
+        self.down_until = 0.0    # Monotonic time until which a failed member is tried last
+        self.last_error = None
+        self.last_used = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.healthy = None      # From discovery; None until probed or when the host does not list it
+        self.state = 'unknown'
+        self.queued = 0
+
+    def available(self, now):
+        return self.healthy is not False and now >= self.down_until
+
+    def expected_wait(self, default_latency):
+        latency = self.latency if self.latency is not None else default_latency
+        return (self.queued + self.in_flight + 1) * latency
+
+
+class PrinterPools:
+    def __init__(self, pdf_service, probe_interval=10, failure_cooldown=30):
+        self.pdf_service = pdf_service
+        self.probe_interval = probe_interval
+        self.failure_cooldown = failure_cooldown
+        self.last_probe = None
+        self._members = {}  # printer -> MemberState
+        self._lock = threading.Lock()
+        self._thread = None
+        self.failovers = metrics.REGISTRY.counter(
+            'brady_printer_failovers_total', 'Pool jobs moved to another member after a failed send.', ('pool',))
+        metrics.REGISTRY.gauge_callback(
+            'brady_printer_in_flight', 'Pool jobs being sent to each member.',
+            lambda: {(name,): state.in_flight for name, state in self._states().items()}, ('printer',))
+
+    # Configuration
+
+    def pools(self):
+        return {name: list(members) for name, members in self.pdf_service.settings.get('printer_pools', {}).items()}
+
+    def is_pool(self, name):
+        return bool(name) and name in self.pdf_service.settings.get('printer_pools', {})
+
+    def tracks(self, printer):
+        """Whether a printer belongs to a pool (its sends count towards dispatch)."""
+        return any(printer in members for members in self.pdf_service.settings.get('printer_pools', {}).values())
+
+    def set_pools(self, pools):
+        """Validate and store {pool name: [printer, ...]}; raises ValueError."""
+        if not isinstance(pools, dict):
+            raise ValueError('pools must map pool names to lists of printers')
+        cleaned = {}
+        for name, members in pools.items():
+            name = str(name).strip()
+            if not name:
+                raise ValueError('Pool names must not be empty')
+            if not isinstance(members, list) or not members:
+                raise ValueError(f'Pool {name} needs a list of printers')
+            members = list(dict.fromkeys(str(member).strip() for member in members if str(member).strip()))
+            if not members or name in members:
+                raise ValueError(f'Pool {name} needs printers other than itself')
+            cleaned[name] = members
+        for name, members in cleaned.items():
+            nested = [member for member in members if member in cleaned]
+            if nested:
+                raise ValueError(f'Pool {name} contains other pools: {", ".join(nested)}')
+        self.pdf_service.set_printer_pools(cleaned)
+        return cleaned
+
+    # Dispatch
+
+    def _state(self, printer):
+        # Called with self._lock held
+        state = self._members.get(printer)
+        if state is None:
+            state = self._members[printer] = MemberState()
+        return state
+
+    def _states(self):
+        with self._lock:
+            return dict(self._members)
+
+    def candidates(self, pool):
+        """Members of a pool in the order to try them: best available first, the rest as failover."""
+        members = self.pools().get(pool, [])
+        now = time.monotonic()
+        with self._lock:
+            states = {member: self._state(member) for member in members}
+            known = [state.latency for state in states.values() if state.latency is not None]
+            default_latency = sum(known) / len(known) if known else DEFAULT_LATENCY
+            return sorted(members, key=lambda member: (
+                not states[member].available(now),
+                states[member].expected_wait(default_latency),
+                states[member].last_used
+            ))
+
+    def begin(self, printer):
+        with self._lock:
+            state = self._state(printer)
+            state.in_flight += 1
+            state.last_used = time.monotonic()
+
+    def finish(self, printer, ok, seconds, error=None):
+        with self._lock:
+            state = self._state(printer)
+            state.in_flight -= 1
+            if ok:
+                state.sent += 1
+                state.down_until = 0.0
+                state.latency = seconds if state.latency is None else (
+                    LATENCY_WEIGHT * seconds + (1 - LATENCY_WEIGHT) * state.latency)
+            else:
+                state.failed += 1
+                state.last_error = error
+                state.down_until = time.monotonic() + self.failure_cooldown
+
+    # Health
+
+    def start(self):
+        """Probe member health every ``probe_interval`` seconds (only with pools configured)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='printer-health', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            if self.pools():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.warning(f"Printer health probe failed: {e}")
+            time.sleep(self.probe_interval)
+
+    def refresh(self):
+        found = probe_printers()
+        members = {member for members in self.pools().values() for member in members}
+        with self._lock:
+            for member in members:
+                state = self._state(member)
+                info = found.get(member)
+                if info is None:
+                    state.healthy, state.state, state.queued = None, 'not listed', 0
+                else:
+                    state.healthy, state.state, state.queued = info['healthy'], info['state'], info['queued']
+        self.last_probe = time.time()
+
+    def status(self):
+        now = time.monotonic()
+        states = self._states()
+        pools = {}
+        for name, members in self.pools().items():
+            pools[name] = []
+            for member in members:
+                state = states.get(member) or MemberState()
+                pools[name].append({
+                    'printer': member,
+                    'available': state.available(now),
+                    'state': state.state,
+                    'queued': state.queued,
+                    'in_flight': state.in_flight,
+                    'latency_ms': round(state.latency * 1000, 1) if state.latency is not None else None,
+                    'sent': state.sent,
+                    'failed': state.failed,
+                    'cooldown_s': round(max(0.0, state.down_until - now), 1),
+                    'last_error': state.last_error
+                })
+        return {'pools': pools, 'probe_interval_s': self.probe_interval, 'last_probe': self.last_probe}
@@ -0,0 +1,237 @@
+"""Opt-in profiling of slow requests.
+
+With ``BRADY_PROFILE_SLOW_MS`` set, every request is watched and the ones
+slower than the threshold are kept as a profile in ``uploads/profiles/``, a
+ring of the most recent ``BRADY_PROFILE_KEEP`` entries. Fast requests leave
+nothing behind.
+
+Two modes (``BRADY_PROFILE_MODE``):
+
+- ``sample`` (default): one background thread samples the stack of every
+  in-flight request thread every few milliseconds. Cheap enough to leave on
+  in the field, and it also shows time spent blocked (spooler calls, ``lpr``,
+  disk), which is usually what a 10 s print is waiting on. Profiles download
+  as collapsed stacks for flame graph tools (speedscope, flamegraph.pl).
+- ``cprofile``: a ``cProfile`` run per request, saved as a ``.prof`` file for
+  ``pstats``/snakeviz. Exact call counts, but it slows every request down.
+"""
+
+import cProfile
+import datetime
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('sample', 'cprofile')
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+TOP_FRAMES = 25
+
+
+def profile_root(upload_folder):
+    return os.path.join(upload_folder, 'profiles')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})'
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+class Capture:
+    """Profiling state of one in-flight request."""
+
+    def __init__(self, description):
+        self.description = description
+        self.thread_id = threading.get_ident()
+        self.started_at = datetime.datetime.now()
+        self.start = time.perf_counter()
+        self.stacks = Counter()
+        self.samples = 0
+        self.profile = None
+
+
+class SlowRequestProfiler:
+    def __init__(self, upload_folder, threshold_ms, mode='sample', keep=50, interval_ms=10):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Profile mode must be one of {', '.join(PROFILE_MODES)}")
+        self.root = profile_root(upload_folder)
+        os.makedirs(self.root, exist_ok=True)
+        self.threshold_ms = threshold_ms
+        self.mode = mode
+        self.keep = keep
+        self.interval = interval_ms / 1000
+        self._active = {}  # thread id -> Capture
+        self._cond = threading.Condition()
+        self._ring_lock = threading.Lock()
+        self.captured = metrics.REGISTRY.counter(
+            'brady_slow_profiles_total', 'Requests slower than the profiling threshold that were captured.', ('route',))
+        if mode == 'sample':
+            threading.Thread(target=self._sample_loop, name='slow-request-sampler', daemon=True).start()
+
+    def start(self, description):
+        """Begin watching the current request; returns a token for finish()."""
+        capture = Capture(description)
+        if self.mode == 'cprofile':
+            capture.profile = cProfile.Profile()
+            try:
+                capture.profile.enable()
+            except ValueError:
+                capture.profile = None  # Another profiler is active on this thread
+        with self._cond:
+            self._active[capture.thread_id] = capture
+            self._cond.notify()
+        return capture
+
+    def finish(self, capture, status=None):
+        """Stop watching; saves and returns the profile id when the request was slow."""
+        duration_ms = (time.perf_counter() - capture.start) * 1000
+        if capture.profile is not None:
+            capture.profile.disable()
+        with self._cond:
+            self._active.pop(capture.thread_id, None)
+        if duration_ms < self.threshold_ms:
+            return None
+        try:
+            profile_id = self._save(capture, duration_ms, status)
+        except OSError as e:
+            logger.error(f"Could not save slow request profile: {e}")
+            return None
+        self.captured.inc(capture.description.get('route', 'unmatched'))
+        logger.warning(f"Slow request {capture.description.get('method')} {capture.description.get('path')} "
+                       f"took {duration_ms:.0f} ms; profile {profile_id}")
+        return profile_id
+
+    def _sample_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._active)
+                captures = list(self._active.values())
+            frames = sys._current_frames()
+            for capture in captures:
+                frame = frames.get(capture.thread_id)
+                if frame is not None:
+                    capture.stacks[_collapse(frame)] += 1
+                    capture.samples += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _save(self, capture, duration_ms, status):
+        profile_id = f"{capture.started_at.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        meta = {
+            'id': profile_id,
+            **capture.description,
+            'status': status,
+            'duration_ms': round(duration_ms, 1),
+            'started_at': capture.started_at.isoformat(timespec='milliseconds'),
+            'mode': self.mode,
+        }
+        if self.mode == 'sample':
+            meta['interval_ms'] = round(self.interval * 1000, 1)
+            meta['samples'] = capture.samples
+            meta['top'] = self._top_sampled(capture.stacks)
+            meta['stacks'] = dict(capture.stacks.most_common())
+        elif capture.profile is not None:
+            capture.profile.dump_stats(os.path.join(self.root, f'{profile_id}.prof'))
+            meta['top'] = self._top_cprofile(capture.profile)
+
+        self._write_json(os.path.join(self.root, f'{profile_id}.json'), meta)
+        self._trim()
+        return profile_id
+
+    @staticmethod
+    def _top_sampled(stacks):
+        """Innermost frames by share of samples: where the time actually went."""
+        total = sum(stacks.values()) or 1
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return [{'frame': frame, 'samples': count, 'percent': round(100 * count / total, 1)}
+                for frame, count in leaves.most_common(TOP_FRAMES)]
+
+    @staticmethod
+    def _top_cprofile(profile):
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(TOP_FRAMES)
+        return out.getvalue().splitlines()
+
+    def _write_json(self, path, data):
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'w') as handle:
+            json.dump(data, handle, indent=2)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+
+    def _trim(self):
+        with self._ring_lock:
+            profile_ids = self._profile_ids()
+            for profile_id in profile_ids[:max(0, len(profile_ids) - self.keep)]:
+                for ext in ('.json', '.prof'):
+                    path = os.path.join(self.root, profile_id + ext)
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def _profile_ids(self):
+        # Ids start with the timestamp, so name order is capture order
+        return sorted(name[:-5] for name in os.listdir(self.root)
+                      if name.endswith('.json') and PROFILE_ID_PATTERN.match(name[:-5]))
+
+    def list_profiles(self):
+        """Newest first, without the stack data."""
+        profiles = []
+        for profile_id in reversed(self._profile_ids()):
+            try:
+                meta = self.load(profile_id)
+            except (OSError, ValueError):
+                continue  # Trimmed while listing
+            meta.pop('stacks', None)
+            meta.pop('top', None)
+            profiles.append(meta)
+        return profiles
+
+    def path(self, profile_id, ext='.json'):
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.root, profile_id + ext)
+        return path if os.path.exists(path) else None
+
+    def load(self, profile_id):
+        path = self.path(profile_id)
+        if path is None:
+            raise FileNotFoundError(profile_id)
+        with open(path) as handle:
+            return json.load(handle)
+
+    def collapsed(self, profile_id):
+        """Stacks in the collapsed format read by flame graph tools."""
+        stacks = self.load(profile_id).get('stacks', {})
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks.items())
+
+    def clear(self):
+        with self._ring_lock:
+            profile_ids = self._profile_ids()
+            for profile_id in profile_ids:
+                for ext in ('.json', '.prof'):
+                    path = os.path.join(self.root, profile_id + ext)
+                    if os.path.exists(path):
+                        os.remove(path)
+        return len(profile_ids)
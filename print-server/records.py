@@ -0,0 +1,266 @@
+"""Compact in-memory records for barcode mappings and print jobs.
+
+Mappings and print jobs are the two collections that grow with history, so
+they are held as ``__slots__`` objects instead of dicts:
+
+- repeated strings (file ids, document names, printers, users) are interned
+- ``type`` and ``status`` are stored as small ints through a ``CodeTable``
+- timestamps are stored as integer microseconds since the (naive) epoch
+
+Records support the read-only dict protocol used around the service
+(``rec['file_id']``, ``rec.get(...)``, ``{**rec}``) and ``to_dict()``
+returns exactly the dict the record was built from, so the JSON written to
+disk and returned by the API does not change.
+"""
+
+import datetime
+import sys
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_ABSENT = object()
+_FROM_US = object()  # timestamp text is regenerated from timestamp_us
+_shared_floats = {}
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _share_float(value):
+    if type(value) is not float:
+        return value
+    return _shared_floats.setdefault(value, value)
+
+
+class CodeTable:
+    """Two-way mapping between short strings and small ints.
+
+    Unknown values are appended on first use, so codes are only stable
+    within a process and never persisted.
+    """
+
+    __slots__ = ('_codes', '_values')
+
+    def __init__(self, values):
+        self._values = list(values)
+        self._codes = {value: code for code, value in enumerate(self._values)}
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._values)
+            self._values.append(value)
+            self._codes[value] = code
+        return code
+
+    def decode(self, code):
+        return self._values[code]
+
+
+MAPPING_TYPES = CodeTable(['ALPHANUMERIC_ID', 'BARCODE_K', 'BARCODE_NUM', 'GENERIC_SN'])
+JOB_STATUSES = CodeTable(['success', 'failed'])
+STATUS_SUCCESS = JOB_STATUSES.encode('success')
+STATUS_FAILED = JOB_STATUSES.encode('failed')
+
+
+def timestamp_to_us(value):
+    """Parse an ISO timestamp to epoch microseconds (wall clock), or None."""
+    if isinstance(value, datetime.datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.datetime.fromisoformat(str(value).strip())
+        except (TypeError, ValueError):
+            return None
+    delta = parsed.replace(tzinfo=None) - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def us_to_timestamp(value):
+    return (_EPOCH + datetime.timedelta(microseconds=value)).isoformat()
+
+
+def date_bounds_us(from_date=None, to_date=None):
+    """Inclusive date range -> half-open [start, end) in epoch microseconds."""
+    start = end = None
+    if from_date:
+        start = timestamp_to_us(datetime.datetime.combine(from_date, datetime.time.min))
+    if to_date:
+        end = timestamp_to_us(datetime.datetime.combine(to_date + datetime.timedelta(days=1), datetime.time.min))
+    return start, end
+
+
+class _Record:
+    __slots__ = ()
+    FIELDS = ()
+
+    def __getitem__(self, key):
+        value = self.get(key, _ABSENT)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _ABSENT) is not _ABSENT
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def keys(self):
+        return list(self.to_dict().keys())
+
+    def items(self):
+        return self.to_dict().items()
+
+    def get(self, key, default=None):
+        if key not in self.FIELDS:
+            return default
+        value = getattr(self, key)
+        return default if value is _ABSENT else value
+
+    def to_dict(self):
+        result = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is not _ABSENT:
+                result[field] = value
+        return result
+
+
+class MappingRecord(_Record):
+    """barcode -> {file_id, page_num, type, confidence, doc_name}"""
+
+    __slots__ = ('file_id', 'page_num', 'type_code', 'confidence', 'doc_name')
+    FIELDS = ('file_id', 'page_num', 'type', 'confidence', 'doc_name')
+
+    def __init__(self, file_id, page_num, type, confidence, doc_name):
+        self.file_id = _intern(file_id)
+        self.page_num = page_num
+        self.type_code = MAPPING_TYPES.encode(type)
+        self.confidence = _share_float(confidence)
+        self.doc_name = _intern(doc_name)
+
+    @property
+    def type(self):
+        return MAPPING_TYPES.decode(self.type_code)
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, cls):
+            return data
+        return cls(
+            data.get('file_id'),
+            data.get('page_num'),
+            data.get('type'),
+            data.get('confidence'),
+            data.get('doc_name')
+        )
+
+
+class PrintJobRecord(_Record):
+    """One entry of the print history."""
+
+    __slots__ = (
+        'id', 'file_id', 'doc_name', 'page_num', 'printer', 'status_code',
+        'timestamp_us', '_timestamp_text', 'error', 'username', 'extra'
+    )
+    FIELDS = ('id', 'file_id', 'doc_name', 'page_num', 'printer', 'status', 'timestamp', 'error', 'username')
+
+    def __init__(self, data):
+        self.id = data.get('id', _ABSENT)
+        self.file_id = _intern(data.get('file_id', _ABSENT))
+        self.doc_name = _intern(data.get('doc_name', _ABSENT))
+        self.page_num = data.get('page_num', _ABSENT)
+        self.printer = _intern(data.get('printer', _ABSENT))
+        status = data.get('status', _ABSENT)
+        self.status_code = _ABSENT if status is _ABSENT else JOB_STATUSES.encode(status)
+        self.error = data.get('error', _ABSENT)
+        self.username = _intern(data.get('username', _ABSENT))
+
+        timestamp = data.get('timestamp', _ABSENT)
+        self.timestamp_us = None if timestamp is _ABSENT else timestamp_to_us(timestamp)
+        # Keep the original text only when it cannot be regenerated exactly
+        if self.timestamp_us is not None and us_to_timestamp(self.timestamp_us) == timestamp:
+            self._timestamp_text = _FROM_US
+        else:
+            self._timestamp_text = timestamp
+
+        extra = {k: v for k, v in data.items() if k not in self.FIELDS}
+        self.extra = extra or None
+
+    @property
+    def status(self):
+        code = self.status_code
+        return _ABSENT if code is _ABSENT else JOB_STATUSES.decode(code)
+
+    @status.setter
+    def status(self, value):
+        self.status_code = JOB_STATUSES.encode(value)
+
+    @property
+    def timestamp(self):
+        if self._timestamp_text is _FROM_US:
+            return us_to_timestamp(self.timestamp_us)
+        return self._timestamp_text
+
+    @property
+    def sort_key(self):
+        return self.timestamp_us if self.timestamp_us is not None else -1
+
+    def update(self, changes):
+        """Change fields in place (not ``id`` or ``timestamp``); extra fields set to None are removed."""
+        for key, value in changes.items():
+            if key == 'status':
+                self.status = value
+            elif key in ('file_id', 'doc_name', 'printer', 'username'):
+                setattr(self, key, _intern(value))
+            elif key in ('page_num', 'error'):
+                setattr(self, key, value)
+            elif key in self.FIELDS:
+                raise KeyError(f'{key} cannot be changed')
+            elif value is None:
+                if self.extra:
+                    self.extra.pop(key, None)
+            else:
+                self.extra = self.extra or {}
+                self.extra[key] = value
+        if not self.extra:
+            self.extra = None
+
+    def get(self, key, default=None):
+        if key not in self.FIELDS:
+            if self.extra is not None:
+                return self.extra.get(key, default)
+            return default
+        return super().get(key, default)
+
+    def to_dict(self):
+        result = super().to_dict()
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, cls):
+            return data
+        return cls(data)
+
+
+def mappings_from_dicts(mappings):
+    return {barcode: MappingRecord.from_dict(m) for barcode, m in mappings.items()}
+
+
+def mappings_to_dicts(mappings):
+    return {barcode: m.to_dict() for barcode, m in mappings.items()}
+
+
+def jobs_from_dicts(jobs):
+    return [PrintJobRecord.from_dict(job) for job in jobs]
+
+
+def jobs_to_dicts(jobs):
+    return [job.to_dict() for job in jobs]
@@ -0,0 +1,201 @@
+"""Re-index barcodes after the serial patterns change.
+
+Runs ``TextExtractionService`` over the page text stored at upload (see
+text_store.py) instead of parsing the PDFs again. Pages that skipped the
+layout-mode pass at upload (adaptive mode) get it first, so the new
+patterns see the same text a fresh upload with the layout pass would.
+Documents uploaded before the text store existed are parsed once and their
+text stored on the way.
+
+All matching happens without the service lock; the new mappings and
+barcode index are swapped in with a single short locked step, so scans keep
+resolving against the old mappings until then.
+
+The fingerprint of the patterns the mappings were built with is kept in the
+database settings. When the server starts with different patterns, a
+re-index runs in the background by itself.
+"""
+
+import datetime
+import logging
+import threading
+import time
+
+import metrics
+import records
+from services import TextExtractionService, add_layout_text, parse_pdf
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_CHANGES = 20
+
+
+class ReindexBusy(Exception):
+    pass
+
+
+class BarcodeReindexer:
+    def __init__(self, service):
+        self.service = service
+        self.progress = None  # {done, total} while a run is going
+        self.last_report = None
+        self._run_lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._run_lock.locked()
+
+    def patterns_changed(self):
+        stored = self.service.settings.get('barcode_patterns')
+        return stored is not None and stored != TextExtractionService.patterns_fingerprint()
+
+    def start(self):
+        """Re-index in the background when the patterns changed since the last index."""
+        if 'barcode_patterns' not in self.service.settings:
+            # Mappings predate the fingerprint; assume they match the current patterns
+            with self.service.lock:
+                self.service.settings['barcode_patterns'] = TextExtractionService.patterns_fingerprint()
+            return
+        if self.patterns_changed():
+            logger.info("Barcode patterns changed; re-indexing documents in the background")
+            self.start_run()
+
+    def start_run(self):
+        def run():
+            try:
+                self.run()
+            except ReindexBusy:
+                pass
+            except Exception as e:
+                logger.error(f"Barcode re-index failed: {e}")
+
+        threading.Thread(target=run, name='reindex', daemon=True).start()
+
+    def status(self):
+        return {
+            'patterns': TextExtractionService.patterns_fingerprint(),
+            'indexed_with': self.service.settings.get('barcode_patterns'),
+            'running': self.running,
+            'progress': dict(self.progress) if self.progress else None,
+            'last_report': self.last_report
+        }
+
+    def run(self, dry_run=False):
+        """Re-index every document; returns what changed (with dry_run, what would change)."""
+        if not self._run_lock.acquire(blocking=False):
+            raise ReindexBusy('A re-index is already running')
+        try:
+            return self._run(dry_run)
+        finally:
+            self.progress = None
+            self._run_lock.release()
+
+    def _page_texts(self, file_hash, path, report):
+        stored = self.service.texts.read_document(file_hash) if file_hash else None
+        if stored is not None and stored['layout'] is not None:
+            report['from_text_store'] += 1
+            texts, added = add_layout_text(path, stored['pages'], stored['layout'])
+            if added:
+                # Adaptive mode skipped the layout pass on these pages; the new patterns may need it
+                report['layout_pages_added'] += added
+                self.service.texts.write(file_hash, texts, [True] * len(texts))
+            return texts
+        # Indexed before page text was stored (or without knowing which pages had the layout pass):
+        # parse once with the layout pass everywhere and keep the text for next time
+        texts = parse_pdf(path, 'always')['texts']
+        if file_hash:
+            self.service.texts.write(file_hash, texts, [True] * len(texts))
+        report['reparsed'] += 1
+        return texts
+
+    def _run(self, dry_run):
+        service = self.service
+        started = time.perf_counter()
+        fingerprint = TextExtractionService.patterns_fingerprint()
+        text_service = TextExtractionService()
+        report = {
+            'dry_run': dry_run,
+            'patterns': fingerprint,
+            'documents': 0,
+            'from_text_store': 0,
+            'reparsed': 0,
+            'layout_pages_added': 0,
+            'failed': [],
+            'added': 0,
+            'removed': 0,
+            'moved': 0,
+            'changes': []
+        }
+
+        documents = service.indexed_documents()
+        self.progress = {'done': 0, 'total': len(documents)}
+        mappings = {}
+        reindexed = set()
+        barcode_counts = {}
+        with metrics.timed('reindex', 'match'):
+            for file_id, file_hash, name, path in documents:
+                try:
+                    texts = self._page_texts(file_hash, path, report)
+                except Exception as e:
+                    logger.error(f"Could not re-index {name}: {e}")
+                    report['failed'].append({'file_id': file_id, 'name': name, 'error': str(e)})
+                    continue
+                found = 0
+                for page_num, text in enumerate(texts, start=1):
+                    for serial in text_service.extract_serial_numbers(text):
+                        mappings[serial['text']] = records.MappingRecord(
+                            file_id=file_id,
+                            page_num=page_num,
+                            type=serial['type'],
+                            confidence=serial['confidence'],
+                            doc_name=name
+                        )
+                        found += 1
+                reindexed.add(file_id)
+                barcode_counts[file_id] = found
+                self.progress['done'] += 1
+        report['documents'] = len(reindexed)
+
+        with service.lock:
+            current = {key: (m.file_id, m.page_num) for key, m in service.mappings.items() if m.file_id in reindexed}
+        self._compare(report, current, mappings)
+
+        if not dry_run:
+            norms = {key: service._normalize_barcode(key) for key in mappings}
+            with metrics.timed('reindex', 'swap'):
+                report['mappings_before'], report['mappings_after'] = service.swap_mappings(
+                    mappings, norms, reindexed, barcode_counts, fingerprint)
+            if report['added'] or report['removed'] or report['moved']:
+                # Dashboards reload barcode counts once
+                service.events.publish('resync', {})
+
+        report['duration_s'] = round(time.perf_counter() - started, 2)
+        report['finished_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+        if not dry_run:
+            self.last_report = report
+        logger.info(f"Barcode re-index{' (dry run)' if dry_run else ''}: {report['documents']} documents "
+                    f"({report['reparsed']} parsed again, layout text added on {report['layout_pages_added']} pages), {report['added']} added, {report['removed']} removed, "
+                    f"{report['moved']} moved in {report['duration_s']} s")
+        return report
+
+    @staticmethod
+    def _compare(report, current, mappings):
+        """Count barcodes that appear, disappear or point at another page, with a few examples."""
+        for key, (file_id, page_num) in current.items():
+            mapping = mappings.get(key)
+            if mapping is None:
+                report['removed'] += 1
+                change = {'barcode': key, 'change': 'removed', 'file_id': file_id, 'page': page_num}
+            elif (mapping.file_id, mapping.page_num) != (file_id, page_num):
+                report['moved'] += 1
+                change = {'barcode': key, 'change': 'moved', 'file_id': mapping.file_id, 'page': mapping.page_num}
+            else:
+                continue
+            if len(report['changes']) < SAMPLE_CHANGES:
+                report['changes'].append(change)
+        for key, mapping in mappings.items():
+            if key in current:
+                continue
+            report['added'] += 1
+            if len(report['changes']) < SAMPLE_CHANGES:
+                report['changes'].append({'barcode': key, 'change': 'added', 'file_id': mapping.file_id, 'page': mapping.page_num})
@@ -0,0 +1,164 @@
+"""In-memory cache of rendered labels with speculative background rendering.
+
+A successful scan is almost always followed by a preview and a print of the
+same page with the station's label settings. ``/api/scan`` can ask for that
+render to start in the background; preview and print then pick up the
+finished result (or wait for the in-flight one) instead of cropping and
+rasterizing the page again.
+
+Entries are keyed by document hash, page and the settings that affect the
+output, so a cached label is never reused for different settings.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Settings that change the cropped PDF
+CROP_DEFAULTS = (
+    ('width', 3.94),
+    ('height', 1.5),
+    ('offsetX', 0.0),
+    ('offsetY', 0.0),
+    ('scale', 100.0),
+)
+# Additional settings that change the print bitmap
+QUALITY_DEFAULTS = (
+    ('dpi', 600),
+    ('color_mode', 'grayscale'),
+    ('sharpening', True),
+    ('resampling', 'lanczos'),
+    ('contrast', 1.0),
+    ('threshold', 128),
+)
+
+
+def _settings_key(label_settings, defaults):
+    label_settings = label_settings or {}
+    key = []
+    for name, default in defaults:
+        value = label_settings.get(name, default)
+        if isinstance(default, bool):
+            value = bool(value)
+        elif isinstance(default, (int, float)):
+            value = float(value)
+        key.append(value)
+    return tuple(key)
+
+
+def crop_key(label_settings):
+    return _settings_key(label_settings, CROP_DEFAULTS)
+
+
+def label_key(kind, file_hash, page_num, label_settings):
+    """Cache key for a 'pdf' (cropped page) or 'bitmap' (print raster) render."""
+    key = (kind, file_hash, int(page_num), crop_key(label_settings))
+    if kind == 'bitmap':
+        key += (_settings_key(label_settings, QUALITY_DEFAULTS),)
+    return key
+
+
+class _Entry:
+    __slots__ = ('future', 'speculative', 'used')
+
+    def __init__(self, future, speculative):
+        self.future = future
+        self.speculative = speculative
+        self.used = False
+
+
+class LabelRenderCache:
+    def __init__(self, max_entries=32, workers=1):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prerender')
+        self._stats = {
+            'hits': 0,            # finished render found in cache
+            'inflight_hits': 0,   # waited for a render already in progress
+            'misses': 0,          # rendered on the request thread
+            'prerenders': 0,      # speculative renders started
+            'prerenders_used': 0,
+            'prerenders_wasted': 0,  # evicted without ever being used
+            'errors': 0
+        }
+
+    def get(self, key, render):
+        """Return the cached result for ``key``, rendering it with ``render()`` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits' if entry.future.done() else 'inflight_hits'] += 1
+                if entry.speculative and not entry.used:
+                    self._stats['prerenders_used'] += 1
+                entry.used = True
+            else:
+                self._stats['misses'] += 1
+
+        if entry is not None:
+            try:
+                return entry.future.result()
+            except Exception:
+                # Failed speculative render: fall through and render here
+                pass
+
+        result = render()
+        self._store_result(key, result)
+        return result
+
+    def prerender(self, key, render):
+        """Start ``render()`` in the background unless the key is cached or in flight."""
+        with self._lock:
+            if key in self._entries:
+                return False
+            future = self._executor.submit(render)
+            self._entries[key] = _Entry(future, speculative=True)
+            self._stats['prerenders'] += 1
+            self._evict()
+        future.add_done_callback(lambda f: self._on_prerender_done(key, f))
+        return True
+
+    def _on_prerender_done(self, key, future):
+        if future.exception() is None:
+            return
+        logger.warning(f"Pre-render failed for {key}: {future.exception()}")
+        with self._lock:
+            self._stats['errors'] += 1
+            entry = self._entries.get(key)
+            if entry is not None and entry.future is future:
+                del self._entries[key]
+
+    def _store_result(self, key, result):
+        future = Future()
+        future.set_result(result)
+        with self._lock:
+            entry = _Entry(future, speculative=False)
+            entry.used = True
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            _key, entry = self._entries.popitem(last=False)
+            if entry.speculative and not entry.used:
+                self._stats['prerenders_wasted'] += 1
+
+    def invalidate(self, file_hash):
+        """Drop every entry rendered from the given document."""
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == file_hash]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['in_flight'] = sum(1 for e in self._entries.values() if not e.future.done())
+        lookups = stats['hits'] + stats['inflight_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['inflight_hits']) / lookups, 3) if lookups else None
+        return stats
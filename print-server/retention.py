@@ -0,0 +1,197 @@
+"""Retention compaction inside the running server.
+
+Expires documents uploaded before the retention window, their barcode
+mappings and stored files, and print jobs older than the window (or of
+documents that are gone). Unlike ``cleanup_old_work.py`` it works on the
+server's own in-memory state, so it cannot race the server's next save and
+lose writes made meanwhile.
+
+Work is done in batches of ``batch_size`` items, each under the service lock
+and followed by a ``pause`` without it, so scans and prints keep being
+served during a pass. Mappings go first (expiring documents stop resolving),
+then the documents and their files, then the print jobs. The barcode index
+and per-page print counts are updated in place, not rebuilt.
+
+With an archive window set, a pass first moves print jobs older than it
+into archive segments (see archive.py). Archived jobs are kept for audits
+and are never expired.
+"""
+
+import datetime
+import logging
+import threading
+import time
+
+import records
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionBusy(Exception):
+    pass
+
+
+class RetentionCompactor:
+    def __init__(self, service, days=None, archive_after_days=None, batch_size=500, pause=0.02,
+                 interval=6 * 3600, initial_delay=60):
+        self.service = service
+        self.days = days
+        self.archive_after_days = archive_after_days
+        self.batch_size = batch_size
+        self.pause = pause  # Seconds between batches, without the lock
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.last_report = None
+        self._run_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Run a pass every ``interval`` seconds (only with a retention or archive window set)."""
+        if (self.days or self.archive_after_days) and self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='retention', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        time.sleep(self.initial_delay)
+        while True:
+            try:
+                self.run()
+            except RetentionBusy:
+                pass
+            except Exception as e:
+                logger.error(f"Retention pass failed: {e}")
+            time.sleep(self.interval)
+
+    @property
+    def running(self):
+        return self._run_lock.locked()
+
+    def status(self):
+        return {
+            'days': self.days,
+            'archive_after_days': self.archive_after_days,
+            'scheduled': self._thread is not None,
+            'interval_hours': round(self.interval / 3600, 2),
+            'batch_size': self.batch_size,
+            'pause_ms': round(self.pause * 1000, 1),
+            'running': self.running,
+            'last_report': self.last_report
+        }
+
+    def _step(self, report, call, *args, **kwargs):
+        start = time.perf_counter()
+        result = call(*args, **kwargs)
+        report['batches'] += 1
+        report['max_batch_ms'] = max(report['max_batch_ms'], round((time.perf_counter() - start) * 1000, 2))
+        time.sleep(self.pause)
+        return result
+
+    def run(self, dry_run=False, days=None):
+        """One pass; returns what was (or, with dry_run, would be) removed."""
+        days = days or self.days
+        if days is not None and days <= 0:
+            raise ValueError('Retention window (days) must be greater than 0')
+        if not days and not self.archive_after_days:
+            raise ValueError('Neither a retention nor an archive window is set')
+        if not self._run_lock.acquire(blocking=False):
+            raise RetentionBusy('A retention pass is already running')
+        try:
+            return self._run(days, dry_run)
+        finally:
+            self._run_lock.release()
+
+    def _run(self, days, dry_run):
+        started = time.perf_counter()
+        report = {
+            'dry_run': dry_run,
+            'archived_print_jobs': 0,
+            'archive_segments': 0,
+            'removed_documents': 0,
+            'removed_mappings': 0,
+            'removed_print_jobs': 0,
+            'batches': 0,
+            'max_batch_ms': 0.0
+        }
+        if self.archive_after_days:
+            self._archive(report, dry_run)
+        if days:
+            self._expire(report, days, dry_run)
+
+        report['duration_s'] = round(time.perf_counter() - started, 2)
+        report['finished_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+        if not dry_run:
+            self.last_report = report
+        logger.info(f"Retention pass{' (dry run)' if dry_run else ''}: {report['archived_print_jobs']} print jobs archived, "
+                    f"{report['removed_documents']} documents, {report['removed_mappings']} mappings, "
+                    f"{report['removed_print_jobs']} print jobs removed in {report['duration_s']} s")
+        return report
+
+    def _archive(self, report, dry_run):
+        service = self.service
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=self.archive_after_days)
+        cutoff_us = records.timestamp_to_us(cutoff)
+        report['archive_cutoff'] = cutoff.isoformat(timespec='seconds')
+
+        jobs = []
+        position = 0
+        while True:
+            found, next_position = self._step(report, service.archivable_print_jobs, position, self.batch_size, cutoff_us)
+            if next_position == position:
+                break
+            jobs.extend(found)
+            position = next_position
+        report['archived_print_jobs'] = len(jobs)
+        if not jobs or dry_run:
+            return
+
+        # Durable before the jobs leave the live store; committed once the database is saved without them
+        segments = service.archive.write_segments(jobs)
+        self._step(report, service.remove_archived_jobs, jobs, segments)
+        service.save_db()
+        if service.flush_db(timeout=60):
+            service.archive.commit(segments)
+        else:
+            # Left pending: at the next start, jobs still in the database are dropped from it before committing
+            logger.warning("Database not saved after archiving print jobs; archive segments left uncommitted")
+        report['archive_segments'] = len(segments)
+
+    def _expire(self, report, days, dry_run):
+        service = self.service
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+        cutoff_us = records.timestamp_to_us(cutoff)
+        report['cutoff'] = cutoff.isoformat(timespec='seconds')
+
+        expired = set(service.expired_document_ids(cutoff_us))
+        if expired:
+            keys = service.mapping_keys()
+            unindexed = set()
+            for i in range(0, len(keys), self.batch_size):
+                removed, norms = self._step(report, service.expire_mappings, keys[i:i + self.batch_size], expired, dry_run)
+                report['removed_mappings'] += removed
+                unindexed |= norms
+            if unindexed:
+                for i in range(0, len(keys), self.batch_size):
+                    self._step(report, service.reindex_barcodes, keys[i:i + self.batch_size], unindexed)
+            if report['removed_mappings'] and not dry_run:
+                service.save_db()
+
+            # One document per step: releasing its blob and labels touches the disk
+            for file_id in sorted(expired):
+                if self._step(report, service.expire_document, file_id, cutoff_us, dry_run):
+                    report['removed_documents'] += 1
+
+        position = 0
+        while True:
+            removed, next_position = self._step(
+                report, service.expire_print_jobs, position, self.batch_size, cutoff_us, dry_run,
+                gone_file_ids=expired if dry_run else ())
+            report['removed_print_jobs'] += removed
+            if not removed and next_position == position:
+                break  # Reached the end of the list
+            position = next_position
+
+        changed = report['removed_documents'] or report['removed_mappings'] or report['removed_print_jobs']
+        if changed and not dry_run:
+            service.save_db()
+            # Dashboards reload once instead of applying one delete at a time
+            service.events.publish('resync', {})
@@ -24,5 +24,5 @@ else
     source $VENV_DIR/bin/activate
 fi
 
-# Start the server
-python3 app.py
+# Start the server (pass --production for the multi-threaded server)
+python3 app.py "$@"
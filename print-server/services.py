@@ -4,67 +4,413 @@ import re
 import io
 import json
 import uuid
-import pypdf
 import platform
 import subprocess
-from reportlab.lib.units import inch
-from reportlab.pdfgen import canvas
-from PIL import Image, ImageFilter, ImageEnhance
 import threading
 import datetime
+import functools
 import hashlib
-
-# Windows-specific imports for native printing
-WINDOWS_PRINT_AVAILABLE = False
-if platform.system() == 'Windows':
-    try:
-        import win32print
-        import win32ui
-        import win32con
-        from PIL import ImageWin
-        WINDOWS_PRINT_AVAILABLE = True
-    except ImportError:
-        logging.warning("win32print not available. Install pywin32 for native Windows printing.")
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from archive import JobArchive, job_identity
+from blobstore import BlobStore, hash_file
+from db_writer import CoalescingWriter
+from events import EventBus
+from fuzzy_index import FuzzyBarcodeIndex
+from label_store import LabelArtifactStore
+from parse_worker import ParseWorkerPool
+from text_store import PageTextStore
+import metrics
+import records
+import render_cache
+import snapshot
+import startup
+
+# Heavy modules (pypdf, Pillow, pdf2image, pywin32) are imported on first use
+# to keep server startup fast; see startup.py and app.py --warmup.
+
+# PDF points per inch (same value as reportlab.lib.units.inch)
+INCH = 72.0
+
+# Windows-specific modules for native printing, loaded by windows_print_available()
+WINDOWS_PRINT_AVAILABLE = None
+win32print = win32ui = win32con = ImageWin = None
 
 logger = logging.getLogger(__name__)
 
+
+def poppler_path():
+    """Poppler bundled with the PyInstaller EXE, or None to use the system PATH."""
+    import sys
+    if not getattr(sys, 'frozen', False):
+        return None
+    # Running as PyInstaller EXE - Poppler is bundled in 'poppler' subfolder
+    path = os.path.join(sys._MEIPASS, 'poppler')
+    if not os.path.exists(path):
+        # Try alternative path structure
+        path = os.path.join(os.path.dirname(sys.executable), 'poppler')
+    return path
+
+
+def synchronized(method):
+    """Run a PDFProcessingService method under the service's state lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class PreviewUnavailable(Exception):
+    pass
+
+
+def windows_print_available():
+    """Import pywin32 on first call and report whether native printing works."""
+    global WINDOWS_PRINT_AVAILABLE, win32print, win32ui, win32con, ImageWin
+    if WINDOWS_PRINT_AVAILABLE is None:
+        WINDOWS_PRINT_AVAILABLE = False
+        if platform.system() == 'Windows':
+            try:
+                import win32print
+                import win32ui
+                import win32con
+                from PIL import ImageWin
+                WINDOWS_PRINT_AVAILABLE = True
+            except ImportError:
+                logger.warning("win32print not available. Install pywin32 for native Windows printing.")
+    return WINDOWS_PRINT_AVAILABLE
+
 class PDFProcessingService:
-    def __init__(self, upload_folder):
+    # Sections that stay as raw snapshot bytes until first use
+    LAZY_SECTIONS = ('mappings', 'print_jobs')
+    SECTION_DECODERS = {
+        'mappings': records.mappings_from_dicts,
+        'print_jobs': records.jobs_from_dicts
+    }
+
+    def __init__(self, upload_folder, db_format='json', layout_mode='always'):
         self.upload_folder = upload_folder
+        self.db_format = db_format  # 'json' (db.json) or 'snapshot' (db.snap)
+        self.layout_mode = layout_mode  # When parse_pdf runs the layout text pass: 'always' or 'adaptive'
         self.documents = {}  # In-memory store for now, or load from JSON
-        self.mappings = {}   # Map barcode -> {file_id, page_num, etc}
+        self._mappings = {}   # Map barcode -> {file_id, page_num, etc}
         self.hashes = {}     # Map hash -> file_id
-        self.print_jobs = [] # List of print jobs
+        self._print_jobs = [] # List of print jobs
         self.users = []      # List of user accounts
+        self.settings = {}   # Site-wide settings (label_defaults)
+        self._raw_sections = {}  # Snapshot sections not decoded yet
+        self._barcode_index = None  # normalized barcode -> mappings key, built on first lookup
+        self._fuzzy_index = None    # q-gram index over barcode_index, built on first near-miss lookup
+        self._page_prints = None    # (file_id, page_num) -> [success count, last success job]
         self.db_path = os.path.join(upload_folder, 'db.json')
+        self.snapshot_path = os.path.join(upload_folder, snapshot.SNAPSHOT_FILENAME)
+        self.blobs = BlobStore(upload_folder)
+        self.render_cache = render_cache.LabelRenderCache()
+        self.labels = LabelArtifactStore(upload_folder)
+        self.texts = PageTextStore(upload_folder)  # Extracted page text, for re-indexing
+        self.archive = JobArchive(upload_folder)  # Print jobs moved out of the live store
+        self.events = EventBus()
+        self.lock = threading.RLock()  # Guards documents, mappings, print jobs, users and settings
+        self._write_lock = threading.Lock()  # Keeps database writes in order
+        self._last_write_ok = True
+        self.writer = None  # CoalescingWriter once start_writer() is called
         self.load_db()
+        self._recover_archive()
+        self._migrate_legacy_uploads()
+        self.blobs.rebuild_refs(self.documents)
         self.ensure_default_admin()
+        self._register_metrics()
+
+    RENDER_CACHE_COUNTERS = ('hits', 'inflight_hits', 'misses', 'prerenders', 'prerenders_used', 'prerenders_wasted', 'errors')
+
+    def _register_metrics(self):
+        """Expose service state at /metrics; everything here is read at scrape time."""
+        registry = metrics.REGISTRY
+        registry.counter_callback(
+            'brady_render_cache_events_total', 'Render cache lookups and speculative renders.',
+            lambda: {(name,): value for name, value in self.render_cache.stats().items() if name in self.RENDER_CACHE_COUNTERS},
+            ('event',))
+        registry.gauge_callback(
+            'brady_render_cache_entries', 'Rendered labels held in memory.',
+            lambda: self.render_cache.stats()['entries'])
+        registry.gauge_callback(
+            'brady_render_cache_in_flight', 'Label renders currently running.',
+            lambda: self.render_cache.stats()['in_flight'])
+        registry.gauge_callback('brady_db_bytes', 'Size of the database file on disk.', self._db_file_size)
+        registry.gauge_callback(
+            'brady_db_records', 'Records per collection (collections not loaded yet are omitted).',
+            self._collection_sizes, ('collection',))
+        registry.gauge_callback(
+            'brady_db_pending_writes', 'Database saves requested but not yet written (production mode).',
+            lambda: self.writer.pending() if self.writer else 0)
+        registry.counter_callback(
+            'brady_db_writes_total', 'Database writes done by the background writer.',
+            lambda: self.writer.stats['writes'] if self.writer else None)
+        registry.gauge_callback('brady_event_subscribers', 'Connected /api/events clients.', self.events.subscriber_count)
+
+    def _db_file_size(self):
+        path = self.snapshot_path if self.db_format == 'snapshot' else self.db_path
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _collection_sizes(self):
+        sizes = {('documents',): len(self.documents), ('users',): len(self.users)}
+        # Reading the lazy sections here would decode them just for a scrape
+        if self._mappings is not None:
+            sizes[('mappings',)] = len(self._mappings)
+        if self._print_jobs is not None:
+            sizes[('print_jobs',)] = len(self._print_jobs)
+        return sizes
+
+    @property
+    def mappings(self):
+        if self._mappings is None:
+            self._mappings = self._decode_lazy_section('mappings', {})
+        return self._mappings
+
+    @mappings.setter
+    def mappings(self, value):
+        self._raw_sections.pop('mappings', None)
+        self._mappings = value
+        self._barcode_index = None
+        self._fuzzy_index = None
+
+    @property
+    def print_jobs(self):
+        if self._print_jobs is None:
+            self._print_jobs = self._decode_lazy_section('print_jobs', [])
+        return self._print_jobs
+
+    @print_jobs.setter
+    def print_jobs(self, value):
+        self._raw_sections.pop('print_jobs', None)
+        self._print_jobs = value
+        self._page_prints = None
+
+    @property
+    def barcode_index(self):
+        if self._barcode_index is None:
+            index = {}
+            for known_key in self.mappings.keys():
+                # First key wins when several normalize the same, as with a linear scan
+                index.setdefault(self._normalize_barcode(known_key), known_key)
+            self._barcode_index = index
+        return self._barcode_index
+
+    @property
+    def fuzzy_index(self):
+        if self._fuzzy_index is None:
+            index = FuzzyBarcodeIndex()
+            index.update(self.barcode_index)
+            self._fuzzy_index = index
+        return self._fuzzy_index
+
+    @property
+    def page_prints(self):
+        """Successful print count and latest job per page, kept current by log_print_job.
+
+        Includes archived jobs (from the archive's per-segment aggregates).
+        """
+        if self._page_prints is None:
+            self._page_prints = self.archive.page_prints()
+            for job in self.print_jobs:
+                self._count_print(job)
+        return self._page_prints
+
+    def _count_print(self, job):
+        if job.status_code != records.STATUS_SUCCESS:
+            return
+        entry = self._page_prints.get((job.file_id, job.page_num))
+        if entry is None:
+            self._page_prints[(job.file_id, job.page_num)] = [1, job]
+        else:
+            entry[0] += 1
+            if job.sort_key >= entry[1].sort_key:
+                entry[1] = job
+
+    def _decode_lazy_section(self, name, default):
+        raw = self._raw_sections.pop(name, None)
+        if raw is None:
+            return default
+        try:
+            return self.SECTION_DECODERS[name](raw.decode())
+        except Exception as e:
+            logger.error(f"Failed to decode snapshot section '{name}': {e}")
+            return default
 
     def load_db(self):
-        if os.path.exists(self.db_path):
+        if self.db_format == 'snapshot' and os.path.exists(self.snapshot_path):
+            self._load_snapshot()
+        elif os.path.exists(self.db_path):
             try:
                 with open(self.db_path, 'r') as f:
                     data = json.load(f)
                     self.documents = data.get('documents', {})
-                    self.mappings = data.get('mappings', {})
-                    self.print_jobs = data.get('print_jobs', [])
+                    self.mappings = records.mappings_from_dicts(data.get('mappings', {}))
+                    self.print_jobs = records.jobs_from_dicts(data.get('print_jobs', []))
                     self.users = data.get('users', [])
+                    self.settings = data.get('settings', {})
                     # Rebuild hash map
                     self.hashes = {doc['hash']: doc_id for doc_id, doc in self.documents.items() if 'hash' in doc}
             except Exception as e:
                 logger.error(f"Failed to load DB: {e}")
 
+    def _load_snapshot(self):
+        """Load documents and users eagerly; mappings and jobs on first access."""
+        try:
+            sections = snapshot.read_snapshot(self.snapshot_path)
+            self.documents = sections.pop('documents').decode() if 'documents' in sections else {}
+            self.users = sections.pop('users').decode() if 'users' in sections else []
+            self.settings = sections.pop('settings').decode() if 'settings' in sections else {}
+            self._raw_sections = {name: sections[name] for name in self.LAZY_SECTIONS if name in sections}
+            self._mappings = None if 'mappings' in self._raw_sections else {}
+            self._print_jobs = None if 'print_jobs' in self._raw_sections else []
+            self.hashes = {doc['hash']: doc_id for doc_id, doc in self.documents.items() if 'hash' in doc}
+        except Exception as e:
+            logger.error(f"Failed to load snapshot: {e}")
+
+    def _recover_archive(self):
+        """Finish archiving interrupted between writing a segment and saving the database."""
+        pending = self.archive.pending_segments()
+        if not pending:
+            return
+        archived = set()
+        for meta in pending:
+            archived.update(job_identity(job) for job in self.archive.read_segment(meta))
+        live = self.print_jobs
+        kept = [job for job in live if job_identity(job) not in archived]
+        if len(kept) != len(live):
+            logger.info(f"Removing {len(live) - len(kept)} print jobs already in the archive")
+            self.print_jobs = kept
+            if not self._write_db():
+                return  # Still pending; tried again at the next start
+        self.archive.commit(pending)
+
+    def start_writer(self, delay=0.05):
+        """Hand database writes to one background thread (production mode)."""
+        if self.writer is None:
+            self.writer = CoalescingWriter(self._write_db, delay=delay)
+        return self.writer
+
+    def flush_db(self, timeout=None):
+        """True once every change so far is on disk; False on timeout or when the write failed."""
+        if self.writer is not None:
+            return self.writer.flush(timeout)
+        return self._last_write_ok  # Without the writer, save_db wrote synchronously
+
     def save_db(self):
+        if self.writer is not None:
+            self.writer.request()
+        else:
+            self._write_db()
+
+    def _copy_state(self):
+        """Shallow copies of the persisted collections, taken under the state lock.
+
+        Serializing the copies happens outside the lock, so request threads
+        only wait for the copy, not for JSON encoding or disk I/O.
+        """
+        with self.lock:
+            raw = dict(self._raw_sections)
+            return {
+                'documents': {doc_id: dict(doc) for doc_id, doc in self.documents.items()},
+                'users': [dict(user) for user in self.users],
+                'settings': json.loads(json.dumps(self.settings)),
+                'mappings': raw['mappings'] if 'mappings' in raw else dict(self.mappings),
+                'print_jobs': raw['print_jobs'] if 'print_jobs' in raw else list(self.print_jobs)
+            }
+
+    def _write_db(self):
+        """Write the database; returns whether it was saved."""
+        with self._write_lock:
+            if self.db_format == 'snapshot':
+                self._last_write_ok = self._save_snapshot()
+                return self._last_write_ok
+            try:
+                start = time.perf_counter()
+                state = self._copy_state()
+                data = json.dumps({
+                    'documents': state['documents'],
+                    'mappings': records.mappings_to_dicts(state['mappings']),
+                    'print_jobs': records.jobs_to_dicts(state['print_jobs']),
+                    'users': state['users'],
+                    'settings': state['settings']
+                }, indent=2)
+                self._replace_file(self.db_path, data.encode('utf-8'))
+                metrics.STAGE_SECONDS.observe(time.perf_counter() - start, 'db', 'save')
+                self._last_write_ok = True
+            except Exception as e:
+                logger.error(f"Failed to save DB: {e}")
+                self._last_write_ok = False
+            return self._last_write_ok
+
+    def _replace_file(self, path, data):
+        fd, temp_path = tempfile.mkstemp(prefix='.db.', suffix='.json', dir=self.upload_folder)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(temp_path, 0o644)  # mkstemp creates 0600
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _save_snapshot(self):
         try:
-            with open(self.db_path, 'w') as f:
-                json.dump({
-                    'documents': self.documents,
-                    'mappings': self.mappings,
-                    'print_jobs': self.print_jobs,
-                    'users': self.users
-                }, f, indent=2)
+            start = time.perf_counter()
+            state = self._copy_state()
+            # Sections nobody has touched are copied through without decoding
+            for name, to_dicts in (('mappings', records.mappings_to_dicts), ('print_jobs', records.jobs_to_dicts)):
+                if not isinstance(state[name], snapshot.RawSection):
+                    state[name] = to_dicts(state[name])
+            snapshot.write_snapshot(self.snapshot_path, state)
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - start, 'db', 'save')
+            return True
         except Exception as e:
-            logger.error(f"Failed to save DB: {e}")
+            logger.error(f"Failed to save snapshot: {e}")
+            return False
+
+    def _migrate_legacy_uploads(self):
+        """Move files saved as uploads/<name>.pdf into the blob store (one-time)."""
+        legacy = {}
+        for doc in self.documents.values():
+            path = doc.get('path')
+            if path and not self.blobs.is_blob_path(path) and os.path.isfile(path):
+                legacy.setdefault(path, []).append(doc)
+        if not legacy:
+            return
+
+        for path, docs in legacy.items():
+            try:
+                file_hash, blob_path = self.blobs.adopt(path)
+            except OSError as e:
+                logger.error(f"Could not move {path} into the blob store: {e}")
+                continue
+            for doc in docs:
+                if doc.get('hash') == file_hash:
+                    doc['path'] = blob_path
+                else:
+                    # The name was overwritten by a later upload; this document's bytes are gone
+                    logger.warning(f"Document {doc.get('id')} no longer matches {path}; leaving its path unchanged")
+        logger.info(f"Moved {len(legacy)} legacy upload(s) into the blob store")
+        self.save_db()
+
+    @synchronized
+    def get_label_defaults(self):
+        """Site default label settings used for label precompute at ingest."""
+        return dict(self.settings.get('label_defaults', {}))
+
+    @synchronized
+    def set_label_defaults(self, label_settings):
+        self.settings['label_defaults'] = dict(label_settings)
+        self.save_db()
+
+    @synchronized
+    def set_printer_pools(self, pools):
+        self.settings['printer_pools'] = {name: list(members) for name, members in pools.items()}
+        self.save_db()
 
     def ensure_default_admin(self):
         if not self.users:
@@ -77,6 +423,7 @@ class PDFProcessingService:
             ]
             self.save_db()
 
+    @synchronized
     def get_public_users(self):
         return [
             {
@@ -86,12 +433,14 @@ class PDFProcessingService:
             for user in self.users
         ]
 
+    @synchronized
     def find_user(self, username):
         for user in self.users:
             if user.get('username') == username:
                 return user
         return None
 
+    @synchronized
     def add_user(self, username, password, role):
         if self.find_user(username):
             return False, 'Username already exists'
@@ -104,6 +453,7 @@ class PDFProcessingService:
         self.save_db()
         return True, None
 
+    @synchronized
     def delete_user(self, username):
         user = self.find_user(username)
         if not user:
@@ -118,6 +468,7 @@ class PDFProcessingService:
         self.save_db()
         return True, None
 
+    @synchronized
     def reset_user_password(self, username, new_password):
         user = self.find_user(username)
         if not user:
@@ -127,6 +478,7 @@ class PDFProcessingService:
         self.save_db()
         return True, None
 
+    @synchronized
     def change_user_password(self, username, current_password, new_password):
         user = self.find_user(username)
         if not user:
@@ -139,6 +491,7 @@ class PDFProcessingService:
         self.save_db()
         return True, None
 
+    @synchronized
     def authenticate_user(self, username, password):
         user = self.find_user(username)
         if not user:
@@ -152,9 +505,48 @@ class PDFProcessingService:
             'role': user.get('role', 'user')
         }
 
+    @synchronized
     def log_print_job(self, job_data):
-        self.print_jobs.append(job_data)
+        job = records.PrintJobRecord.from_dict(job_data)
+        succeeded = job.status_code == records.STATUS_SUCCESS
+        first_print = succeeded and (job.file_id, job.page_num) not in self.page_prints
+        self.print_jobs.append(job)
+        self._count_print(job)
         self.save_db()
+        self._publish_job(job, first_print)
+
+    @synchronized
+    def update_print_job(self, job_id, changes):
+        """Change a logged job in place (e.g. when a background retry finishes); returns it, or None if gone."""
+        for job in reversed(self.print_jobs):  # Jobs still being retried are recent
+            if job.id == job_id:
+                break
+        else:
+            return None
+        previous = job.status_code
+        page_prints = self.page_prints  # Built before the change so the job is counted once below
+        job.update(changes)
+        succeeded = job.status_code == records.STATUS_SUCCESS and previous != records.STATUS_SUCCESS
+        first_print = succeeded and (job.file_id, job.page_num) not in page_prints
+        if succeeded:
+            self._count_print(job)
+        self.save_db()
+        self._publish_job(job, first_print, previous)
+        return job
+
+    def _publish_job(self, job, first_print, previous=None):
+        doc = self.documents.get(job.file_id)
+        # Dashboards replace a listed job with the same id
+        self.events.publish('job_logged', {'job': job.to_dict(), 'first_print': first_print})
+        if doc is None:
+            return  # Stats only count jobs of documents that still exist
+        # An updated job moves between counts (a dead letter requeued is no longer failed)
+        self.events.publish('stats_delta', {
+            'uploaded_at': doc.get('uploaded_at'),
+            'total_prints': int(job.status_code == records.STATUS_SUCCESS) - int(previous == records.STATUS_SUCCESS),
+            'failed_prints': int(job.status_code == records.STATUS_FAILED) - int(previous == records.STATUS_FAILED),
+            'pending_prints': -1 if first_print else 0
+        })
 
     def _parse_date(self, value):
         if not value:
@@ -186,55 +578,75 @@ class PDFProcessingService:
         return True
 
     def get_print_history(self, from_date=None, to_date=None, status=None):
-        """Return print history sorted by timestamp desc, optionally filtered."""
+        """Return print history sorted by timestamp desc, optionally filtered.
+
+        Archived segments are read outside the lock, and only those that
+        overlap the date range.
+        """
+        jobs = self._filter_print_jobs(from_date, to_date, status)
+        start_us, end_us = records.date_bounds_us(self._parse_date(from_date), self._parse_date(to_date))
+        archived = self.archive.query(start_us, end_us, status)
+        if archived:
+            jobs = sorted(jobs + archived, key=lambda x: x.sort_key, reverse=True)
+        return records.jobs_to_dicts(jobs)
+
+    @synchronized
+    def _filter_print_jobs(self, from_date=None, to_date=None, status=None):
+        """Same as get_print_history but returns the job records themselves."""
         parsed_from = self._parse_date(from_date)
         parsed_to = self._parse_date(to_date)
+        start_us, end_us = records.date_bounds_us(parsed_from, parsed_to)
+        filter_dates = parsed_from or parsed_to
 
         filtered = []
         for job in self.print_jobs:
-            if status and status != 'all' and job.get('status') != status:
-                continue
-            if (parsed_from or parsed_to) and not self._matches_date_range(job.get('timestamp'), parsed_from, parsed_to):
+            if status and status != 'all' and job.status != status:
                 continue
+            if filter_dates:
+                ts = job.timestamp_us
+                if ts is None or (start_us is not None and ts < start_us) or (end_us is not None and ts >= end_us):
+                    continue
             filtered.append(job)
 
-        return sorted(filtered, key=lambda x: x['timestamp'], reverse=True)
+        filtered.sort(key=lambda x: x.sort_key, reverse=True)
+        return filtered
 
+    @synchronized
     def get_barcode_print_count(self, barcode):
         """Count how many times a barcode was printed"""
-        count = 0
         # Find the mapping for this barcode to get file_id and page_num
         _matched, mapping = self.resolve_barcode(barcode)
         if not mapping:
             return 0
-        
-        file_id = mapping['file_id']
-        page_num = mapping['page_num']
-        
-        for job in self.print_jobs:
-            if job['file_id'] == file_id and job['page_num'] == page_num and job['status'] == 'success':
-                count += 1
-        return count
+        return self.get_page_print_count(mapping['file_id'], mapping['page_num'])
 
+    @synchronized
     def get_last_print_for_barcode(self, barcode):
         """Get the last successful print job for a barcode"""
         _matched, mapping = self.resolve_barcode(barcode)
         if not mapping:
             return None
-        
-        file_id = mapping['file_id']
-        page_num = mapping['page_num']
-        
-        # Sort jobs by timestamp desc and find first matching
-        sorted_jobs = sorted(self.print_jobs, key=lambda x: x['timestamp'], reverse=True)
-        for job in sorted_jobs:
-            if job['file_id'] == file_id and job['page_num'] == page_num and job['status'] == 'success':
-                return {
-                    'timestamp': job['timestamp'],
-                    'printer': job.get('printer', 'Default')
-                }
-        return None
+        return self.get_last_print_for_page(mapping['file_id'], mapping['page_num'])
+
+    @synchronized
+    def get_page_print_count(self, file_id, page_num):
+        """Count successful prints of a page (for callers that already resolved it)"""
+        entry = self.page_prints.get((file_id, page_num))
+        return entry[0] if entry else 0
+
+    @synchronized
+    def get_last_print_for_page(self, file_id, page_num):
+        """Get the last successful print job for a page"""
+        entry = self.page_prints.get((file_id, page_num))
+        if entry is None:
+            return None
+        last_job = entry[1]
+        return {
+            'timestamp': last_job['timestamp'],
+            'printer': last_job.get('printer', 'Default')
+        }
 
+    @synchronized
     def get_dashboard_stats(self, from_date=None, to_date=None):
         """Get dashboard statistics, optionally filtered by date range."""
         docs = self.get_all_documents(from_date=from_date, to_date=to_date)
@@ -244,15 +656,16 @@ class PDFProcessingService:
         total_pages = sum(doc.get('pages', 0) for doc in docs)
 
         # For cards we track labels/pages printed in filtered period.
-        jobs = self.get_print_history(from_date=from_date, to_date=to_date)
-        total_prints = len([j for j in jobs if j.get('status') == 'success' and j.get('file_id') in doc_ids])
-        failed_prints = len([j for j in jobs if j.get('status') == 'failed' and j.get('file_id') in doc_ids])
+        jobs = self._filter_print_jobs(from_date=from_date, to_date=to_date)
+        total_prints = len([j for j in jobs if j.status_code == records.STATUS_SUCCESS and j.file_id in doc_ids])
+        failed_prints = len([j for j in jobs if j.status_code == records.STATUS_FAILED and j.file_id in doc_ids])
+        archived_prints, archived_failed = self.archive.print_counts(
+            doc_ids, self._parse_date(from_date), self._parse_date(to_date))
+        total_prints += archived_prints
+        failed_prints += archived_failed
 
         # "left" = uploaded labels/pages in range - unique printed pages for those docs
-        printed_pages = set()
-        for job in self.print_jobs:
-            if job.get('status') == 'success' and job.get('file_id') in doc_ids:
-                printed_pages.add((job.get('file_id'), job.get('page_num')))
+        printed_pages = {key for key in self.page_prints if key[0] in doc_ids}
 
         pending_prints = max(total_pages - len(printed_pages), 0)
 
@@ -264,6 +677,7 @@ class PDFProcessingService:
             'pending_prints': pending_prints
         }
 
+    @synchronized
     def get_document_print_stats(self, file_id):
         """Get print statistics for a specific document"""
         if file_id not in self.documents:
@@ -273,17 +687,17 @@ class PDFProcessingService:
         
         # Get mappings for this document
         doc_mappings = [
-            {'barcode': k, **v}
+            {'barcode': k, **v.to_dict()}
             for k, v in self.mappings.items()
-            if v['file_id'] == file_id
+            if v.file_id == file_id
         ]
         
-        # Count prints per page
-        page_print_counts = {}
-        for job in self.print_jobs:
-            if job['file_id'] == file_id and job['status'] == 'success':
-                page_num = job['page_num']
-                page_print_counts[page_num] = page_print_counts.get(page_num, 0) + 1
+        # Count prints per page (archived jobs included)
+        page_print_counts = {
+            page_num: entry[0]
+            for (doc_id, page_num), entry in self.page_prints.items()
+            if doc_id == file_id
+        }
         
         # Calculate printed and pending
         printed_pages = set(page_print_counts.keys())
@@ -302,28 +716,39 @@ class PDFProcessingService:
         }
 
     def calculate_file_hash(self, file_path):
-        sha256_hash = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
-
-    def process_pdf(self, file_path, original_filename):
-        # Calculate Hash
-        file_hash = self.calculate_file_hash(file_path)
+        return hash_file(file_path)
+
+    @synchronized
+    def _duplicate_result(self, file_hash):
+        if file_hash not in self.hashes:
+            return None
+        existing_id = self.hashes[file_hash]
+        logger.info(f"Duplicate file uploaded. Returning existing ID: {existing_id}")
+        return {
+            'id': existing_id,
+            'stats': {
+                'pages': self.documents[existing_id]['pages'],
+                'barcodes': self.documents[existing_id]['barcodes_found']
+            },
+            'is_duplicate': True
+        }
+
+    def process_pdf(self, file_path, original_filename, file_hash=None, parsed=None, save=True):
+        """Index a PDF and move it into the blob store.
+
+        Uploads pass the hash computed while spooling so the file is not
+        read again; duplicates return before any PDF parsing and the file
+        at ``file_path`` is left for the caller to discard. Bulk uploads
+        pass ``parsed`` (from parse_pdf in a worker process) and save once
+        for the whole batch.
+        """
+        if file_hash is None:
+            file_hash = self.calculate_file_hash(file_path)
         
         # Check for duplicates
-        if file_hash in self.hashes:
-            existing_id = self.hashes[file_hash]
-            logger.info(f"Duplicate file uploaded. Returning existing ID: {existing_id}")
-            return {
-                'id': existing_id,
-                'stats': {
-                    'pages': self.documents[existing_id]['pages'],
-                    'barcodes': self.documents[existing_id]['barcodes_found']
-                },
-                'is_duplicate': True
-            }
+        duplicate = self._duplicate_result(file_hash)
+        if duplicate:
+            return duplicate
 
         file_id = str(uuid.uuid4())
         
@@ -338,47 +763,58 @@ class PDFProcessingService:
         }
 
         # Process PDF
-        reader = pypdf.PdfReader(file_path)
-        doc_info['pages'] = len(reader.pages)
-        
-        # Text Extraction Service Logic Integrated here
-        text_service = TextExtractionService()
-        
-        for i, page in enumerate(reader.pages):
-            page_num = i + 1
-            extracted_texts = []
-
-            text = page.extract_text()
-            if text:
-                extracted_texts.append(text)
-
-            # Fallback for PDFs where the default extractor drops/reshapes text
-            # differently on some platforms/fonts.
-            try:
-                layout_text = page.extract_text(extraction_mode='layout')
-                if layout_text and layout_text not in extracted_texts:
-                    extracted_texts.append(layout_text)
-            except Exception:
-                pass
-
-            serials = text_service.extract_serial_numbers('\n'.join(extracted_texts))
-            
-            for serial in serials:
-                barcode = serial['text']
+        if parsed is None:
+            with metrics.timed('upload', 'parse'):
+                parsed = parse_pdf(file_path, self.layout_mode)
+        doc_info['pages'] = parsed['pages']
+        try:
+            self.texts.write(file_hash, parsed['texts'], parsed.get('layout'))
+        except Exception as e:
+            logger.error(f"Could not store page text of {original_filename}: {e}")
+
+        found = []  # (barcode, MappingRecord), stored once parsing is done
+        for page_num, serial in parsed['serials']:
+            found.append((serial['text'], records.MappingRecord(
+                file_id=file_id,
+                page_num=page_num,
+                type=serial['type'],
+                confidence=serial['confidence'],
+                doc_name=original_filename
+            )))
+        doc_info['barcodes_found'] = len(found)
+
+        # Parsing ran without the lock; the same file may have been added meanwhile
+        with self.lock, metrics.timed('upload', 'index'):
+            duplicate = self._duplicate_result(file_hash)
+            if duplicate:
+                return duplicate
+
+            for barcode, mapping in found:
                 # Store mapping (normalize barcode logic if needed)
-                self.mappings[barcode] = {
-                    'file_id': file_id,
-                    'page_num': page_num,
-                    'type': serial['type'],
-                    'confidence': serial['confidence'],
-                    'doc_name': original_filename
-                }
-                doc_info['barcodes_found'] += 1
-                logger.info(f"Found {barcode} on page {page_num}")
-
-        self.documents[file_id] = doc_info
-        self.hashes[file_hash] = file_id  # Store hash
-        self.save_db()
+                self.mappings[barcode] = mapping
+                if self._barcode_index is not None:
+                    norm = self._normalize_barcode(barcode)
+                    if norm not in self._barcode_index:
+                        self._barcode_index[norm] = barcode
+                        if self._fuzzy_index is not None:
+                            self._fuzzy_index.add(norm)
+
+            # Store content-addressed so identical names never overwrite each other
+            doc_info['path'] = self.blobs.put(file_path, file_hash)
+            self.blobs.acquire(file_hash)
+
+            self.documents[file_id] = doc_info
+            self.hashes[file_hash] = file_id  # Store hash
+            if save:
+                self.save_db()
+
+        self.events.publish('document_added', {**doc_info, 'printed_pages': 0, 'left_pages': doc_info['pages']})
+        self.events.publish('stats_delta', {
+            'uploaded_at': doc_info['uploaded_at'],
+            'total_documents': 1,
+            'total_pages': doc_info['pages'],
+            'pending_prints': doc_info['pages']
+        })
         
         return {
             'id': file_id, 
@@ -389,49 +825,277 @@ class PDFProcessingService:
             'is_duplicate': False
         }
 
+    def process_pdf_batch(self, items, workers=1):
+        """Index several spooled PDFs, given as (original_filename, path, file_hash).
+
+        New files are parsed in up to ``workers`` worker processes, then all
+        are indexed and the database is saved once. Returns one process_pdf
+        result per item, in order, or {'error': ...} for files that failed.
+        A file repeated within the batch is reported as a duplicate.
+        """
+        results = [None] * len(items)
+        first_of_hash = {}
+        for i, (_name, _path, file_hash) in enumerate(items):
+            results[i] = self._duplicate_result(file_hash)
+            if results[i] is None:
+                first_of_hash.setdefault(file_hash, i)
+        to_parse = sorted(first_of_hash.values())
+
+        parsed = {}
+        with metrics.timed('bulk_upload', 'parse'):
+            if workers > 1 and len(to_parse) > 1:
+                with ParseWorkerPool(min(workers, len(to_parse)), self.layout_mode) as pool:
+                    futures = {i: pool.submit(items[i][1]) for i in to_parse}
+                    for i, future in futures.items():
+                        try:
+                            parsed[i] = future.result()
+                        except Exception as e:
+                            logger.error(f"Could not parse {items[i][0]}: {e}")
+                            results[i] = {'error': str(e)}
+            else:
+                for i in to_parse:
+                    try:
+                        parsed[i] = parse_pdf(items[i][1], self.layout_mode)
+                    except Exception as e:
+                        logger.error(f"Could not parse {items[i][0]}: {e}")
+                        results[i] = {'error': str(e)}
+
+        added = False
+        with metrics.timed('bulk_upload', 'index'):
+            for i in to_parse:
+                if i not in parsed:
+                    continue
+                name, path, file_hash = items[i]
+                try:
+                    results[i] = self.process_pdf(path, name, file_hash=file_hash, parsed=parsed[i], save=False)
+                    added = added or not results[i].get('is_duplicate')
+                except Exception as e:
+                    logger.error(f"Could not index {name}: {e}")
+                    results[i] = {'error': str(e)}
+            if added:
+                self.save_db()
+
+        for i, (_name, _path, file_hash) in enumerate(items):
+            if results[i] is None:
+                # Same content as an earlier file of this batch
+                results[i] = self._duplicate_result(file_hash) or results[first_of_hash[file_hash]]
+        return results
+
+    @synchronized
     def delete_document(self, file_id):
         if file_id in self.documents:
-            doc = self.documents[file_id]
             # Remove from mappings
-            self.mappings = {k: v for k, v in self.mappings.items() if v['file_id'] != file_id}
-            # Remove from hashes
-            if 'hash' in doc and doc['hash'] in self.hashes:
-                del self.hashes[doc['hash']]
-            
-            # Try to remove file
-            try:
-                if os.path.exists(doc['path']):
-                    os.remove(doc['path'])
-            except Exception as e:
-                logger.error(f"Error removing file: {e}")
-                
-            del self.documents[file_id]
+            self.mappings = {k: v for k, v in self.mappings.items() if v.file_id != file_id}
+            self._drop_document(file_id)
             self.save_db()
+            # Deletes are rare; dashboards reload stats rather than apply a delta
+            self.events.publish('document_deleted', {'id': file_id})
             return True
         return False
 
+    def _drop_document(self, file_id):
+        """Remove a document whose mappings are already gone, with its file and cached labels."""
+        doc = self.documents.pop(file_id)
+        # Remove from hashes
+        if 'hash' in doc and self.hashes.get(doc['hash']) == file_id:
+            del self.hashes[doc['hash']]
+
+        self.render_cache.invalidate(doc.get('hash', file_id))
+        if doc.get('hash') and doc['hash'] not in self.hashes:
+            self.labels.remove_document(doc['hash'])
+            self.texts.remove_document(doc['hash'])
+
+        # Release the file; a blob is removed only with its last document
+        try:
+            path = doc.get('path')
+            if self.blobs.is_blob_path(path):
+                self.blobs.release(doc['hash'])
+            elif path and os.path.exists(path) and not any(d.get('path') == path for d in self.documents.values()):
+                os.remove(path)
+        except Exception as e:
+            logger.error(f"Error removing file: {e}")
+
+    # Retention: small steps, each under the lock, driven by retention.RetentionCompactor
+
+    @synchronized
+    def expired_document_ids(self, cutoff_us):
+        """Documents uploaded before the cutoff (documents without a date are kept)."""
+        expired = []
+        for doc_id, doc in self.documents.items():
+            uploaded_us = records.timestamp_to_us(doc.get('uploaded_at')) if doc.get('uploaded_at') else None
+            if uploaded_us is not None and uploaded_us < cutoff_us:
+                expired.append(doc_id)
+        return expired
+
+    @synchronized
+    def mapping_keys(self):
+        return list(self.mappings.keys())
+
+    @synchronized
+    def expire_mappings(self, keys, file_ids, dry_run=False):
+        """Remove the given barcodes that map into file_ids; returns (removed, unindexed norms).
+
+        The barcode index is updated in place rather than rebuilt. A removed
+        barcode may have shadowed another one that normalizes the same; those
+        norms are returned so reindex_barcodes can restore the survivor.
+        """
+        removed = 0
+        unindexed = set()
+        index = self._barcode_index
+        for key in keys:
+            mapping = self.mappings.get(key)
+            if mapping is None or mapping.file_id not in file_ids:
+                continue
+            removed += 1
+            if dry_run:
+                continue
+            del self.mappings[key]
+            if index is not None:
+                norm = self._normalize_barcode(key)
+                if index.get(norm) == key:
+                    del index[norm]
+                    unindexed.add(norm)
+                    if self._fuzzy_index is not None:
+                        self._fuzzy_index.remove(norm)
+        return removed, unindexed
+
+    @synchronized
+    def reindex_barcodes(self, keys, norms):
+        index = self._barcode_index
+        if index is None:
+            return  # Rebuilt from the current mappings on next lookup anyway
+        for key in keys:
+            if key in self.mappings:
+                norm = self._normalize_barcode(key)
+                if norm in norms and norm not in index:
+                    index[norm] = key
+                    if self._fuzzy_index is not None:
+                        self._fuzzy_index.add(norm)
+
+    @synchronized
+    def archivable_print_jobs(self, start, count, cutoff_us):
+        """Jobs older than the cutoff in print_jobs[start:start + count]; returns (jobs, next start)."""
+        chunk = self.print_jobs[start:start + count]
+        return [job for job in chunk if job.timestamp_us is not None and job.timestamp_us < cutoff_us], start + len(chunk)
+
+    @synchronized
+    def remove_archived_jobs(self, jobs, segments):
+        """Swap archived jobs out of the live store and make their segments queryable, in one step.
+
+        Per-page print counts do not change: the archive's aggregates now
+        account for these jobs.
+        """
+        archived = set(map(id, jobs))
+        self.print_jobs[:] = [job for job in self.print_jobs if id(job) not in archived]
+        self.archive.publish(segments)
+
+    @synchronized
+    def expire_document(self, file_id, cutoff_us, dry_run=False):
+        """Drop one expired document once nothing maps into it any more."""
+        doc = self.documents.get(file_id)
+        uploaded_us = records.timestamp_to_us(doc.get('uploaded_at')) if doc and doc.get('uploaded_at') else None
+        if uploaded_us is None or uploaded_us >= cutoff_us:
+            return False
+        if not dry_run:
+            self._drop_document(file_id)
+        return True
+
+    @synchronized
+    def expire_print_jobs(self, start, count, cutoff_us, dry_run=False, gone_file_ids=()):
+        """Remove jobs older than the cutoff or of deleted documents from print_jobs[start:start + count].
+
+        Returns (removed, index to continue from). Jobs are only ever appended,
+        so positions before the end stay valid between calls. A dry run passes
+        the documents it would have dropped as gone_file_ids.
+        """
+        jobs = self.print_jobs
+        chunk = jobs[start:start + count]
+        kept = [job for job in chunk
+                if not (job.timestamp_us is not None and job.timestamp_us < cutoff_us)
+                and not (job.file_id and (job.file_id not in self.documents or job.file_id in gone_file_ids))]
+        removed = len(chunk) - len(kept)
+        if dry_run or not removed:
+            return removed, start + len(chunk)
+
+        jobs[start:start + len(chunk)] = kept
+        if self._page_prints is not None:
+            kept_ids = set(map(id, kept))
+            for job in chunk:
+                if id(job) in kept_ids or job.status_code != records.STATUS_SUCCESS:
+                    continue
+                entry = self._page_prints.get((job.file_id, job.page_num))
+                if entry is None:
+                    continue
+                entry[0] -= 1
+                if entry[0] <= 0:
+                    del self._page_prints[(job.file_id, job.page_num)]
+                elif entry[1] is job:
+                    self._page_prints = None  # Latest print expired but older ones did not; recount lazily
+                    break
+        return removed, start + len(kept)
+
+    # Re-indexing: patterns run over stored page text, driven by reindex.BarcodeReindexer
+
+    @synchronized
+    def indexed_documents(self):
+        """(file_id, hash, name, path) of every document, in upload order."""
+        return [(doc_id, doc.get('hash'), doc.get('name'), doc.get('path')) for doc_id, doc in self.documents.items()]
+
+    @synchronized
+    def swap_mappings(self, mappings, norms, reindexed, barcode_counts, fingerprint):
+        """Replace the mappings of the re-indexed documents in one step.
+
+        ``mappings`` holds the new barcodes of the documents in ``reindexed``
+        and ``norms`` their normalized forms, both worked out without the
+        lock. Mappings of documents uploaded meanwhile (or that could not be
+        re-indexed) are kept and, being newer, win over re-indexed ones.
+        Returns the number of mappings before and after.
+        """
+        before = len(self.mappings)
+        merged = {key: mapping for key, mapping in mappings.items() if mapping.file_id in self.documents}
+        for key, mapping in self.mappings.items():
+            if mapping.file_id not in reindexed:
+                merged[key] = mapping
+
+        index = {}
+        for key in merged:
+            norm = norms.get(key)
+            index.setdefault(norm if norm is not None else self._normalize_barcode(key), key)
+        self.mappings = merged
+        self._barcode_index = index  # The fuzzy index is rebuilt from it on the next near miss
+
+        for file_id, count in barcode_counts.items():
+            if file_id in self.documents:
+                self.documents[file_id]['barcodes_found'] = count
+        self.settings['barcode_patterns'] = fingerprint
+        self.save_db()
+        return before, len(merged)
+
+    @synchronized
     def get_all_documents(self, from_date=None, to_date=None):
         # Convert dict to sorted list
         parsed_from = self._parse_date(from_date)
         parsed_to = self._parse_date(to_date)
 
+        # Pages printed at least once per document, archived prints included
+        printed_pages = {}
+        for file_id, _page_num in self.page_prints:
+            printed_pages[file_id] = printed_pages.get(file_id, 0) + 1
+
         docs_list = []
         for doc in self.documents.values():
             if (parsed_from or parsed_to) and not self._matches_date_range(doc.get('uploaded_at'), parsed_from, parsed_to):
                 continue
 
-            printed_pages = set()
-            for job in self.print_jobs:
-                if job.get('file_id') == doc.get('id') and job.get('status') == 'success':
-                    printed_pages.add(job.get('page_num'))
-
+            printed = printed_pages.get(doc.get('id'), 0)
             doc_with_counts = dict(doc)
-            doc_with_counts['printed_pages'] = len(printed_pages)
-            doc_with_counts['left_pages'] = max(doc.get('pages', 0) - len(printed_pages), 0)
+            doc_with_counts['printed_pages'] = printed
+            doc_with_counts['left_pages'] = max(doc.get('pages', 0) - printed, 0)
             docs_list.append(doc_with_counts)
 
         return sorted(docs_list, key=lambda x: x['uploaded_at'], reverse=True)
 
+    @synchronized
     def get_document_details(self, file_id):
         if file_id not in self.documents:
             return None
@@ -439,9 +1103,9 @@ class PDFProcessingService:
         doc = self.documents[file_id]
         # Get all mappings for this doc
         doc_mappings = [
-            {'barcode': k, **v} 
-            for k, v in self.mappings.items() 
-            if v['file_id'] == file_id
+            {'barcode': k, **v.to_dict()}
+            for k, v in self.mappings.items()
+            if v.file_id == file_id
         ]
         
         # Sort mappings by page number
@@ -465,6 +1129,7 @@ class PDFProcessingService:
         # Remove control characters (0x00-0x1F and 0x7F)
         return ''.join(ch for ch in s if (ord(ch) >= 32 and ord(ch) != 127))
 
+    @synchronized
     def resolve_barcode(self, barcode):
         """Resolve a scanned barcode to a stored mapping.
 
@@ -485,14 +1150,14 @@ class PDFProcessingService:
             return None, None
 
         # Fast path: exact match by normalized key
-        for known_key in self.mappings.keys():
-            if self._normalize_barcode(known_key) == raw:
-                return known_key, self.mappings[known_key]
+        index = self.barcode_index
+        known_key = index.get(raw)
+        if known_key is not None:
+            return known_key, self.mappings[known_key].to_dict()
 
         # Collect partial-match candidates
         candidates = []
-        for known_key in self.mappings.keys():
-            known_norm = self._normalize_barcode(known_key)
+        for known_norm, known_key in index.items():
             if len(known_norm) < 6:
                 continue
             if known_norm in raw or raw in known_norm:
@@ -508,12 +1173,77 @@ class PDFProcessingService:
             return (len(known_norm), contained_in_scan)
 
         best_key, _best_norm = max(candidates, key=sort_key)
-        return best_key, self.mappings[best_key]
+        return best_key, self.mappings[best_key].to_dict()
+
+    @synchronized
+    def warmup(self):
+        """Decode lazily loaded sections and build the lookup indexes up front."""
+        self.barcode_index
+        self.fuzzy_index
+        self.page_prints
+        return {
+            'mappings': len(self.mappings),
+            'print_jobs': len(self.print_jobs)
+        }
 
     def find_barcode(self, barcode):
         _, mapping = self.resolve_barcode(barcode)
         return mapping
 
+    @synchronized
+    def suggest_barcodes(self, barcode, limit=5):
+        """Stored barcodes one edit away from a scan that resolved to nothing (worn labels).
+
+        Only offered to the operator, never used by resolve_barcode, so a
+        misread can not print the wrong unit. Confidence is the similarity
+        (1 - edits / length) shared between candidates that are equally close.
+        """
+        raw = self._normalize_barcode(barcode)
+        matches = self.fuzzy_index.search(raw, limit=limit)
+        suggestions = []
+        for norm, distance in matches:
+            ties = sum(1 for _other, other_distance in matches if other_distance == distance)
+            key = self.barcode_index[norm]
+            suggestions.append({
+                'barcode': key,
+                'distance': distance,
+                'confidence': round((1 - distance / max(len(raw), len(norm))) / ties, 3),
+                'mapping': self.mappings[key].to_dict()
+            })
+        return suggestions
+
+    @synchronized
+    def resolve_barcodes(self, barcodes):
+        """Resolve many scans in one pass, with the print count and last print of each page.
+
+        Returns one entry per scan, in order. Scans that normalize the same
+        are resolved once.
+        """
+        resolved = {}  # normalized scan -> entry
+        results = []
+        for barcode in barcodes:
+            raw = self._normalize_barcode(barcode)
+            entry = resolved.get(raw)
+            if entry is None:
+                matched, mapping = self.resolve_barcode(raw)
+                if mapping:
+                    entry = {
+                        'found': True,
+                        'matched_barcode': matched,
+                        'mapping': mapping,
+                        'print_count': self.get_page_print_count(mapping['file_id'], mapping['page_num']),
+                        'last_print': self.get_last_print_for_page(mapping['file_id'], mapping['page_num'])
+                    }
+                else:
+                    entry = {'found': False, 'suggestions': self.suggest_barcodes(raw)}
+                resolved[raw] = entry
+            results.append({'barcode': barcode, **entry})
+        return results
+
+    @synchronized
+    def barcode_pages(self, file_id):
+        return sorted({m.page_num for m in list(self.mappings.values()) if m.file_id == file_id})
+
     def get_page_image(self, file_id, page_num, label_settings=None):
         # In a real implementation, we render PDF page to image for preview
         # simplified here to return specific page bytes as PDF for browser
@@ -527,11 +1257,62 @@ class PDFProcessingService:
         doc = self.documents.get(file_id)
         if not doc:
             raise Exception("Document not found")
-            
-        return self._extract_page_bytes(doc['path'], page_num, label_settings)
+
+        # Served from the render cache when /api/scan pre-rendered this label,
+        # or from the label store when it was precomputed at ingest
+        key = render_cache.label_key('pdf', doc.get('hash', file_id), page_num, label_settings)
+        return self.render_cache.get(key, lambda: self._load_page_bytes(key, doc['path'], page_num, label_settings))
+
+    def _load_page_bytes(self, key, pdf_path, page_num, label_settings):
+        with metrics.timed('render', 'label_store_read'):
+            stored = self.labels.read(key)
+        if stored is not None:
+            return stored
+        with metrics.timed('render', 'crop'):
+            return self._extract_page_bytes(pdf_path, page_num, label_settings)
+
+    PREVIEW_FORMATS = {'png': 'PNG', 'webp': 'WEBP'}
+
+    def preview_etag(self, file_id, page_num, label_settings, fmt='pdf', dpi=None):
+        """Strong validator for a preview: same document bytes, page and settings."""
+        doc = self.documents.get(file_id)
+        if not doc:
+            return None
+        key = render_cache.label_key('preview', doc.get('hash', file_id), page_num, label_settings) + (fmt, dpi)
+        return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:32]
+
+    def get_page_preview_image(self, file_id, page_num, label_settings=None, fmt='png', dpi=96):
+        """Cropped label rasterized at screen DPI, encoded as PNG or WebP."""
+        doc = self.documents.get(file_id)
+        if not doc:
+            raise Exception("Document not found")
+
+        key = render_cache.label_key('preview', doc.get('hash', file_id), page_num, label_settings) + (fmt, dpi)
+        return self.render_cache.get(key, lambda: self._render_preview_image(file_id, page_num, label_settings, fmt, dpi))
+
+    def _render_preview_image(self, file_id, page_num, label_settings, fmt, dpi):
+        try:
+            from pdf2image import convert_from_bytes
+            from pdf2image.exceptions import PDFInfoNotInstalledError
+        except ImportError:
+            raise PreviewUnavailable("Image previews need pdf2image and Poppler")
+
+        pdf_bytes = self.get_page_image(file_id, page_num, label_settings)
+        try:
+            with metrics.timed('render', 'rasterize_preview'):
+                images = convert_from_bytes(pdf_bytes, dpi=dpi, first_page=1, last_page=1, poppler_path=poppler_path())
+        except PDFInfoNotInstalledError:
+            raise PreviewUnavailable("Image previews need Poppler installed")
+        if not images:
+            raise PreviewUnavailable("Could not rasterize label")
+
+        output_buffer = io.BytesIO()
+        images[0].save(output_buffer, format=self.PREVIEW_FORMATS[fmt])
+        return output_buffer.getvalue()
 
     def _extract_page_bytes(self, pdf_path, page_num, label_settings=None):
         # Cropping Logic from original app (now configurable via label_settings)
+        import pypdf
         with open(pdf_path, 'rb') as file:
             pdf_reader = pypdf.PdfReader(file)
             if page_num < 1 or page_num > len(pdf_reader.pages):
@@ -554,10 +1335,10 @@ class PDFProcessingService:
             orig_height = float(original_page.mediabox.height)
             orig_width = float(original_page.mediabox.width)
             
-            label_width = label_settings.get('width', 3.94) * inch
-            label_height = label_settings.get('height', 1.5) * inch
-            offset_x = label_settings.get('offsetX', 0) * inch
-            offset_y = label_settings.get('offsetY', 0) * inch
+            label_width = label_settings.get('width', 3.94) * INCH
+            label_height = label_settings.get('height', 1.5) * INCH
+            offset_x = label_settings.get('offsetX', 0) * INCH
+            offset_y = label_settings.get('offsetY', 0) * INCH
             
             # Crop from top-left (0,0 in PDF is bottom-left)
             lower_left_x = offset_x
@@ -582,7 +1363,110 @@ class PDFProcessingService:
             output_buffer.seek(0)
             return output_buffer.getvalue()
 
+LAYOUT_TEXT_MODES = ('adaptive', 'always')
+LAYOUT_PROBE_PAGES = 2
+
+
+def _layout_text(page):
+    try:
+        return page.extract_text(extraction_mode='layout')
+    except Exception:
+        return None
+
+
+def parse_pdf(file_path, layout_mode='always'):
+    """Extract barcodes from every page.
+
+    Returns {'pages': n, 'serials': [(page_num, serial), ...], 'texts': [page text, ...],
+    'layout': [whether each page ran the layout pass], 'layout_pages': how many
+    did}. A plain module
+    function returning plain data, so bulk uploads can run it in worker
+    processes.
+
+    The layout pass recovers text the default extractor drops or reshapes
+    on some platforms/fonts, but is the slower one. With ``layout_mode``
+    'always' it runs on every page. With 'adaptive' it runs on the first
+    LAYOUT_PROBE_PAGES pages, on every page if that probe found barcodes
+    only layout text has, and otherwise only on pages where the default
+    text has none.
+    """
+    import pypdf
+    reader = pypdf.PdfReader(file_path)
+    text_service = TextExtractionService()
+    serials = []
+    texts = []
+    layout = []
+    use_layout = layout_mode == 'always'
+
+    for i, page in enumerate(reader.pages):
+        page_num = i + 1
+        text = page.extract_text() or ''
+        found = None
+        ran_layout = False
+        probing = not use_layout and i < LAYOUT_PROBE_PAGES
+        if not use_layout and not probing:
+            found = text_service.extract_serial_numbers(text)
+
+        if not found:
+            ran_layout = True
+            layout_text = _layout_text(page)
+            if layout_text and layout_text != text:
+                combined = '\n'.join(part for part in (text, layout_text) if part)
+                if probing:
+                    plain = {serial['text'] for serial in text_service.extract_serial_numbers(text)}
+                    found = text_service.extract_serial_numbers(combined)
+                    if any(serial['text'] not in plain for serial in found):
+                        use_layout = True  # This document needs layout text; skip probing the rest
+                else:
+                    found = text_service.extract_serial_numbers(combined)
+                text = combined
+            elif found is None:
+                found = text_service.extract_serial_numbers(text)
+
+        texts.append(text)
+        layout.append(ran_layout)
+        for serial in found:
+            serials.append((page_num, serial))
+            logger.info(f"Found {serial['text']} on page {page_num}")
+
+    return {'pages': len(reader.pages), 'serials': serials, 'texts': texts, 'layout': layout, 'layout_pages': sum(layout)}
+
+
+def add_layout_text(file_path, texts, layout):
+    """Run the layout pass on the pages of stored text that skipped it (adaptive mode).
+
+    Returns the texts with layout text added as ``parse_pdf`` would have, and
+    how many pages needed it. Pattern changes can match text that only the
+    layout pass produces, so a re-index must not rely on the default text alone.
+    """
+    missing = [i for i, ran in enumerate(layout) if not ran]
+    if not missing:
+        return texts, 0
+    import pypdf
+    reader = pypdf.PdfReader(file_path)
+    texts = list(texts)
+    for i in missing:
+        layout_text = _layout_text(reader.pages[i])
+        if layout_text and layout_text != texts[i]:
+            texts[i] = '\n'.join(part for part in (texts[i], layout_text) if part)
+    return texts, len(missing)
+
+
 class TextExtractionService:
+    # Captured serial and its label type; earlier patterns take precedence
+    PATTERNS = [
+        (r'\[\)>.*?S([A-Z][0-9]{10})[0-9]*[A-Z]', 'BARCODE_K'),
+        (r'\[\)>.*?S([0-9][A-Z][0-9]{9,12})[0-9]*[A-Z]', 'BARCODE_NUM'),
+        (r'S/?N[:\s;\.\-]+([A-Z0-9]{8,15})', 'GENERIC_SN'),
+        (r'SN[:\s;\.\-]+([A-Z0-9]{8,15})', 'GENERIC_SN'),
+        (r'\b([A-Z]{1,2}[0-9]{8,12})\b', 'ALPHANUMERIC_ID')
+    ]
+
+    @classmethod
+    def patterns_fingerprint(cls):
+        """Changes whenever PATTERNS do, so stale mappings can be detected at startup."""
+        return hashlib.sha1(repr(cls.PATTERNS).encode('utf-8')).hexdigest()[:16]
+
     def _clean_text(self, value):
         # Normalize control chars that frequently appear in extracted PDF text
         # (platform/parser dependent), while preserving newlines for regex context.
@@ -603,17 +1487,8 @@ class TextExtractionService:
         if condensed_text != base_text:
             candidate_texts.append(condensed_text)
 
-        # PORTED REGEX PATTERNS
-        patterns = [
-            (r'\[\)>.*?S([A-Z][0-9]{10})[0-9]*[A-Z]', 'BARCODE_K'),
-            (r'\[\)>.*?S([0-9][A-Z][0-9]{9,12})[0-9]*[A-Z]', 'BARCODE_NUM'),
-            (r'S/?N[:\s;\.\-]+([A-Z0-9]{8,15})', 'GENERIC_SN'),
-            (r'SN[:\s;\.\-]+([A-Z0-9]{8,15})', 'GENERIC_SN'),
-            (r'\b([A-Z]{1,2}[0-9]{8,12})\b', 'ALPHANUMERIC_ID')
-        ]
-        
         for candidate in candidate_texts:
-            for pattern, label_type in patterns:
+            for pattern, label_type in self.PATTERNS:
                 matches = re.finditer(pattern, candidate, re.IGNORECASE)
                 for match in matches:
                     try:
@@ -631,14 +1506,155 @@ class TextExtractionService:
         return serial_numbers
 
 class PrintService:
-    def __init__(self, pdf_service):
+    def __init__(self, pdf_service, pools=None, send_timeout=30):
         self.pdf_service = pdf_service
+        self.pools = pools  # PrinterPools; print_page accepts pool names as printers when set
+        self.retries = None  # PrintRetryQueue; without it a failed send fails the job right away
+        self.send_timeout = send_timeout
+        self._precompute_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='precompute')
+        self._precompute_pending = 0
+        self._precompute_lock = threading.Lock()
+        metrics.REGISTRY.gauge_callback(
+            'brady_precompute_queue', 'Documents queued for or in label precompute.',
+            lambda: self._precompute_pending)
+
+    def warmup(self):
+        """Preload the PDF/image renderer (and pywin32 on Windows)."""
+        timings = startup.preload_modules()
+        windows_print_available()
+        return timings
+
+    def _quality_settings(self, label_settings):
+        return {
+            'dpi': label_settings.get('dpi', 600),
+            'color_mode': label_settings.get('color_mode', 'grayscale'),
+            'sharpening': label_settings.get('sharpening', True),
+            'resampling': label_settings.get('resampling', 'lanczos'),
+            'contrast': label_settings.get('contrast', 1.0),
+            'threshold': label_settings.get('threshold', 128)
+        }
+
+    def prerender(self, file_id, page_num, label_settings=None):
+        """Start rendering a label in the background ahead of preview/print.
+
+        Renders the cropped PDF and, when prints go through the native
+        Windows path, the print-ready bitmap as well.
+        """
+        doc = self.pdf_service.documents.get(file_id)
+        if not doc:
+            return False
+        label_settings = label_settings or {}
+        cache = self.pdf_service.render_cache
+        file_hash = doc.get('hash', file_id)
+        pdf_key = render_cache.label_key('pdf', file_hash, page_num, label_settings)
+        cache.prerender(
+            pdf_key,
+            lambda: self.pdf_service._load_page_bytes(pdf_key, doc['path'], page_num, label_settings)
+        )
+        if platform.system() == 'Windows' and windows_print_available():
+            cache.prerender(
+                render_cache.label_key('bitmap', file_hash, page_num, label_settings),
+                lambda: self._render_bitmap(file_id, page_num, label_settings)
+            )
+        return True
+
+    def get_print_bitmap(self, file_id, page_num, label_settings):
+        """Cropped, enhanced print raster for the label (None if pdf2image is missing)."""
+        doc = self.pdf_service.documents.get(file_id, {})
+        key = render_cache.label_key('bitmap', doc.get('hash', file_id), page_num, label_settings)
+        return self.pdf_service.render_cache.get(key, lambda: self._load_bitmap(key, file_id, page_num, label_settings))
+
+    def _load_bitmap(self, key, file_id, page_num, label_settings):
+        stored = self.pdf_service.labels.read(key)
+        if stored is not None:
+            from PIL import Image
+            image = Image.open(io.BytesIO(stored))
+            image.load()
+            return image
+        return self._render_bitmap(file_id, page_num, label_settings)
+
+    def precompute_labels(self, file_id, label_settings=None, bitmaps=False):
+        """Render every barcode page of a document into the label store.
+
+        Uses the site default label settings unless others are given, and
+        skips labels that are already stored. Returns per-kind counts.
+        """
+        pdf_service = self.pdf_service
+        doc = pdf_service.documents.get(file_id)
+        if not doc:
+            return None
+        if label_settings is None:
+            label_settings = pdf_service.get_label_defaults()
+        file_hash = doc.get('hash', file_id)
+        result = {'pages': 0, 'pdf': 0, 'bitmap': 0, 'errors': 0}
+
+        for page_num in pdf_service.barcode_pages(file_id):
+            if file_id not in pdf_service.documents:
+                break  # Deleted while we were rendering
+            result['pages'] += 1
+            try:
+                pdf_key = render_cache.label_key('pdf', file_hash, page_num, label_settings)
+                if not pdf_service.labels.has(pdf_key):
+                    pdf_service.labels.write(pdf_key, pdf_service._extract_page_bytes(doc['path'], page_num, label_settings))
+                    result['pdf'] += 1
+
+                if bitmaps:
+                    bitmap_key = render_cache.label_key('bitmap', file_hash, page_num, label_settings)
+                    if not pdf_service.labels.has(bitmap_key):
+                        image = self._render_bitmap(file_id, page_num, label_settings)
+                        if image is None:
+                            # pdf2image/Poppler missing; the PDF labels are still useful
+                            bitmaps = False
+                            continue
+                        output_buffer = io.BytesIO()
+                        image.save(output_buffer, format='PNG')
+                        pdf_service.labels.write(bitmap_key, output_buffer.getvalue())
+                        result['bitmap'] += 1
+            except Exception as e:
+                result['errors'] += 1
+                logger.error(f"Label precompute failed for {doc.get('name')} page {page_num}: {e}")
+
+        logger.info(f"Precomputed labels for {doc.get('name')}: {result}")
+        return result
+
+    def schedule_precompute(self, file_id, bitmaps=False):
+        """Queue ``precompute_labels`` for a document on the background worker."""
+        with self._precompute_lock:
+            self._precompute_pending += 1
+        try:
+            future = self._precompute_executor.submit(self.precompute_labels, file_id, None, bitmaps)
+        except Exception:
+            self._precompute_done(None)
+            raise
+        future.add_done_callback(self._precompute_done)
+        return future
+
+    def _precompute_done(self, _future):
+        with self._precompute_lock:
+            self._precompute_pending -= 1
+
+    def _render_bitmap(self, file_id, page_num, label_settings):
+        quality_settings = self._quality_settings(label_settings)
+        pdf_bytes = self.pdf_service.get_page_image(file_id, page_num, label_settings)
+        with metrics.timed('render', 'rasterize_print'):
+            image = self._pdf_to_image(pdf_bytes, quality_settings)
+            if image is None:
+                return None
+            return self._apply_quality_enhancements(image, quality_settings)
         
-    def print_page(self, file_id, page_num, printer_name=None, label_settings=None, username='Unknown'):
+    def print_page(self, file_id, page_num, printer_name=None, label_settings=None, username='Unknown', timer=None):
+        """Print one label and log the job.
+
+        Returns (True, message) once sent and (False, error) when it failed, or
+        (None, error) when sending failed and the job was queued for a retry.
+        """
         job_id = str(uuid.uuid4())
         timestamp = datetime.datetime.now().isoformat()
         status = "failed"
         message = ""
+        # Stage timings go to /metrics and into the job record (callers may pass one with earlier stages)
+        timer = timer or metrics.StageTimer('print')
+        temp_filename = f"print_job_{job_id}.pdf"
         
         # Default label settings
         if label_settings is None:
@@ -650,71 +1666,133 @@ class PrintService:
             doc_name = doc.get('name', 'Unknown Document')
             
             # 1. Get cropped PDF bytes (pass label settings for custom crop)
-            pdf_bytes = self.pdf_service.get_page_image(file_id, page_num, label_settings)
+            with timer.stage('extract'):
+                pdf_bytes = self.pdf_service.get_page_image(file_id, page_num, label_settings)
             
             # 2. Save to temp file
-            temp_filename = f"print_job_{job_id}.pdf"
-            with open(temp_filename, 'wb') as f:
+            with timer.stage('spool'), open(temp_filename, 'wb') as f:
                 f.write(pdf_bytes)
                 
             # 3. Extract quality settings from label_settings
-            quality_settings = {
-                'dpi': label_settings.get('dpi', 600),
-                'color_mode': label_settings.get('color_mode', 'grayscale'),
-                'sharpening': label_settings.get('sharpening', True),
-                'resampling': label_settings.get('resampling', 'lanczos'),
-                'contrast': label_settings.get('contrast', 1.0),
-                'threshold': label_settings.get('threshold', 128)
-            }
+            quality_settings = self._quality_settings(label_settings)
             logger.info(f"Print quality settings: {quality_settings}")
             
-            # 4. Send to printer (platform specific)
-            system = platform.system()
-            
-            if system == 'Windows':
-                if WINDOWS_PRINT_AVAILABLE:
-                    # Use native win32print for reliable Windows printing
-                    success, message = self._print_windows_native(temp_filename, printer_name, quality_settings)
-                else:
-                    # Fallback to Powershell
-                    success, message = self._print_windows_powershell(temp_filename, printer_name)
-                
-                if success:
-                    status = "success"
-                else:
-                    raise Exception(message)
+            # 4. Send to the printer, or to the best member of a pool (failing over to the others)
+            image = None
+            if platform.system() == 'Windows' and windows_print_available():
+                # Use native win32print for reliable Windows printing; rasterized once for every attempt
+                with timer.stage('rasterize'):
+                    image = self.get_print_bitmap(file_id, page_num, label_settings)
+
+            attempts = 1
+            if self.retries is not None and self.retries.waiting_for(printer_name):
+                # Earlier jobs are waiting for this printer to come back: queue behind them without trying it
+                sent, attempts = False, 0
+                message = f"{printer_name or 'Default printer'} has print jobs waiting for a retry"
             else:
-                # Mac/Linux LPR
-                cmd = ['lpr']
-                if printer_name:
-                    cmd.extend(['-P', printer_name])
-                cmd.append(temp_filename)
-                
-                logger.info(f"Executing Unix Print: {' '.join(cmd)}")
-                result = subprocess.run(cmd, capture_output=True, text=True)
-                
-                if result.returncode != 0:
-                     raise Exception(f"LPR failed: {result.stderr}")
-                
-                status = "success"
-                message = "Printed successfully"
-            
-            # Cleanup temp file
-            try:
-                os.remove(temp_filename)
-            except: pass
+                sent, printer_used, message, failed = self.send_label(temp_filename, printer_name, quality_settings, image, timer)
 
-            self._log_job(job_id, file_id, doc_name, page_num, printer_name, status, timestamp, username=username)
+            if not sent:
+                if self.retries is None:
+                    raise Exception(message)
+                # Keep the spooled label and retry it in the background
+                status = "retrying"
+                logger.warning(f"Print failed, queued for retry: {message}")
+                next_retry = self.retries.schedule(attempts, printer_name)
+                self._log_job(job_id, file_id, doc_name, page_num, printer_name, status, timestamp, message, username=username,
+                              stages_ms=timer.stages_ms, attempts=attempts, next_retry=next_retry.isoformat(timespec='seconds'))
+                try:
+                    self.retries.enqueue(job_id, temp_filename, image, file_id, doc_name, page_num, printer_name,
+                                         quality_settings, username, message, attempts, next_retry)
+                except Exception as e:
+                    logger.error(f"Could not queue print job {job_id} for retry: {e}")
+                    self.pdf_service.update_print_job(job_id, {'status': 'failed', 'next_retry': None})
+                    return False, message
+                return None, f"{message}; retrying in the background"
+
+            status = "success"
+            pool = printer_name if printer_used != printer_name else None
+            with metrics.timed('print', 'log'):
+                self._log_job(job_id, file_id, doc_name, page_num, printer_used, status, timestamp, username=username,
+                              stages_ms=timer.stages_ms, pool=pool, failover=failed if pool else None)
             return True, message
                 
         except Exception as e:
             logger.error(f"Print error: {e}")
             message = str(e)
-            self._log_job(job_id, file_id, doc_name if 'doc_name' in locals() else 'Unknown', page_num, printer_name, status, timestamp, message, username=username)
+            self._log_job(job_id, file_id, doc_name if 'doc_name' in locals() else 'Unknown', page_num, printer_name, status, timestamp, message, username=username, stages_ms=timer.stages_ms)
             return False, message
+        finally:
+            try:
+                os.remove(temp_filename)
+            except Exception:
+                pass
 
-    def _print_windows_native(self, pdf_path, printer_name=None, quality_settings=None):
+    def send_label(self, path, printer_name, quality_settings, image=None, timer=None):
+        """Send a spooled label to a printer, or to the members of a pool in dispatch order.
+
+        Returns (sent, printer that took it, message, members that failed first).
+        The printer is None for the default printer, so check ``sent`` for success.
+        """
+        timer = timer or metrics.StageTimer('print')
+        pool = printer_name if self.pools and self.pools.is_pool(printer_name) else None
+        targets = self.pools.candidates(pool) if pool else [printer_name]
+        errors = []
+        for target in targets:
+            with timer.stage('send'):
+                success, message = self._send(path, target, quality_settings, image)
+            if success:
+                if errors:
+                    self.pools.failovers.inc(pool)
+                return True, target, message, len(errors)
+            errors.append(f"{target}: {message}" if pool else message)
+            if pool:
+                logger.warning(f"Pool {pool}: {target} failed ({message})")
+        return False, None, '; '.join(errors) or f"Pool {pool} has no printers", len(errors)
+
+    def _send(self, temp_filename, printer_name, quality_settings, image=None):
+        """Send a spooled label to one printer: (success, message). Pool members are tracked for dispatch."""
+        pool_member = self.pools is not None and self.pools.tracks(printer_name)
+        if pool_member:
+            self.pools.begin(printer_name)
+        start = time.perf_counter()
+        success, message = False, ''
+        try:
+            success, message = self._send_platform(temp_filename, printer_name, quality_settings, image)
+        except Exception as e:
+            message = str(e)
+        finally:
+            if pool_member:
+                self.pools.finish(printer_name, success, time.perf_counter() - start, None if success else message)
+        return success, message
+
+    def _send_platform(self, temp_filename, printer_name, quality_settings, image=None):
+        if platform.system() == 'Windows':
+            if windows_print_available():
+                return self._print_windows_native(temp_filename, printer_name, quality_settings, image=image)
+            # Fallback to Powershell
+            return self._print_windows_powershell(temp_filename, printer_name)
+
+        # Mac/Linux LPR
+        cmd = ['lpr']
+        if printer_name:
+            cmd.extend(['-P', printer_name])
+        cmd.append(temp_filename)
+
+        logger.info(f"Executing Unix Print: {' '.join(cmd)}")
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.send_timeout)
+        except subprocess.TimeoutExpired:
+            return False, f"LPR timed out after {self.send_timeout} s"
+        if result.returncode != 0:
+            return False, f"LPR failed: {result.stderr}"
+        return True, "Printed successfully"
+
+    def _print_windows_native(self, pdf_path, printer_name=None, quality_settings=None, image=None):
         """Print using win32print (native GDI) - Most Reliable Method
+
+        ``image`` is an already enhanced bitmap (e.g. from the render cache);
+        without it the PDF is rasterized here.
         
         quality_settings can include:
         - dpi: 150, 300, 600 (default: 600 for best quality)
@@ -726,15 +1804,16 @@ class PrintService:
             quality_settings = {}
         
         try:
-            # Convert PDF to Image first with quality settings
-            image = self._pdf_to_image(pdf_path, quality_settings)
             if image is None:
-                # Fallback to Powershell if conversion fails
-                logger.warning("PDF to Image conversion failed, falling back to Powershell")
-                return self._print_windows_powershell(pdf_path, printer_name)
-            
-            # Apply image quality enhancements
-            image = self._apply_quality_enhancements(image, quality_settings)
+                # Convert PDF to Image first with quality settings
+                image = self._pdf_to_image(pdf_path, quality_settings)
+                if image is None:
+                    # Fallback to Powershell if conversion fails
+                    logger.warning("PDF to Image conversion failed, falling back to Powershell")
+                    return self._print_windows_powershell(pdf_path, printer_name)
+
+                # Apply image quality enhancements
+                image = self._apply_quality_enhancements(image, quality_settings)
             
             # Get printer
             if not printer_name:
@@ -778,6 +1857,7 @@ class PrintService:
 
     def _get_resampling_mode(self, mode_name):
         """Get PIL resampling filter from name"""
+        from PIL import Image
         modes = {
             'lanczos': Image.Resampling.LANCZOS,
             'bicubic': Image.Resampling.BICUBIC,
@@ -788,6 +1868,7 @@ class PrintService:
     
     def _apply_quality_enhancements(self, image, quality_settings):
         """Apply quality enhancements to the image before printing"""
+        from PIL import ImageFilter, ImageEnhance
         if quality_settings is None:
             quality_settings = {}
         
@@ -818,36 +1899,30 @@ class PrintService:
         return image
     
     def _pdf_to_image(self, pdf_path, quality_settings=None):
-        """Convert first page of PDF to PIL Image with quality settings"""
+        """Convert first page of PDF (a path or PDF bytes) to PIL Image with quality settings"""
         if quality_settings is None:
             quality_settings = {}
         
         try:
-            from pdf2image import convert_from_path
-            import sys
+            from pdf2image import convert_from_bytes, convert_from_path
             
             # Determine Poppler path (bundled with EXE or system PATH)
-            poppler_path = None
-            if getattr(sys, 'frozen', False):
-                # Running as PyInstaller EXE - Poppler is bundled in 'poppler' subfolder
-                bundle_dir = sys._MEIPASS
-                poppler_path = os.path.join(bundle_dir, 'poppler')
-                if not os.path.exists(poppler_path):
-                    # Try alternative path structure
-                    poppler_path = os.path.join(os.path.dirname(sys.executable), 'poppler')
-                logger.info(f"Using bundled Poppler at: {poppler_path}")
+            bundled_poppler = poppler_path()
+            if bundled_poppler:
+                logger.info(f"Using bundled Poppler at: {bundled_poppler}")
             
             # Use DPI from quality settings, default to 600 for high quality
             dpi = quality_settings.get('dpi', 600)
             logger.info(f"Converting PDF to image at {dpi} DPI")
             
             # Convert PDF to image with high DPI
-            images = convert_from_path(
+            convert = convert_from_bytes if isinstance(pdf_path, bytes) else convert_from_path
+            images = convert(
                 pdf_path, 
                 dpi=dpi, 
                 first_page=1, 
                 last_page=1,
-                poppler_path=poppler_path
+                poppler_path=bundled_poppler
             )
             if images:
                 img = images[0]
@@ -881,7 +1956,8 @@ class PrintService:
         except Exception as e:
             return False, str(e)
 
-    def _log_job(self, job_id, file_id, doc_name, page_num, printer_name, status, timestamp, error=None, username='Unknown'):
+    def _log_job(self, job_id, file_id, doc_name, page_num, printer_name, status, timestamp, error=None, username='Unknown', stages_ms=None,
+                 **extra):
         job_data = {
             'id': job_id,
             'file_id': file_id,
@@ -893,4 +1969,8 @@ class PrintService:
             'error': error,
             'username': username
         }
+        if stages_ms:
+            job_data['stages_ms'] = dict(stages_ms)
+        # e.g. the pool and failed members of a pool print, or the attempts of a retried job
+        job_data.update({key: value for key, value in extra.items() if value is not None})
         self.pdf_service.log_print_job(job_data)
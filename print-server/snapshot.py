@@ -0,0 +1,106 @@
+"""Compact binary snapshot of the print server database.
+
+The snapshot is a length-prefixed section file (all integers little-endian):
+
+    magic     8 bytes   b'BPSNAP\\x00\\x01'
+    count     uint32    number of sections
+    per section:
+        name_len  uint16
+        name      utf-8
+        size      uint64
+        payload   compact JSON (utf-8)
+
+Each section is decoded on its own, so large collections such as
+``mappings`` and ``print_jobs`` can stay as raw bytes until they are
+first needed. Undecoded sections are copied through unchanged on save.
+"""
+
+import json
+import os
+import struct
+import tempfile
+
+MAGIC = b'BPSNAP\x00\x01'
+SNAPSHOT_FILENAME = 'db.snap'
+
+_COUNT = struct.Struct('<I')
+_NAME_LEN = struct.Struct('<H')
+_SIZE = struct.Struct('<Q')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class RawSection:
+    """Undecoded section payload; call ``decode()`` to get the Python value."""
+
+    __slots__ = ('payload',)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def decode(self):
+        return json.loads(self.payload)
+
+
+def encode_section(value):
+    if isinstance(value, RawSection):
+        return value.payload
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def read_snapshot(path):
+    """Return ``{name: RawSection}`` for every section in the snapshot."""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if data[:len(MAGIC)] != MAGIC:
+        raise SnapshotError(f"Not a snapshot file: {path}")
+
+    pos = len(MAGIC)
+    try:
+        (count,) = _COUNT.unpack_from(data, pos)
+        pos += _COUNT.size
+        sections = {}
+        for _ in range(count):
+            (name_len,) = _NAME_LEN.unpack_from(data, pos)
+            pos += _NAME_LEN.size
+            name = data[pos:pos + name_len].decode('utf-8')
+            pos += name_len
+            (size,) = _SIZE.unpack_from(data, pos)
+            pos += _SIZE.size
+            if pos + size > len(data):
+                raise SnapshotError(f"Truncated section '{name}' in {path}")
+            sections[name] = RawSection(data[pos:pos + size])
+            pos += size
+    except struct.error as e:
+        raise SnapshotError(f"Corrupt snapshot {path}: {e}")
+    return sections
+
+
+def write_snapshot(path, sections):
+    """Atomically write ``{name: value or RawSection}`` to ``path``."""
+    directory = os.path.dirname(path) or '.'
+    fd, temp_path = tempfile.mkstemp(prefix='.db.', suffix='.snap', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_COUNT.pack(len(sections)))
+            for name, value in sections.items():
+                name_bytes = name.encode('utf-8')
+                payload = encode_section(value)
+                f.write(_NAME_LEN.pack(len(name_bytes)))
+                f.write(name_bytes)
+                f.write(_SIZE.pack(len(payload)))
+                f.write(payload)
+        os.chmod(temp_path, 0o644)  # mkstemp creates 0600
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load_all(path):
+    """Decode every section; used by offline tools that need the full data."""
+    return {name: section.decode() for name, section in read_snapshot(path).items()}
@@ -0,0 +1,56 @@
+"""Import profiling and warmup helpers for the print server.
+
+Heavy third-party modules (pypdf, Pillow, pdf2image, pywin32) are imported
+on first use inside the services so the server starts accepting requests
+quickly. ``--warmup`` loads them up front instead, and ``--profile-imports``
+reports what each one costs.
+"""
+
+import importlib
+import logging
+import platform
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Modules needed for parsing, cropping and rasterizing labels
+RENDER_MODULES = ['pypdf', 'PIL.Image', 'PIL.ImageFilter', 'PIL.ImageEnhance', 'pdf2image']
+WINDOWS_MODULES = ['win32print', 'win32ui', 'win32con', 'PIL.ImageWin']
+
+
+def heavy_modules():
+    if platform.system() == 'Windows':
+        return RENDER_MODULES + WINDOWS_MODULES
+    return list(RENDER_MODULES)
+
+
+def timed_import(name):
+    """Import ``name`` and return (milliseconds, error). Cached modules cost ~0."""
+    already_loaded = name in sys.modules
+    start = time.perf_counter()
+    try:
+        importlib.import_module(name)
+        error = None
+    except ImportError as e:
+        error = str(e)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return (0.0 if already_loaded else elapsed_ms), error
+
+
+def preload_modules(names=None):
+    """Import the given (default: all heavy) modules; returns per-module timings."""
+    timings = []
+    for name in names or heavy_modules():
+        elapsed_ms, error = timed_import(name)
+        timings.append({'module': name, 'ms': round(elapsed_ms, 1), 'error': error})
+    return timings
+
+
+def format_import_profile(timings):
+    lines = [f"{'module':<20} {'ms':>8}"]
+    for entry in sorted(timings, key=lambda t: t['ms'], reverse=True):
+        suffix = f"  (unavailable: {entry['error']})" if entry['error'] else ''
+        lines.append(f"{entry['module']:<20} {entry['ms']:>8.1f}{suffix}")
+    lines.append(f"{'total':<20} {sum(t['ms'] for t in timings):>8.1f}")
+    return '\n'.join(lines)
@@ -0,0 +1,71 @@
+"""Regression checks for sending labels to the default printer.
+
+The default printer has no name (``printer_name=None``), so success must
+not be read from the printer that took the job. Run with
+``python -m unittest test_print_retry`` from print-server/.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from print_retry import PrintRetryQueue
+from services import PDFProcessingService, PrintService
+
+
+class DefaultPrinterTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        # print_page spools labels into the working directory
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.folder)
+        self.pdf_service = PDFProcessingService(self.folder)
+        self.print_service = PrintService(self.pdf_service)
+        self.print_service.retries = PrintRetryQueue(self.print_service, self.folder, base_delay=0)
+        self.pdf_service.documents['doc'] = {'name': 'doc.pdf'}
+        patches = [
+            mock.patch.object(self.pdf_service, 'get_page_image', return_value=b'%PDF-1.4'),
+            mock.patch('services.platform.system', return_value='Linux'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def lpr(self, returncode):
+        return mock.patch('services.subprocess.run',
+                          return_value=subprocess.CompletedProcess(['lpr'], returncode, '', 'offline'))
+
+    def test_print_sends_once_and_logs_success(self):
+        with self.lpr(0) as run:
+            success, _message = self.print_service.print_page('doc', 1, printer_name=None)
+
+        self.assertTrue(success)
+        self.assertEqual(run.call_count, 1)
+        self.assertNotIn('-P', run.call_args[0][0])
+        history = self.pdf_service.get_print_history()
+        self.assertEqual([job['status'] for job in history], ['success'])
+        self.assertEqual(history[0]['printer'], 'Default')
+        self.assertEqual(self.print_service.retries.counts(), {'retrying': 0, 'dead_letter': 0})
+
+    def test_retry_prints_once_when_the_printer_is_back(self):
+        self.print_service.retries.start = lambda: None  # Retried by hand below
+        with self.lpr(1):
+            success, _message = self.print_service.print_page('doc', 1, printer_name=None)
+        self.assertIsNone(success)
+
+        retries = self.print_service.retries
+        entries = list(retries._entries.values())
+        with self.lpr(0) as run:
+            retries._retry_printer(None, entries)
+
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(retries.counts(), {'retrying': 0, 'dead_letter': 0})
+        self.assertEqual([job['status'] for job in self.pdf_service.get_print_history()], ['success'])
+
+
+if __name__ == '__main__':
+    unittest.main()
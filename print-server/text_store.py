@@ -0,0 +1,100 @@
+"""On-disk store of the text extracted from every page at upload.
+
+Extracting text is the slow part of indexing a PDF; matching the barcode
+patterns against that text is fast. Keeping the text lets a re-index (after
+the patterns change) re-run only the pattern stage. The text of a document
+is written gzipped to ``text/<first 2 hex chars>/<document hash>.json.gz``
+and looked up by document hash and page number.
+
+Each page is stored with whether the layout-mode pass ran on it. In
+adaptive mode (see services.parse_pdf) many pages have default-mode text
+only, which a re-index completes before matching new patterns.
+"""
+
+import gzip
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def text_root(upload_folder):
+    return os.path.join(upload_folder, 'text')
+
+
+def iter_texts(upload_folder):
+    """Yield (file_hash, path) for every stored document text."""
+    root = text_root(upload_folder)
+    if not os.path.isdir(root):
+        return
+    for prefix in sorted(os.listdir(root)):
+        directory = os.path.join(root, prefix)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.json.gz') and not name.startswith('.'):
+                yield name[:-len('.json.gz')], os.path.join(directory, name)
+
+
+class PageTextStore:
+    def __init__(self, upload_folder):
+        self.root = text_root(upload_folder)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, file_hash):
+        return os.path.join(self.root, file_hash[:2], f'{file_hash}.json.gz')
+
+    def has(self, file_hash):
+        return os.path.exists(self.path_for(file_hash))
+
+    def write(self, file_hash, page_texts, layout=None):
+        """Store the text of every page (page 1 first) of the document with this hash.
+
+        ``layout`` lists per page whether the text includes the layout pass
+        (None: not known).
+        """
+        path = self.path_for(file_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.text.', suffix='.gz', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as handle:
+                    handle.write(json.dumps({'pages': page_texts, 'layout': layout}, separators=(',', ':')).encode('utf-8'))
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def read(self, file_hash):
+        """Text of every page, or None when the document was indexed before the store existed."""
+        stored = self.read_document(file_hash)
+        return None if stored is None else stored['pages']
+
+    def read_document(self, file_hash):
+        """{'pages': [text, ...], 'layout': [ran layout pass, ...] or None if not recorded}, or None."""
+        try:
+            with gzip.open(self.path_for(file_hash), 'rt', encoding='utf-8') as handle:
+                stored = json.load(handle)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Unreadable page text for {file_hash}: {e}")
+            return None
+        return {'pages': stored['pages'], 'layout': stored.get('layout')}
+
+    def page_text(self, file_hash, page_num):
+        pages = self.read(file_hash)
+        if pages is None or not 1 <= page_num <= len(pages):
+            return None
+        return pages[page_num - 1]
+
+    def remove_document(self, file_hash):
+        path = self.path_for(file_hash)
+        if os.path.exists(path):
+            os.remove(path)
+            return True
+        return False
+